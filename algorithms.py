@@ -1,5 +1,13 @@
 from blackjack_core.blackjack_classes import Hand, Card
-import json
+from blackjack_core.rules import DEFAULT_RULES
+from blackjack_core.composition import CompositionTracker
+from blackjack_core.histogram import CountHistogram
+from blackjack_core.event_log import EventWriter
+from results_io import write_results
+from results_store import ResultsStore, RESULTS_DATABASE
+from bisect import bisect_right
+import copy
+import numpy as np
 import os
 
 """
@@ -22,7 +30,7 @@ class BlackjackAlgorithm:
 
 
 
-    def __init__(self, selection_alg, count_alg, betting_alg, base_bet, decks, games, starting_balance):
+    def __init__(self, selection_alg, count_alg, betting_alg, base_bet, decks, games, starting_balance, rules=DEFAULT_RULES):
         self.all_scores = [] #list of lists scores for the algorithm, used to track performance across multiple rounds.
         self.current_scores = [] #list of scores for the current round, used to track performance in a single round.
         
@@ -32,12 +40,20 @@ class BlackjackAlgorithm:
         self.base_bet = base_bet #The base bet amount, used to calculate the actual bet amount.
         self.decks = decks
 
-        #these two aren't used in the algorithm, but are included in the json file for reference.
+        #these aren't used in the algorithm, but are included in the json file for reference.
 
         self.games = games
         self.starting_balance = starting_balance 
-        self.played_cards = [] #List of cards that have been played. 
-        self.running_count = 0 #The Count, used to determine the quality of the deck.
+        self.rules = rules
+        self.tracker = CompositionTracker(decks, rules.infinite_deck, rules.get_shoe_length(decks)) #Tracks the unseen cards and the running count, used to determine the quality of the deck.
+        self.histogram = None #CountHistogram of every round's outcome by true count, only collected if enable_histogram() is called
+        self.event_log = None #EventWriter that every completed hand is written to, only used if enable_event_log() is called
+        self.game_number = 0 #number of the game being played, set by run_games and used to label the event log's records
+        self.round_hands = None #(completed hands, dealer hand) of the current round, added to the histogram and event log with the round's outcome
+
+        #sub-algorithms are given access to the tracker, so any of them can make decisions based on the state of the shoe
+        for sub_algorithm in (selection_alg, count_alg, betting_alg):
+            sub_algorithm.attach_tracker(self.tracker)
 
           
 
@@ -45,25 +61,37 @@ class BlackjackAlgorithm:
         """Make a choice based on the current game state.
         This method should be overridden by subclasses."""
         return self.selection_alg.select(hand, dealer_hand)
-    
+
+    def second_choice(self, hand, dealer_hand):
+        """Returns the selection algorithm's fallback choice, used when the first choice fails."""
+        return self.selection_alg.second_choice(hand, dealer_hand)
+
       
 
     def count_card(self, card):
         """Updates the running count based on the card drawn.
-        In addition, appends the card to the played_cards list."""
+        In addition, removes the card from the tracked composition of the shoe."""
         count_change = self.count_alg.count(card)
-        self.played_cards.append(card)
+        self.tracker.record(card, count_change)
         return count_change
+
+    def count_cards(self, cards, removed, count_change):
+        """Same as calling count_card() for every card, given the amount of each value they remove from the composition and their total count value.
+        Used by the lockstep engine to count the cards every dealer drew at once."""
+        if not self.tracker.record_cards(removed, count_change):
+            for card in cards:
+                self.count_card(card)
+
+    def get_true_count(self):
+        """Returns the current true count (running count per deck remaining)."""
+        return self.tracker.get_true_count()
         
     def determine_bet(self):
         """Returns the bet amount based on the current count and the base bet.
         If the bet returned by this method is greater than the current balance, it will be capped at such outside this class."""
 
 
-        if len(self.played_cards) != 0:
-            true_count = self.running_count / (len(self.played_cards) / (self.decks * 52))
-        else:
-            true_count = 0
+        true_count = self.tracker.get_true_count()
 
 
 
@@ -75,6 +103,13 @@ class BlackjackAlgorithm:
 
         return bet
 
+    def determine_bets(self, true_counts):
+        """Returns an array containing the bet for each true count in an array, same as calling determine_bet() at each of those counts.
+        Used by engines that size the bets of many games at once."""
+        multipliers = self.betting_alg.get_bet_multipliers(np.asarray(true_counts, dtype=np.float64))
+        bets = np.round(self.base_bet * multipliers).astype(np.int64) #np.round rounds halves to even, same as round()
+        return np.maximum(bets, 1) # Ensure minimum bet is 1
+
     def __str__(self):
         return f"{self.name}"
     
@@ -90,6 +125,40 @@ class BlackjackAlgorithm:
         """Logs the score of the algorithm."""
         self.current_scores.append(score)
 
+    def enable_histogram(self):
+        """Starts aggregating the outcome of every round by the true count it was played at (see blackjack_core/histogram.py)."""
+        self.histogram = CountHistogram()
+
+    def enable_event_log(self, file_name):
+        """Starts writing every completed hand to a binary event log (see blackjack_core/event_log.py). The log must be closed with close_event_log()."""
+        self.event_log = EventWriter(file_name)
+
+    def close_event_log(self):
+        """Writes any buffered hands to the event log and stops logging."""
+        if self.event_log is not None:
+            self.event_log.close()
+            self.event_log = None
+
+    def log_hands(self, hands, dealer_hand, dealer_played=False):
+        """Keeps the round's completed hands, the dealer's hand and whether the dealer played it out until the round's outcome is logged.
+        Does nothing unless the histogram or event log is enabled."""
+        if self.histogram is not None or self.event_log is not None:
+            self.round_hands = (hands, dealer_hand, dealer_played)
+
+    def log_outcome(self, true_count, result, bet):
+        """Adds the round's net result (in units of the bet) to the histogram, along with how many of the hands logged by log_hands() busted or were blackjacks,
+        and writes those hands to the event log. Does nothing unless the histogram or event log is enabled."""
+        if self.round_hands is None:
+            return
+        hands, dealer_hand, dealer_played = self.round_hands
+        self.round_hands = None
+
+        if self.histogram is not None:
+            self.histogram.record(true_count, result, sum(hand.check_bust() for hand in hands), sum(hand.blackjack_check() for hand in hands))
+        if self.event_log is not None:
+            #the round's score has already been logged, so it is the last one in current_scores
+            self.event_log.write_round(self.game_number, len(self.current_scores) - 1, true_count, bet, hands, dealer_hand, self.rules, dealer_played)
+
     def log_round(self):
         """Logs the current round's scores to the all_scores list. In addition, resets the current_scores and other data list for the next round."""
 
@@ -97,51 +166,40 @@ class BlackjackAlgorithm:
 
 
         self.current_scores = []  # Reset current scores for the next round
-        self.count = 0
-        self.played_cards = []
-        self.running_count = 0  # Reset running count for the next round
+        self.tracker.reset()  # Reset composition and running count for the next round
 
-    def save_scores(self):
-        """Saves the scores to a file."""
-
-        
-
-        notes = input("Enter any notes for this simulation run: ")
-
-        file_name = self.determine_file_name()  
-
-
-        simulation_data = {
+    def get_metadata(self, notes=""):
+        """Returns a dictionary describing the simulation, saved alongside the scores."""
+        metadata = {
             "name": self.betting_alg.__str__() + " - " + self.selection_alg.__str__() + " - " + self.count_alg.__str__(),
             "notes": notes,
             "base_bet": self.base_bet,
             "decks": self.decks,
             "games": self.games,
             "starting_balance": self.starting_balance,
-
-            
+            "rules": self.rules.to_dict(),
         }
+        if self.histogram is not None:
+            metadata["count_histogram"] = self.histogram.to_dict()
+        return metadata
 
+    def save_scores(self):
+        """Saves the scores to a file, and adds the run to the results database."""
 
-        #hypothetically i could just use json.dump on the simulation_data dict (w/ the scores in it), but the formatting would suck when read by a human
-        #the below code formats it so that each unique round is on a new line
-
-
-
-        metadata = simulation_data= json.dumps(simulation_data, indent=2)
+        
 
-        scores_lines = []
-        for sublist in self.all_scores:
-            scores_lines.append("  " + json.dumps(sublist))
-            
-        scores_json = "[\n" + ",\n".join(scores_lines) + "\n]" 
+        notes = input("Enter any notes for this simulation run: ")
 
-        final_json = metadata[:-2] + ',\n  "scores": ' + scores_json + "\n}"
+        file_name = self.determine_file_name()  
 
+        metadata = self.get_metadata(notes)
+        write_results(file_name, metadata, self.all_scores)
 
-        # Save to a file
-        with open(file_name, "w") as f:
-            f.write(final_json)
+        #also recorded in the results database, so the run can be found by searching instead of by file name
+        store = ResultsStore()
+        run_id = store.add_run(metadata, self.all_scores, file_name=file_name)
+        store.close()
+        print(f"Run {run_id} added to {RESULTS_DATABASE}")
 
     def determine_file_name(self):
         """Prompts the user for a file name to save the scores to. Gives option for user to enter a custom file name or use a default one.
@@ -158,9 +216,17 @@ class BlackjackAlgorithm:
 
 
 
-        file_number = ""
-        divider = ""
+        #the results database records every saved file name, so the next free number is found without probing the folder
+        store = ResultsStore()
+        file_number = store.next_file_number(file_name)
+        store.close()
+        if file_number is None:
+            file_number = ""
+            divider = ""
+        else:
+            divider = "_"
 
+        #files saved before the database existed (or copied in from elsewhere) aren't in it
         while os.path.exists(file_name + divider + str(file_number) + ".json"):
             if file_number == "":
                 file_number = 1
@@ -192,6 +258,13 @@ class SelectionAlgorithm:
         This method should be overridden by subclasses."""
         raise NotImplementedError("This method should be overridden by subclasses.")
     
+    tracker = None #CompositionTracker of the BlackjackAlgorithm using this sub-algorithm, set by attach_tracker
+    composition_dependent = False #True if select() reads the tracker, in which case its decisions can't be precompiled into tables
+
+    def attach_tracker(self, tracker):
+        """Gives the algorithm access to the composition and count of the shoe. Called by BlackjackAlgorithm."""
+        self.tracker = tracker
+
     def second_choice(self, hand, dealer_hand):
         """Returns a second choice if other choice fails due to not having enough chips to double down/split.
         Default implementation returns '4' (stand), but subclasses can override this for custom behavior."""
@@ -228,32 +301,202 @@ class AlwaysStand(SelectionAlgorithm):
         return "Always Stand"
 
 class MaxCaution(SelectionAlgorithm):
-    """Hits on 11 or less, stands on 12 or more."""
+    """Hits on 11 or less, stands on 12 or more. The total it stands on can be changed."""
+
+    def __init__(self, stand_total=12):
+        self.stand_total = stand_total
+
     def select(self, hand, dealer_hand):
-        if hand.get_total() <= 11:
+        if hand.get_total() < self.stand_total:
             return "1"
         else:
             return "4"
 
     def description(self):
-        return " - Hits on 11 or less, stands on 12 or more. Always avoids busting."
+        if self.stand_total == 12:
+            return " - Hits on 11 or less, stands on 12 or more. Always avoids busting."
+        return f" - Hits on {self.stand_total - 1} or less, stands on {self.stand_total} or more."
 
     def __str__(self):
-        return "Max Caution"
+        return "Max Caution" if self.stand_total == 12 else f"Max Caution (stands on {self.stand_total})"
 
 class DealerStrategy(SelectionAlgorithm):
-    """Implements the dealer's strategy: hits on 16 or less, stands on 17 or more."""
+    """Implements the dealer's strategy: hits on 16 or less, stands on 17 or more. The total it stands on can be changed."""
+
+    def __init__(self, stand_total=17):
+        self.stand_total = stand_total
+
     def select(self, hand, dealer_hand):
-        if hand.get_total() <= 16:
+        if hand.get_total() < self.stand_total:
             return "1"
         else:
             return "4"
 
     def description(self):
-        return " - Hits on 16 or less, stands on 17 or more."
+        return f" - Hits on {self.stand_total - 1} or less, stands on {self.stand_total} or more."
 
     def __str__(self):
-        return "Dealer Strategy"
+        return "Dealer Strategy" if self.stand_total == 17 else f"Dealer Strategy (stands on {self.stand_total})"
+
+class BasicStrategy(SelectionAlgorithm):
+    """Multi-deck basic strategy (dealer stands on soft 17, double after split allowed), read from precompiled lookup tables.
+    Doubles, splits and surrenders are only attempted on the first two cards of a hand."""
+
+    #each string contains the action against an upcard of 2, 3, 4, 5, 6, 7, 8, 9, 10 and Ace respectively
+    #H = hit, S = stand, D = double (otherwise hit), d = double (otherwise stand), R = surrender (otherwise hit), P = split, - = play as a total
+    HARD = {total: "HHHHHHHHHH" for total in range(4, 9)}
+    HARD.update({
+        9:  "HDDDDHHHHH",
+        10: "DDDDDDDDHH",
+        11: "DDDDDDDDDH",
+        12: "HHSSSHHHHH",
+        13: "SSSSSHHHHH",
+        14: "SSSSSHHHHH",
+        15: "SSSSSHHHRH",
+        16: "SSSSSHHRRR",
+    })
+    HARD.update({total: "SSSSSSSSSS" for total in range(17, 22)})
+
+    SOFT = {
+        12: "HHHHHHHHHH",
+        13: "HHHDDHHHHH",
+        14: "HHHDDHHHHH",
+        15: "HHDDDHHHHH",
+        16: "HHDDDHHHHH",
+        17: "HDDDDHHHHH",
+        18: "SddddSSHHH",
+        19: "SSSSSSSSSS",
+        20: "SSSSSSSSSS",
+        21: "SSSSSSSSSS",
+    }
+
+    PAIRS = {
+        2:  "PPPPPPHHHH",
+        3:  "PPPPPPHHHH",
+        4:  "---PP-----",
+        5:  "----------",
+        6:  "PPPPP-----",
+        7:  "PPPPPP----",
+        8:  "PPPPPPPPPP",
+        9:  "PPPPP-PP--",
+        10: "----------",
+        11: "PPPPPPPPPP",
+    }
+
+    #converts table letters into selections, depending on whether the hand still has only its first two cards
+    FIRST_DECISION_ACTIONS = {"H": "1", "S": "4", "D": "2", "d": "2", "R": "5", "P": "3"}
+    LATER_DECISION_ACTIONS = {"H": "1", "S": "4", "D": "1", "d": "4", "R": "1", "P": "1"}
+
+    SHARED_TABLES = ("hard_table", "soft_table", "pair_table", "first_table", "later_table") #never modified once compiled, so copies share them
+
+    def __init__(self):
+        #tables are compiled into nested lists, indexed by [total][upcard - 2], so a decision is only a couple of list lookups
+        self.hard_table = self.compile_table(self.HARD)
+        self.soft_table = self.compile_table(self.SOFT)
+        self.pair_table = self.compile_table(self.PAIRS)
+        self.first_table = [self.compile_actions(table, self.FIRST_DECISION_ACTIONS) for table in (self.hard_table, self.soft_table)]
+        self.later_table = [self.compile_actions(table, self.LATER_DECISION_ACTIONS) for table in (self.hard_table, self.soft_table)]
+
+    def __deepcopy__(self, memo):
+        """Copies everything but the compiled tables, which the copy shares. The lockstep engine copies the algorithm for every game."""
+        copied = copy.copy(self)
+        memo[id(self)] = copied
+        for name, value in vars(self).items():
+            if name not in self.SHARED_TABLES:
+                setattr(copied, name, copy.deepcopy(value, memo))
+        return copied
+
+    def compile_table(self, table):
+        """Converts a dictionary of strings into a list of lists, indexed by total (or pair value) and upcard index."""
+        compiled = [None] * 22
+        for total, row in table.items():
+            compiled[total] = list(row)
+        return compiled
+
+    def compile_actions(self, table, actions):
+        """Converts a compiled table of letters into a compiled table of selections."""
+        return [None if row is None else [actions.get(letter, "1") for letter in row] for row in table]
+
+    def select(self, hand, dealer_hand):
+        upcard_index = dealer_hand.get_total() - 2 #dealer's hand only shows the upcard, Aces count as 11
+
+        if len(hand.cards) == 2:
+            if hand.can_split() and self.pair_table[hand.cards[0].get_value()][upcard_index] == "P":
+                return "3"
+            return self.first_table[hand.get_softness()][hand.get_total()][upcard_index]
+
+        return self.later_table[hand.get_softness()][hand.get_total()][upcard_index]
+
+    def second_choice(self, hand, dealer_hand):
+        """Plays the hand as a hit/stand decision if a double down, split or surrender fails."""
+        return self.later_table[hand.get_softness()][hand.get_total()][dealer_hand.get_total() - 2]
+
+    def description(self):
+        return " - Standard multi-deck basic strategy, hits/stands/doubles/splits/surrenders based on the hand and the dealer's upcard."
+
+    def __str__(self):
+        return "Basic Strategy"
+
+class DeviationStrategy(SelectionAlgorithm):
+    """Basic strategy, except for hands listed in an index table, which deviate once the true count passes their index.
+    The default table contains the Illustrious 18 plays for Hi-Lo in games where the dealer peeks (insurance excluded, since it isn't offered). 
+    Tables for other counts, rules and shoe sizes can be generated with deviations.generate_index_table()."""
+
+    #(kind, total or pair value, upcard): (index, selection, deviate_above)
+    #if deviate_above is True, the selection is made when the true count is at or above the index, otherwise when it is below it
+    ILLUSTRIOUS_18 = {
+        ("hard", 16, 10): (0, "4", True),
+        ("hard", 15, 10): (4, "4", True),
+        ("pair", 10, 5): (5, "3", True),
+        ("pair", 10, 6): (4, "3", True),
+        ("hard", 10, 10): (4, "2", True),
+        ("hard", 12, 3): (2, "4", True),
+        ("hard", 12, 2): (3, "4", True),
+        ("hard", 11, 11): (1, "2", True),
+        ("hard", 9, 2): (1, "2", True),
+        ("hard", 10, 11): (4, "2", True),
+        ("hard", 9, 7): (3, "2", True),
+        ("hard", 16, 9): (5, "4", True),
+        ("hard", 13, 2): (-1, "1", False),
+        ("hard", 12, 4): (0, "1", False),
+        ("hard", 12, 5): (-2, "1", False),
+        ("hard", 12, 6): (-1, "1", False),
+        ("hard", 13, 3): (-2, "1", False),
+    }
+
+    composition_dependent = True #plays depend on the true count
+
+    def __init__(self, index_table=None, base_strategy=None, name="Illustrious 18 Deviations"):
+        self.index_table = dict(self.ILLUSTRIOUS_18 if index_table is None else index_table)
+        self.base_strategy = base_strategy if base_strategy is not None else BasicStrategy()
+        self.name = name
+
+    def select(self, hand, dealer_hand):
+        upcard = dealer_hand.get_total()
+        first_decision = len(hand.cards) == 2
+        true_count = self.tracker.get_true_count() if self.tracker is not None else 0
+
+        deviation = None
+        if first_decision and hand.can_split():
+            deviation = self.index_table.get(("pair", hand.cards[0].get_value(), upcard))
+        if deviation is None:
+            deviation = self.index_table.get(("soft" if hand.get_softness() else "hard", hand.get_total(), upcard))
+
+        if deviation is not None:
+            index, selection, deviate_above = deviation
+            if (true_count >= index) == deviate_above and (first_decision or selection in ("1", "4")): #doubles/splits are only made on the first two cards
+                return selection
+
+        return self.base_strategy.select(hand, dealer_hand)
+
+    def second_choice(self, hand, dealer_hand):
+        return self.base_strategy.second_choice(hand, dealer_hand)
+
+    def description(self):
+        return f" - Basic strategy, with {len(self.index_table)} plays that change once the true count passes their index."
+
+    def __str__(self):
+        return self.name
 
 ##########################################################
 # Counting Algorithms
@@ -266,6 +509,12 @@ class CountingAlgorithm:
     This class is designed to serve as a collection of algorithms used to count cards in Blackjack.
     """
 
+    tracker = None #CompositionTracker of the BlackjackAlgorithm using this sub-algorithm, set by attach_tracker
+
+    def attach_tracker(self, tracker):
+        """Gives the algorithm access to the composition and count of the shoe. Called by BlackjackAlgorithm."""
+        self.tracker = tracker
+
     def count(self, card):
         """Returns the modification to the count based on the card drawn.
         This method should be overridden by subclasses."""
@@ -411,10 +660,21 @@ class BettingAlgorithm:
     This class is designed to serve as a collection of algorithms used to determine the betting strategy based on the current count.
     """
 
+    tracker = None #CompositionTracker of the BlackjackAlgorithm using this sub-algorithm, set by attach_tracker
+
+    def attach_tracker(self, tracker):
+        """Gives the algorithm access to the composition and count of the shoe. Called by BlackjackAlgorithm."""
+        self.tracker = tracker
+
     def get_bet_multiplier(self, count):
         """Returns the betting multiplier based on the current count.
         This method should be overridden by subclasses."""
         raise NotImplementedError("This method should be overridden by subclasses.")
+
+    def get_bet_multipliers(self, counts):
+        """Returns an array containing the betting multiplier for each count in an array.
+        Default implementation calls get_bet_multiplier() for every count, subclasses can override this with a vectorized version."""
+        return np.array([self.get_bet_multiplier(count) for count in counts.tolist()], dtype=np.float64)
     
     def description(self):
         """Returns a description of the algorithm."""
@@ -429,6 +689,9 @@ class FlatBetting(BettingAlgorithm):
     def get_bet_multiplier(self, count):
         return 1
 
+    def get_bet_multipliers(self, counts):
+        return np.ones(len(counts), dtype=np.float64)
+
     def description(self):
         return " - Always bets the base amount, regardless of the count."
 
@@ -437,47 +700,107 @@ class FlatBetting(BettingAlgorithm):
 
 class SuddenShift(BettingAlgorithm):
     """Sudden shift betting algorithm, increases bet fivefold if count is 5 or more.
-    If count is -5 or less, decreases bet to 1/5 of the base amount."""
+    If count is below -5, decreases bet to 1/5 of the base amount. The thresholds and multipliers can be changed."""
+
+    def __init__(self, high_count=5, high_multiplier=5, low_count=-5, low_multiplier=1/5):
+        self.high_count = high_count
+        self.high_multiplier = high_multiplier
+        self.low_count = low_count
+        self.low_multiplier = low_multiplier
+
     def get_bet_multiplier(self, count):
-        if count >= 5:
-            return 5
-        elif count <+ -5:
-            return 1/5
+        if count >= self.high_count:
+            return self.high_multiplier
+        elif count < self.low_count:
+            return self.low_multiplier
         else:
             return 1
 
+    def get_bet_multipliers(self, counts):
+        return np.where(counts >= self.high_count, self.high_multiplier, np.where(counts < self.low_count, self.low_multiplier, 1)).astype(np.float64)
+
     def description(self):
-        return " - Bets 5x the base bet if count is 5 or more, and 1/5 of the base bet if count is -5 or less."
+        return (f" - Bets {self.high_multiplier:g}x the base bet if count is {self.high_count:g} or more, "
+                f"and {self.low_multiplier:g}x the base bet if count is below {self.low_count:g}.")
 
     def __str__(self):
-        return "Sudden Rise Betting"
+        if (self.high_count, self.high_multiplier, self.low_count, self.low_multiplier) == (5, 5, -5, 1/5):
+            return "Sudden Rise Betting"
+        return f"Sudden Rise Betting ({self.high_multiplier:g}x at {self.high_count:g}, {self.low_multiplier:g}x below {self.low_count:g})"
     
 class LinearScale(BettingAlgorithm):
-    """Linear scale betting algorithm, increases/decreases bet by a 20th of the base bet for each count above/below 0."""
+    """Linear scale betting algorithm, increases/decreases bet by a 20th of the base bet for each count above/below 0. The fraction per count can be changed."""
+
+    def __init__(self, step=1/20):
+        self.step = step
+
     def get_bet_multiplier(self, count):
         if count > 0:
-            return 1 + (count / 20)
+            return 1 + (count * self.step)
         elif count < 0:
-            return 1 - (abs(count) / 20)
+            return 1 - (abs(count) * self.step)
         else:
             return 1
 
+    def get_bet_multipliers(self, counts):
+        return 1 + (counts * self.step) #same result as get_bet_multiplier on both sides of 0, since 1 - (abs(count) * step) is exactly 1 + (count * step)
+
     def description(self):
-        return " - Bet has 1/20th added/removed from it for every point on the count."
+        if self.step == 1/20:
+            return " - Bet has 1/20th added/removed from it for every point on the count."
+        return f" - Bet has {self.step:g} of the base bet added/removed from it for every point on the count."
 
     def __str__(self):
-        return "Linear Scale Betting"
+        return "Linear Scale Betting" if self.step == 1/20 else f"Linear Scale Betting ({self.step:g} per count)"
 
 class TimeBider(BettingAlgorithm):
-    """Algorith that returns 0 unless the count is above 10, in which case bet, returns 20. """
+    """Algorith that returns 0 unless the count is above 10, in which case bet, returns 20. The count and multiplier can be changed."""
+
+    def __init__(self, count=10, multiplier=20):
+        self.count = count
+        self.multiplier = multiplier
+
     def get_bet_multiplier(self, count):
-        if count > 10:
-            return 20
+        if count > self.count:
+            return self.multiplier
         else:
             return 0
 
+    def get_bet_multipliers(self, counts):
+        return np.where(counts > self.count, self.multiplier, 0).astype(np.float64)
+
+    def description(self):
+        return f" - Bets 1 chip, until count is above {self.count:g}. Then bets {self.multiplier:g}x the base bet."
+
+    def __str__(self):
+        return "Time Bider" if (self.count, self.multiplier) == (10, 20) else f"Time Bider ({self.multiplier:g}x above {self.count:g})"
+
+class RampBetting(BettingAlgorithm):
+    """Table-driven betting algorithm. The ramp maps true counts to multipliers, and each count uses the multiplier of the highest ramp count at or below it.
+    Counts below the lowest ramp count use its multiplier. Ramps fitted to a bankroll can be generated with bet_spread.create_ramp_betting()."""
+
+    DEFAULT_RAMP = {1: 1, 2: 2, 3: 4, 4: 6, 5: 8} #common 1-8 spread for Hi-Lo
+
+    def __init__(self, ramp=None, name="Bet Ramp"):
+        ramp = self.DEFAULT_RAMP if ramp is None else ramp
+        self.thresholds = sorted(ramp)
+        self.multipliers = [ramp[threshold] for threshold in self.thresholds]
+        self.name = name
+
+    def get_bet_multiplier(self, count):
+        return self.multipliers[max(bisect_right(self.thresholds, count) - 1, 0)]
+
+    def get_bet_multipliers(self, counts):
+        indices = np.maximum(np.searchsorted(self.thresholds, counts, side="right") - 1, 0) #same as bisect_right
+        return np.array(self.multipliers, dtype=np.float64)[indices]
+
+    def get_ramp(self):
+        """Returns the ramp as a dictionary of true count: multiplier."""
+        return dict(zip(self.thresholds, self.multipliers))
+
     def description(self):
-        return " - Bets 1 chip, until count is above 10. Then bets 20x the base bet."
+        steps = ", ".join(f"{threshold:+}: {multiplier:g}x" for threshold, multiplier in zip(self.thresholds, self.multipliers))
+        return f" - Bets a multiple of the base bet read from a table of true counts ({steps})."
 
     def __str__(self):
-        return "Time Bider"
\ No newline at end of file
+        return self.name
@@ -0,0 +1,120 @@
+import numpy as np
+from bet_replay import record_outcomes, round_results
+from blackjack_core.rules import DEFAULT_RULES
+
+"""
+Works out the statistics that data_analysis.py prints (mean profit, standard deviation and bust percentage at every round, and the average rounds lasted)
+for flat betting, without simulating every game.
+
+With a flat bet, a player's balance after n rounds is the starting balance plus the sum of n round results, so its distribution is the starting balance
+convolved n times with the distribution of a single round's result. Games stop once the balance reaches 0 (same as game()), so the distribution is advanced
+one round at a time with an FFT convolution, moving every balance at or below 0 into an absorbing bust state.
+A game's last logged score is its balance before its last round (or 0 if it busted earlier), so the distribution at each round is mixed over
+the distribution of how many rounds a shoe lasts.
+
+The distribution of a round's result and of the rounds per shoe are read from a short simulation (see bet_replay.record_outcomes()).
+Rounds are treated as independent of each other and of the shoe's length, and a bet is never capped at a balance lower than it,
+so results are close to, but not exactly the same as, simulating the games.
+"""
+
+
+ESTIMATE_GAMES = 2000 #games simulated to estimate the distribution of a round's result and of the rounds per shoe
+
+
+def result_distribution(outcomes, bet):
+    """Returns (results, probabilities): every change in balance a round had in the recorded outcomes with a flat bet, and how often it happened."""
+    bets = np.full(len(outcomes.true_counts), bet, dtype=np.int64)
+    results = round_results(outcomes.stakes, outcomes.linear, outcomes.blackjacks, outcomes.surrenders, bets, outcomes.rules)
+    results, amounts = np.unique(results, return_counts=True)
+    return results, amounts / amounts.sum()
+
+def length_distribution(outcomes):
+    """Returns an array containing the probability of a game lasting each amount of rounds, indexed by the amount of rounds."""
+    lengths = np.diff(outcomes.offsets)
+    return np.bincount(lengths) / len(lengths)
+
+def bankroll_moments(results, probabilities, starting_balance, rounds):
+    """Returns (means, second moments, bust probabilities) of the balance after 0 to rounds rounds, with games that reach 0 staying there.
+    Balances are kept in units of the greatest common divisor of the results and the starting balance, which keeps the grid small for large bets."""
+    results = np.asarray(results, dtype=np.int64)
+    unit = int(np.gcd.reduce(np.append(np.abs(results), starting_balance))) or 1
+    steps = results // unit
+    start = starting_balance // unit
+    lowest = min(int(steps.min()), 0) #a balance can fall by at most this much in a round, which is also where the convolution's results begin
+    highest = max(int(steps.max()), 0)
+
+    step_probabilities = np.zeros(highest - lowest + 1)
+    np.add.at(step_probabilities, steps - lowest, probabilities)
+    size = start + rounds * highest + 1 #highest balance that can be reached, plus the bust state at 0
+    fft_size = 1 << (size + len(step_probabilities) - 2).bit_length()
+    step_transform = np.fft.rfft(step_probabilities, fft_size)
+
+    balances = np.arange(size, dtype=np.float64) * unit
+    distribution = np.zeros(size)
+    distribution[start] = 1
+    means, second_moments, busts = [float(starting_balance)], [float(starting_balance) ** 2], [0.0]
+    for round_number in range(rounds):
+        alive = distribution.copy()
+        alive[0] = 0
+        #index i of the convolution is the probability of a balance of i + lowest
+        convolved = np.fft.irfft(np.fft.rfft(alive, fft_size) * step_transform, fft_size)[:size - lowest]
+        convolved = np.maximum(convolved, 0) #removes the tiny negative values left by floating point error
+
+        bust = distribution[0] + convolved[:1 - lowest].sum()
+        distribution = np.concatenate(([bust], convolved[1 - lowest:]))
+        distribution /= distribution.sum()
+
+        means.append(float(distribution @ balances))
+        second_moments.append(float(distribution @ balances ** 2))
+        busts.append(float(distribution[0]))
+    return np.array(means), np.array(second_moments), np.array(busts)
+
+def mix_over_lengths(values, lengths):
+    """Returns an array containing the value at every logged round of a game, given the value after each amount of rounds and the distribution of game lengths.
+    A game that lasts l rounds logs its balance after min(round, l - 1) rounds, same as data_analysis.round_scores()."""
+    rounds = len(lengths) - 1
+    played = np.minimum(np.arange(rounds)[:, None], np.arange(1, rounds + 1)[None, :] - 1) #rounds played by round r of a game of length l
+    return (values[played] * lengths[None, 1:]).sum(axis=1)
+
+def bankroll_statistics(selection, counting, base_bet, starting_balance, decks, rules=DEFAULT_RULES, games=ESTIMATE_GAMES, seed=0, outcomes=None):
+    """Returns a dictionary of the statistics printed by data_analysis.print_statistics() for flat betting.
+    mean_profit, standard_deviation and bust_percentage are arrays with a value for every round, with the final round's value under "final_" + name.
+    The recorded outcomes can be passed in, so that several bets and bankrolls are worked out from the same short simulation."""
+    if outcomes is None:
+        outcomes = record_outcomes(selection, counting, games, decks, rules, seed)
+    lengths = length_distribution(outcomes)
+    means, second_moments, busts = bankroll_moments(*result_distribution(outcomes, base_bet), starting_balance, len(lengths) - 1)
+
+    statistics = {"average_rounds": 0.0, "longest_run": len(lengths) - 1}
+    #a game that busts after n rounds logs n + 1 scores, unless it already reached the end of its shoe
+    survival = 1 - np.concatenate(([0.0], busts[:-1]))
+    statistics["average_rounds"] = float(sum(probability * survival[:length].sum() for length, probability in enumerate(lengths)))
+
+    rounds_played = np.arange(len(lengths))[lengths > 0] - 1 #the last score is the balance before the last round
+    for name, values in (("mean", means), ("second_moment", second_moments), ("bust", busts)):
+        statistics[name] = mix_over_lengths(values, lengths)
+        statistics["final_" + name] = float(values[rounds_played] @ lengths[lengths > 0])
+
+    for prefix in ("", "final_"):
+        mean = statistics.pop(prefix + "mean")
+        second_moment = statistics.pop(prefix + "second_moment")
+        statistics[prefix + "mean_profit"] = mean - starting_balance
+        statistics[prefix + "standard_deviation"] = np.sqrt(np.maximum(second_moment - mean ** 2, 0))
+        statistics[prefix + "bust_percentage"] = statistics.pop(prefix + "bust") * 100
+    return statistics
+
+def print_bankroll_statistics(statistics, round_number=-1):
+    """Prints the statistics returned by bankroll_statistics(), in the same form as data_analysis.print_statistics()."""
+    if round_number == -1:
+        round_description = "final round"
+        values = {name: statistics["final_" + name] for name in ("mean_profit", "standard_deviation", "bust_percentage")}
+        print(f"The longest run lasted {statistics['longest_run']} rounds.")
+        print(f"Average amount of rounds lasted by algorithm: {statistics['average_rounds']:.2f}")
+    else:
+        round_description = f"round #{round_number}"
+        round_index = min(round_number, statistics["longest_run"] - 1)
+        values = {name: statistics[name][round_index] for name in ("mean_profit", "standard_deviation", "bust_percentage")}
+
+    print(f"Percentage of rounds that ended in a Bust by {round_description}: {values['bust_percentage']:.2f}%")
+    print(f"Average profit/loss after {round_description}: {values['mean_profit']:.2f} chips")
+    print(f"Standard deviation of scores after {round_description}: {values['standard_deviation']:.2f}")
@@ -0,0 +1,206 @@
+import copy
+import numpy as np
+from algorithms import BlackjackAlgorithm, FlatBetting
+from blackjack_core.batch import CONCURRENT_GAMES, create_shoe_deck, run_lockstep_games
+from blackjack_core.blackjack import game
+from blackjack_core.event_log import BLACKJACK, SURRENDER, hand_outcome, round_totals
+from blackjack_core.rules import DEFAULT_RULES
+from blackjack_core.utility import BettingManager
+from simulation import SimulationResult, _create_algorithm
+
+"""
+Compares betting algorithms without simulating the games again for each of them.
+
+With a fixed selection and counting algorithm, the cards dealt and the outcome of every hand don't depend on the bet,
+so a round's payout is a fixed multiple of its bet (plus the rounding of blackjack and surrender payouts).
+record_outcomes() plays the games once with the lockstep engine and a bankroll that never runs out, and keeps the true count and payout units of every round.
+reprice() then works out the scores of any betting algorithm, base bet and starting balance from those arrays, one round of every game at a time.
+
+The bankroll only changes how a game plays when a bet is capped at the balance and the round needs more than that (doubles and splits are refused),
+or when the balance runs out. Games where a bet would be refused are played again for real from that round on, from the same shoe,
+so the results are exactly the same as simulate() with the lockstep engine and the same seed.
+"""
+
+
+RECORDING_BALANCE = 10 ** 15 #bankroll the outcomes are recorded with, large enough that no double or split is ever refused
+ROUND_DTYPE = np.dtype([
+    ("game", "<u4"),
+    ("round", "<u2"),
+    ("true_count", "<f8"), #kept at full precision, since bets are rounded from it
+    ("stake", "<u1"), #units of the bet staked, counting doubles and splits
+    ("linear", "<u1"), #units of the bet paid back by wins, pushes and blackjacks against a dealer blackjack
+    ("blackjacks", "<u1"), #blackjacks paid at the table's ratio
+    ("surrenders", "<u1"),
+    ("cards", "<u2"), #cards dealt in the round, including the dealer's
+])
+
+
+class OutcomeRecorder:
+    """Collects the bet-independent outcome of every round. Attached to an algorithm in place of an EventWriter, and shared by its copies the same way."""
+
+    def __init__(self):
+        self.rounds = []
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def write_round(self, game, round_number, true_count, bet, hands, dealer_hand, rules, dealer_played=False):
+        """Adds the round's payout units, same as settle_hands() with a bet of 1."""
+        totals, dealer_total, dealer_blackjack, dealer_blackjack_wins = round_totals(hands, dealer_hand)
+        stake = linear = blackjacks = surrenders = 0
+        cards = len(dealer_hand.cards)
+        for hand, total in zip(hands, totals):
+            stake += hand.get_doubled_down()
+            cards += len(hand.cards)
+            if dealer_blackjack_wins:
+                continue #every hand pays nothing, including surrenders
+
+            outcome, payout = hand_outcome(hand, total, dealer_total, dealer_blackjack, dealer_blackjack_wins, 1, rules)
+            if outcome == BLACKJACK and not dealer_blackjack:
+                blackjacks += 1
+            elif outcome == SURRENDER:
+                surrenders += 1
+            else:
+                linear += payout
+
+        self.rounds.append((game, round_number, true_count, stake, linear, blackjacks, surrenders, cards))
+
+    def close(self):
+        pass
+
+
+class RoundOutcomes:
+    """Outcome of every round of a set of recorded games, as flat arrays in game order. The rounds of game i are offsets[i] to offsets[i + 1] - 1."""
+
+    def __init__(self, selection, counting, decks, rules, seed, first_game, rounds):
+        self.selection = selection
+        self.counting = counting
+        self.decks = decks
+        self.rules = rules
+        self.seed = seed
+        self.first_game = first_game
+
+        rounds = rounds[np.lexsort((rounds["round"], rounds["game"]))] #lockstep games finish out of order
+        lengths = np.bincount(rounds["game"] - first_game)
+        self.offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+
+        self.true_counts = rounds["true_count"].copy()
+        self.stakes = rounds["stake"].copy()
+        self.linear = rounds["linear"].copy()
+        self.blackjacks = rounds["blackjacks"].copy()
+        self.surrenders = rounds["surrenders"].copy()
+        #cards dealt from the shoe before each round, which is where a game is resumed from
+        dealt = np.cumsum(rounds["cards"], dtype=np.int64)
+        self.cursors = dealt - rounds["cards"] - np.repeat(np.concatenate(([0], dealt[self.offsets[1:-1] - 1])), lengths)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def record_outcomes(selection, counting, games, decks, rules=DEFAULT_RULES, seed=0, first_game=0, concurrent_games=CONCURRENT_GAMES):
+    """Plays games first_game to first_game + games - 1 once with the lockstep engine and returns the outcome of every round as RoundOutcomes.
+    A seed is required, since games that can't be repriced are dealt their shoe again."""
+    if seed is None:
+        raise ValueError("Outcomes can only be recorded for seeded games.")
+
+    selection = copy.deepcopy(_create_algorithm(selection))
+    counting = copy.deepcopy(_create_algorithm(counting))
+    algorithm = BlackjackAlgorithm(copy.deepcopy(selection), copy.deepcopy(counting), FlatBetting(), 1, decks, games, RECORDING_BALANCE, rules)
+    algorithm.event_log = recorder = OutcomeRecorder()
+    run_lockstep_games(algorithm, games, decks, RECORDING_BALANCE, rules, seed, first_game, concurrent_games)
+
+    return RoundOutcomes(selection, counting, decks, rules, seed, first_game, np.array(recorder.rounds, dtype=ROUND_DTYPE))
+
+def _resume_game(outcomes, algorithm, game_index, round_index, balance):
+    """Plays a game for real from the start of one of its rounds, with the given balance. Returns the scores logged from that round on."""
+    deck = create_shoe_deck(outcomes.decks, outcomes.rules, outcomes.seed, outcomes.first_game + game_index)
+    #every card dealt before the round is dealt again and counted, which works for any kind of deck and leaves the tracker exactly as it was
+    for i in range(int(outcomes.cursors[outcomes.offsets[game_index] + round_index])):
+        algorithm.count_card(deck.draw_card())
+
+    game(BettingManager(balance), deck, algorithm, outcomes.rules) #logs the game's scores to all_scores
+    return algorithm.all_scores.pop()
+
+def round_results(stakes, linear, blackjacks, surrenders, bets, rules=DEFAULT_RULES):
+    """Returns an array containing the change in balance of each round, given its recorded payout units and its bet."""
+    bets = np.asarray(bets, dtype=np.int64)
+    blackjacks = np.asarray(blackjacks)
+    #blackjacks are added to the payout one at a time and rounded each time, same as settle_hands()
+    blackjack_payout = np.zeros(bets.shape)
+    for i in range(int(blackjacks.max(initial=0))):
+        blackjack_payout = np.where(blackjacks > i, np.round(blackjack_payout + bets * rules.blackjack_ratio), blackjack_payout)
+    payout = (np.asarray(linear, dtype=np.int64) * bets + blackjack_payout.astype(np.int64)
+              + np.asarray(surrenders, dtype=np.int64) * np.round(bets * rules.surrender_ratio).astype(np.int64))
+    return payout - np.asarray(stakes, dtype=np.int64) * bets
+
+def reprice(outcomes, betting, base_bet, starting_balance):
+    """Returns the SimulationResult of playing the recorded games with a betting algorithm, base bet and starting balance.
+    Same as simulate() with the lockstep engine and the seed the outcomes were recorded with."""
+    betting = copy.deepcopy(_create_algorithm(betting))
+    games = len(outcomes)
+    algorithm = BlackjackAlgorithm(copy.deepcopy(outcomes.selection), copy.deepcopy(outcomes.counting), betting, base_bet, outcomes.decks, games,
+                                   starting_balance, outcomes.rules)
+
+    #rounds are laid out as a (game, round) grid, rounds past the end of a game repeat its first round and are never played
+    lengths = np.diff(outcomes.offsets)
+    longest_game = int(lengths.max())
+    recorded = np.arange(longest_game)[None, :] < lengths[:, None]
+    indices = np.where(recorded, outcomes.offsets[:-1, None] + np.arange(longest_game)[None, :], 0)
+    bets = algorithm.determine_bets(outcomes.true_counts)[indices]
+    stakes = outcomes.stakes[indices].astype(np.int64)
+    linear = outcomes.linear[indices].astype(np.int64)
+    blackjacks = outcomes.blackjacks[indices]
+    surrenders = outcomes.surrenders[indices].astype(np.int64)
+
+    scores = np.zeros((games, longest_game + 1), dtype=np.int64)
+    balance = np.full(games, starting_balance, dtype=np.int64)
+    rounds_played = np.zeros(games, dtype=np.int64)
+    playing = np.ones(games, dtype=bool)
+    resumed = np.zeros(games, dtype=bool)
+    for round_number in range(longest_game):
+        playing &= recorded[:, round_number]
+        if not playing.any():
+            break
+        scores[:, round_number] = balance
+
+        bet = np.minimum(bets[:, round_number], balance) #capped at the balance, same as game()
+        refused = playing & (balance < bet * stakes[:, round_number]) #a double or split would have been refused, so the round plays out differently
+        resumed |= refused
+        playing &= ~refused
+
+        net_results = round_results(stakes[:, round_number], linear[:, round_number], blackjacks[:, round_number], surrenders[:, round_number], bet, outcomes.rules)
+        balance = np.where(playing, balance + net_results, balance)
+        rounds_played[playing] = round_number + 1
+        playing &= balance > 0
+
+    #games that ran out of money before their shoe did log their final balance, same as game()
+    scores[np.arange(games), rounds_played] = balance
+    logged = rounds_played + (rounds_played < lengths)
+
+    resumed_scores = {}
+    for game_index in np.flatnonzero(resumed).tolist():
+        round_index = int(rounds_played[game_index])
+        resumed_scores[game_index] = _resume_game(outcomes, algorithm, game_index, round_index, int(scores[game_index, round_index]))
+        logged[game_index] = round_index + len(resumed_scores[game_index])
+
+    offsets = np.zeros(games + 1, dtype=np.int64)
+    np.cumsum(logged, out=offsets[1:])
+    flat_scores = np.empty(offsets[-1], dtype=np.int64)
+    repriced = np.arange(longest_game + 1)[None, :] < np.where(resumed, rounds_played, logged)[:, None]
+    flat_scores[(offsets[:-1, None] + np.arange(longest_game + 1)[None, :])[repriced]] = scores[repriced]
+    for game_index, game_scores in resumed_scores.items():
+        flat_scores[offsets[game_index] + rounds_played[game_index]:offsets[game_index + 1]] = game_scores
+
+    metadata = algorithm.get_metadata()
+    metadata["seed"] = outcomes.seed
+    metadata["seats"] = 1
+    metadata["engine"] = "lockstep"
+    if outcomes.first_game:
+        metadata["first_game"] = outcomes.first_game
+    metadata["replayed_games"] = len(resumed_scores) #games played again from the round where the bankroll changed how they play
+    return SimulationResult(flat_scores, offsets, metadata)
+
+def reprice_all(outcomes, configurations):
+    """Returns a list containing the SimulationResult of every (betting algorithm, base bet, starting balance) configuration, repriced from the same outcomes."""
+    return [reprice(outcomes, betting, base_bet, starting_balance) for betting, base_bet, starting_balance in configurations]
@@ -0,0 +1,121 @@
+import json
+import math
+import os
+import numpy as np
+from algorithms import FlatBetting, RampBetting
+from blackjack_core.histogram import CountHistogram, bin_counts
+from blackjack_core.rules import DEFAULT_RULES
+from simulation import simulate
+
+"""
+Generates bet ramps for RampBetting, fitted to a bankroll and a risk of ruin limit.
+
+Ramps are derived from per-true-count statistics (how often each count comes up, and the mean and variance of a round's result at it),
+which are collected in a CountHistogram while simulating flat bets once, and cached both in memory and in a json file.
+Histograms saved with any other simulation's results can be passed to optimize_bet_ramp() as well.
+The edge at each count is read from a line fitted through the simulated edges, since rare counts are seen too few times to estimate on their own.
+Fitting a ramp to a new bankroll or risk limit only reads the cached statistics, so it takes well under a second.
+
+Bets are sized as a fraction of the Kelly bet at each count, using the largest fraction whose risk of ruin stays under the limit.
+Risk of ruin uses the usual diffusion approximation, exp(-2 * mean * bankroll / variance), for a player who never stops playing,
+so it overestimates the risk of busting within the single shoe that a game lasts.
+"""
+
+
+STATISTICS_CACHE_FILE = "count_statistics.json"
+ESTIMATE_BET = 100 #bet used while estimating, large enough that blackjack payouts aren't affected by rounding
+ESTIMATE_BALANCE = 10 ** 12 #balance used while estimating, large enough that it never limits a bet
+MIN_BIN_ROUNDS = 100 #bins with fewer rounds than this are too noisy to bet on, so they always use the minimum bet
+
+DEFAULT_RISK_OF_RUIN = 0.05
+MAX_SPREAD = 16 #largest multiplier a ramp can use
+KELLY_FRACTIONS = np.linspace(0.01, 1, 100) #fractions of the Kelly bet that are tried, full Kelly maximizes growth
+
+_statistics_cache = {} #statistics that have already been estimated or loaded this session
+
+
+def ramp_model(histogram):
+    """Returns (advantages, second moments) of each bin as used to fit bet ramps: the fitted advantages, plus the pooled variance."""
+    advantages = histogram.fitted_advantages()
+    return advantages, histogram.pooled_variance() + advantages ** 2
+
+def estimate_count_statistics(selection_alg, count_alg, games, decks, rules=DEFAULT_RULES, seed=None, workers=1):
+    """Simulates games with flat bets and an unlimited bankroll, returning the CountHistogram of every round's result.
+    Uses the vector engine if the selection algorithm supports it, otherwise the lockstep engine."""
+    engine = "lockstep" if selection_alg.composition_dependent else "vector"
+    result = simulate(selection_alg, count_alg, FlatBetting(), games, decks, ESTIMATE_BET, ESTIMATE_BALANCE, seed, workers, rules, engine, histogram=True)
+    return result.histogram
+
+def cache_key(selection_alg, count_alg, games, decks, rules, seed):
+    """Returns the key that statistics are cached under."""
+    return json.dumps([str(selection_alg), str(count_alg), games, decks, list(rules.key()), seed])
+
+def get_count_statistics(selection_alg, count_alg, games, decks, rules=DEFAULT_RULES, seed=0, cache_file=STATISTICS_CACHE_FILE, workers=1):
+    """Returns a CountHistogram for the selection and counting algorithms, estimating it only if it hasn't been cached.
+    Statistics are cached in memory and, unless cache_file is None, in a json file shared between runs."""
+    key = cache_key(selection_alg, count_alg, games, decks, rules, seed)
+
+    if key not in _statistics_cache and cache_file is not None and os.path.exists(cache_file):
+        with open(cache_file) as f:
+            for saved_key, data in json.load(f).items():
+                _statistics_cache[saved_key] = CountHistogram.from_dict(data)
+
+    if key not in _statistics_cache:
+        _statistics_cache[key] = estimate_count_statistics(selection_alg, count_alg, games, decks, rules, seed, workers)
+        if cache_file is not None:
+            save_statistics_cache(cache_file)
+
+    return _statistics_cache[key]
+
+def save_statistics_cache(cache_file=STATISTICS_CACHE_FILE):
+    """Saves every set of statistics estimated this session to a json file."""
+    with open(cache_file, "w") as f:
+        json.dump({key: statistics.to_dict() for key, statistics in _statistics_cache.items()}, f, indent=2)
+
+
+def evaluate_ramp(statistics, multipliers, starting_balance, base_bet):
+    """Returns (growth, risk of ruin) of betting the multipliers at each bin.
+    Growth is the expected log growth of the bankroll per round, approximated as mean - variance / (2 * bankroll)."""
+    frequencies = statistics.frequencies()
+    advantages, second_moments = ramp_model(statistics)
+    bets = multipliers * base_bet
+    mean = np.sum(frequencies * bets * advantages)
+    variance = np.sum(frequencies * bets ** 2 * second_moments) - mean ** 2
+
+    growth = mean - variance / (2 * starting_balance)
+    if mean <= 0:
+        return growth, 1.0
+    return growth, math.exp(-2 * mean * starting_balance / variance)
+
+def kelly_multipliers(statistics, fraction, starting_balance, base_bet, min_multiplier=1, max_multiplier=MAX_SPREAD):
+    """Returns the multiplier of each bin when betting a fraction of the Kelly bet (edge / second moment of the result, times the bankroll).
+    Bins without an edge, or with too few rounds to trust, use the minimum multiplier."""
+    advantages, second_moments = ramp_model(statistics)
+    kelly_bets = fraction * starting_balance * advantages / np.maximum(second_moments, 1e-9)
+    multipliers = np.clip(np.round(kelly_bets / base_bet, 2), min_multiplier, max_multiplier)
+    return np.where((advantages > 0) & (statistics.rounds >= MIN_BIN_ROUNDS), multipliers, min_multiplier)
+
+def optimize_bet_ramp(statistics, starting_balance, base_bet, max_risk_of_ruin=DEFAULT_RISK_OF_RUIN, min_multiplier=1, max_multiplier=MAX_SPREAD):
+    """Returns (ramp, growth, risk of ruin) for the ramp that maximizes growth while keeping the risk of ruin at or below the limit.
+    If no ramp meets the limit (e.g. the game has no edge at the minimum bet), the ramp with the lowest risk of ruin is returned."""
+    best = None
+    safest = None
+    for fraction in KELLY_FRACTIONS:
+        multipliers = kelly_multipliers(statistics, fraction, starting_balance, base_bet, min_multiplier, max_multiplier)
+        growth, risk_of_ruin = evaluate_ramp(statistics, multipliers, starting_balance, base_bet)
+
+        if risk_of_ruin <= max_risk_of_ruin and (best is None or growth > best[1]):
+            best = (multipliers, growth, risk_of_ruin)
+        if safest is None or risk_of_ruin < safest[2]:
+            safest = (multipliers, growth, risk_of_ruin)
+
+    multipliers, growth, risk_of_ruin = best if best is not None else safest
+    ramp = {int(count): float(multiplier) for count, multiplier in zip(bin_counts(), multipliers)}
+    return ramp, growth, risk_of_ruin
+
+def create_ramp_betting(selection_alg, count_alg, decks, starting_balance, base_bet, rules=DEFAULT_RULES, max_risk_of_ruin=DEFAULT_RISK_OF_RUIN,
+                        min_multiplier=1, max_multiplier=MAX_SPREAD, games=5000, seed=0, cache_file=STATISTICS_CACHE_FILE, workers=1):
+    """Returns a RampBetting algorithm fitted to the bankroll, base bet and risk of ruin limit, using (possibly cached) statistics for the other two algorithms."""
+    statistics = get_count_statistics(selection_alg, count_alg, games, decks, rules, seed, cache_file, workers)
+    ramp, growth, risk_of_ruin = optimize_bet_ramp(statistics, starting_balance, base_bet, max_risk_of_ruin, min_multiplier, max_multiplier)
+    return RampBetting(ramp, name=f"{count_alg} Ramp ({risk_of_ruin:.1%} Risk of Ruin)")
@@ -1,8 +1,9 @@
 import algorithms
 from algorithms import BlackjackAlgorithm
-from blackjack_core.utility import clear_screen, BettingManager
-from blackjack_core.blackjack import game
-from blackjack_core.blackjack_classes import Deck
+from blackjack_core.utility import clear_screen
+from blackjack_core.blackjack import run_games
+from blackjack_core.rules import Rules
+from result_cache import cached_simulate
 
 """
 This module serves as a the program used to select a Blackjack algorithm and run a betting simulation.
@@ -19,6 +20,8 @@ BASE_BET = 500
 DECKS = 16 
 GAMES = 900
 STARTING_BALANCE = 5000 
+RULES = Rules() #table rules, e.g. Rules(dealer_hits_soft_17=True, blackjack_payout=1.2, penetration=0.75) for a stricter table
+SEED = None #if set, games are seeded and results are cached (see result_cache.py), so rerunning the same configuration is instant
 
 
 
@@ -74,7 +77,7 @@ def construct_algorithm(selection_algorithms, betting_algorithms, counting_algor
 
     #constants are passed to the algorithm not only to inform decision making, but also to save metadata about the simulation
 
-    return BlackjackAlgorithm(selection, counting, betting, BASE_BET, DECKS, GAMES, STARTING_BALANCE)
+    return BlackjackAlgorithm(selection, counting, betting, BASE_BET, DECKS, GAMES, STARTING_BALANCE, RULES)
     
 
 
@@ -85,6 +88,7 @@ if __name__ == "__main__":
     betting_algorithms = import_algoritms(algorithms.BettingAlgorithm)
 
     algorithm = construct_algorithm(selection_algorithms, betting_algorithms, counting_algorithms)
+    algorithm.enable_histogram() #per-true-count outcomes are saved alongside the scores
     clear_screen()
 
     print("Algorithm Details:")
@@ -96,10 +100,13 @@ if __name__ == "__main__":
     print("Starting Blackjack Simulation...")
 
 
-    for i in range(GAMES):
-        deck = Deck(DECKS)
-        betting_manager = BettingManager(STARTING_BALANCE)
-        game(betting_manager, deck, algorithm)
+    if SEED is None:
+        run_games(algorithm, GAMES, DECKS, STARTING_BALANCE, RULES)
+    else:
+        result = cached_simulate(algorithm.selection_alg, algorithm.count_alg, algorithm.betting_alg, GAMES, DECKS, BASE_BET, STARTING_BALANCE, SEED,
+                                 rules=RULES, histogram=True)
+        algorithm.all_scores = [run.tolist() for run in result.runs()]
+        algorithm.histogram = result.histogram
         
 
 
@@ -0,0 +1,256 @@
+import copy
+import numpy as np
+from blackjack_core.blackjack_classes import Card, Hand, ShoeDeck, InfiniteDeck, generate_shoe
+from blackjack_core.utility import BettingManager, unpack_hands
+from blackjack_core.game_logic import play_hand, classify_hands, dealer_plays, settle_hands, settle_totals
+from blackjack_core.constants import TIE_PAYOUT_RATIO
+from blackjack_core.rules import DEFAULT_RULES
+
+"""
+Batched versions of the game engine, which play many independent games in lockstep.
+Players' decisions are still made one hand at a time by their algorithms, but the dealers of every game are resolved together with NumPy.
+
+Games are dealt from ShoeDecks, so a game plays out exactly the same way as it would in game() given the same shoe.
+"""
+
+
+RANK_VALUES = np.array([0, 11, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10], dtype=np.int16) #value of each rank, indexed by rank (1-13)
+DEALER_LOOKAHEAD = 12 #amount of upcoming cards passed to resolve_dealers, more than a dealer can draw in practice
+CONCURRENT_GAMES = 256 #default amount of games played in lockstep
+
+
+def hit_table_array(rules=DEFAULT_RULES):
+    """Returns the rules' dealer hit table as a NumPy array, indexed by [soft, total]."""
+    return np.array(rules.dealer_hit_table, dtype=bool)
+
+def resolve_dealers(upcards, hole_cards, draws, rules=DEFAULT_RULES):
+    """Plays out many dealer hands at once. Upcards and hole cards are arrays of card values (Aces are 11),
+    and draws is a 2D array containing the values of the upcoming cards in each game's shoe.
+
+    Returns four arrays: the dealers' final totals, whether they busted, how many cards they drew,
+    and whether they were still hitting after running out of upcoming cards (those hands must be resolved some other way)."""
+    hit_table = hit_table_array(rules)
+    upcards = np.asarray(upcards, dtype=np.int16)
+    hole_cards = np.asarray(hole_cards, dtype=np.int16)
+    draws = np.asarray(draws, dtype=np.int16)
+
+    #totals are tracked with Aces counted as 1, and an Ace is counted as 11 whenever that doesn't bust the hand
+    hard_totals = np.where(upcards == 11, 1, upcards) + np.where(hole_cards == 11, 1, hole_cards)
+    has_ace = (upcards == 11) | (hole_cards == 11)
+    cards_drawn = np.zeros(len(upcards), dtype=np.int16)
+    hitting = np.zeros(len(upcards), dtype=bool)
+
+    for step in range(draws.shape[1] + 1):
+        soft = has_ace & (hard_totals <= 11)
+        totals = hard_totals + 10 * soft
+        hitting = hit_table[soft.astype(np.int8), np.minimum(totals, hit_table.shape[1] - 1)]
+
+        if step == draws.shape[1] or not hitting.any():
+            break
+
+        #a dealer that is still hitting has drawn a card at every previous step, so every hitting dealer draws draws[:, step]
+        card = draws[:, step]
+        hard_totals = hard_totals + np.where(hitting, np.where(card == 11, 1, card), 0)
+        has_ace = has_ace | (hitting & (card == 11))
+        cards_drawn += hitting
+
+    return totals, totals > 21, cards_drawn, hitting
+
+
+def count_tags(count_alg):
+    """Returns an array containing the count value of each rank (1-13), indexed by rank."""
+    tags = np.zeros(len(RANK_VALUES), dtype=np.float64)
+    for rank in range(1, 14):
+        tags[rank] = count_alg.count(Card(rank, 0))
+    return tags
+
+def game_rng(seed, game_number):
+    """Returns the random generator that a game's shoe is shuffled with. Philox is a counter-based generator, so the game number is placed in its counter
+    (under a key derived from the seed) rather than generated in sequence: any game's shoe can be created directly, and games never share random numbers.
+    Without a seed, the generator is seeded randomly."""
+    if seed is None:
+        return np.random.Generator(np.random.Philox())
+    key = np.random.SeedSequence(seed).generate_state(2, dtype=np.uint64)
+    return np.random.Generator(np.random.Philox(counter=[0, 0, game_number, 0], key=key)) #each game has 2^128 draws before reaching the next game's counter
+
+def create_shoe_deck(decks, rules, seed, game_number):
+    """Returns the ShoeDeck (or InfiniteDeck, if the rules use one) that a game is dealt from by the lockstep engine.
+    Shoes depend only on the seed and the game number, so the same shoe can be dealt again later, e.g. to replay part of a game."""
+    rng = game_rng(seed, game_number)
+    if rules.infinite_deck:
+        return InfiniteDeck(rules.get_shoe_length(decks), rules.penetration, rng)
+    return ShoeDeck(generate_shoe(decks, rng), rules.penetration, rng)
+
+
+class GameSlot:
+    """State of one in-flight game: its deck, betting manager and a copy of the algorithm playing it."""
+
+    def __init__(self, algorithm, index, deck, starting_balance):
+        self.algorithm = algorithm
+        self.index = index #position of the game in the engine's scores
+        self.deck = deck
+        self.betting_manager = BettingManager(starting_balance)
+        self.true_count = 0 #count the current round is played at, and the balance at its start, for the algorithm's histogram and event log
+        self.starting_balance = starting_balance
+
+
+class LockstepEngine:
+    """Plays many games at once, advancing every in-flight game by one round at a time.
+    Each in-flight game gets its own copy of the algorithm, so per-game state such as the count is never shared.
+    Finished games are retired and replaced with the next game until every game has been played."""
+
+    def __init__(self, algorithm, games, decks, starting_balance, rules=DEFAULT_RULES, seed=None, concurrent_games=CONCURRENT_GAMES, first_game=0, shoes=None):
+        self.algorithm = algorithm
+        self.games = games
+        self.first_game = first_game #game numbers start here, so chunks of games run in separate processes get different shoes
+        self.decks = decks
+        self.starting_balance = starting_balance
+        self.rules = rules
+        self.seed = seed
+        self.concurrent_games = concurrent_games
+        self.shoes = shoes #ShoeLibrary that games are dealt from, instead of shuffling their shoes
+        self.next_game = 0
+        self.scores = [None] * games #scores of every game, in game order
+        self.tags = count_tags(algorithm.count_alg) #count value of every rank, used to count the cards every dealer drew at once
+
+    def create_deck(self, game_number):
+        """Returns the deck used for a game. Shoes depend only on the seed and the game number, or are read from the shoe library."""
+        if self.shoes is not None:
+            return self.shoes.create_deck(game_number, self.rules.penetration)
+        return create_shoe_deck(self.decks, self.rules, self.seed, game_number)
+
+    def start_game(self):
+        """Returns a slot for the next game to be played, or None if every game has been started."""
+        if self.next_game == self.games:
+            return None
+        game_number = self.first_game + self.next_game
+        algorithm = copy.deepcopy(self.algorithm)
+        if algorithm.histogram is not None:
+            algorithm.enable_histogram()
+        algorithm.game_number = game_number #copies share the algorithm's event log, if it has one
+        slot = GameSlot(algorithm, self.next_game, self.create_deck(game_number), self.starting_balance)
+        self.next_game += 1
+        return slot
+
+    def finish_game(self, slot):
+        """Logs the final balance (same as game()) and stores the slot's scores."""
+        if slot.deck.is_fresh():
+            slot.algorithm.log_score(slot.betting_manager.get_balance())
+        slot.algorithm.log_round()
+        self.scores[slot.index] = slot.algorithm.all_scores.pop()
+        if self.algorithm.histogram is not None:
+            self.algorithm.histogram.merge(slot.algorithm.histogram) #every game's copy of the algorithm starts with an empty histogram
+
+    def run(self):
+        """Plays every game, then appends their scores to the algorithm's all_scores in game order, same as run_games()."""
+        slots = []
+        while len(slots) < self.concurrent_games:
+            slot = self.start_game()
+            if slot is None:
+                break
+            slots.append(slot)
+
+        while slots:
+            self.play_round(slots)
+
+            #retires finished games, replacing them with new ones
+            active_slots = []
+            for slot in slots:
+                if slot.deck.is_fresh() and slot.betting_manager.get_balance() > 0:
+                    active_slots.append(slot)
+                else:
+                    self.finish_game(slot)
+                    new_slot = self.start_game()
+                    if new_slot is not None:
+                        active_slots.append(new_slot)
+            slots = active_slots
+
+        self.algorithm.all_scores += self.scores
+        return self.scores
+
+    def play_round(self, slots):
+        """Plays one round of every slot's game. Players act one hand at a time, then every dealer left to play is resolved in one batch."""
+        pending = [] #(slot, dealer hand, completed hands, classified hands) of games waiting on the dealer
+
+        for slot in slots:
+            algorithm = slot.algorithm
+            betting_manager = slot.betting_manager
+
+            #same as the start of each round in game()
+            algorithm.log_score(betting_manager.get_balance())
+            slot.true_count = algorithm.get_true_count()
+            slot.starting_balance = betting_manager.get_balance()
+            betting_manager.set_bet(algorithm.determine_bet())
+            if betting_manager.get_bet() >= betting_manager.get_balance():
+                betting_manager.set_bet(betting_manager.get_balance())
+            betting_manager.make_bet()
+
+            player_hand = Hand(slot.deck, "PLAYER", algorithm)
+            dealer_hand = Hand(slot.deck, "DEALER", algorithm, hidden=True)
+
+            if self.rules.dealer_peek and dealer_hand.peek_blackjack():
+                dealer_hand.unhide()
+                algorithm.log_hands([player_hand], dealer_hand)
+                betting_manager.payout(betting_manager.get_bet() * TIE_PAYOUT_RATIO if player_hand.blackjack_check() else 0)
+                self.log_outcome(slot)
+                continue
+
+            all_hands = unpack_hands(play_hand(player_hand, dealer_hand, slot.deck, betting_manager, algorithm, self.rules))
+            classified = classify_hands(all_hands, betting_manager, self.rules)
+            dealer_hand.unhide()
+            pending.append((slot, dealer_hand, all_hands, classified))
+
+        #dealers only draw if there is a hand left to beat, and are resolved together if enough of the shoe is left to look ahead
+        batched = []
+        for slot, dealer_hand, all_hands, classified in pending:
+            if classified[2]:
+                if slot.deck.get_card_amount() >= DEALER_LOOKAHEAD:
+                    batched.append((slot, dealer_hand))
+                else:
+                    dealer_plays(dealer_hand, self.rules) #shoe might run out, so the dealer plays normally and the deck reshuffles as usual
+
+        resolved = {} #final (total, blackjack) of every batched dealer, by slot
+        if batched:
+            upcards = [dealer_hand.cards[0].get_value() for slot, dealer_hand in batched]
+            hole_cards = [dealer_hand.cards[1].get_value() for slot, dealer_hand in batched]
+            ranks = np.stack([slot.deck.peek_ranks(DEALER_LOOKAHEAD) for slot, dealer_hand in batched])
+            draws = RANK_VALUES[ranks]
+            totals, busts, cards_drawn, unresolved = resolve_dealers(upcards, hole_cards, draws, self.rules)
+
+            #amount of each value every dealer drew (indexed by value, so 2s start at column 2) and their total count value
+            drawn = np.arange(DEALER_LOOKAHEAD) < cards_drawn[:, None]
+            removed = np.zeros((len(batched), 12), dtype=np.int64)
+            np.add.at(removed, (np.arange(len(batched))[:, None], draws), drawn)
+            count_changes = (self.tags[ranks] * drawn).sum(axis=1)
+
+            for (slot, dealer_hand), amount, removed_values, count_change, total, busted, still_hitting in zip(
+                    batched, cards_drawn.tolist(), removed[:, 2:].tolist(), count_changes.tolist(), totals.tolist(), busts.tolist(), unresolved.tolist()):
+                #dealing and counting the cards the dealer used at once leaves the hand, the count and the shoe exactly as they would be in game()
+                if amount:
+                    cards = slot.deck.deal_cards(amount, removed_values)
+                    dealer_hand.cards += cards
+                    slot.algorithm.count_cards(cards, removed_values, count_change)
+                if still_hitting:
+                    dealer_plays(dealer_hand, self.rules)
+                else:
+                    resolved[slot] = (22 if busted else total, amount == 0 and total == 21) #a two card 21 is a blackjack
+
+        for slot, dealer_hand, all_hands, classified in pending:
+            slot.algorithm.log_hands(all_hands, dealer_hand, bool(classified[2])) #the dealer played, batched or not, if there was a hand left to beat
+            if slot in resolved:
+                payout = settle_totals(*classified, *resolved[slot], slot.betting_manager, self.rules)
+            else:
+                payout = settle_hands(*classified, dealer_hand, slot.betting_manager, self.rules)
+            slot.betting_manager.payout(payout)
+            self.log_outcome(slot)
+
+    def log_outcome(self, slot):
+        """Logs the outcome of a slot's round to its algorithm's histogram and event log, same as game()."""
+        betting_manager = slot.betting_manager
+        slot.algorithm.log_outcome(slot.true_count, (betting_manager.get_balance() - slot.starting_balance) / betting_manager.get_bet(), betting_manager.get_bet())
+
+
+def run_lockstep_games(algorithm, games, decks, starting_balance, rules=DEFAULT_RULES, seed=None, first_game=0, concurrent_games=CONCURRENT_GAMES, shoes=None):
+    """Same as run_games, but plays the games in lockstep with a LockstepEngine. Games are dealt from ShoeDecks seeded by (seed, game number),
+    or from a ShoeLibrary if one is given."""
+    return LockstepEngine(algorithm, games, decks, starting_balance, rules, seed, concurrent_games, first_game, shoes).run()
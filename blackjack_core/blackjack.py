@@ -1,7 +1,10 @@
+import random
 from blackjack_core.blackjack_classes import Deck, Hand
-from blackjack_core.utility import clear_screen, continue_prompt, unpack_hands, sort_hands, BettingManager
-from blackjack_core.game_logic import play_hand, split_hand, calculate_blackjack_payout, dealer_hits, handle_misc_hands
-from blackjack_core.constants import MAX_DECKS
+from blackjack_core.utility import clear_screen, continue_prompt, unpack_hands, BettingManager, SharedCounter
+from blackjack_core.game_logic import play_hand, split_hand, classify_hands, dealer_plays, settle_hands
+from blackjack_core.constants import MAX_DECKS, TIE_PAYOUT_RATIO
+from blackjack_core.rules import DEFAULT_RULES
+from blackjack_core.batch import create_shoe_deck
 
 """
 Modification of blackjack program, designed to collect data regarding the preformance of blackjack algorithms.
@@ -15,88 +18,61 @@ and with player actions being determined by the algorithm defined in algorithms.
 
 
 
-def blackjack_round(deck, betting_manager, algorithm):
+def blackjack_round(deck, betting_manager, algorithm, rules=DEFAULT_RULES):
     """Runs a round of blackjack, returns payout for the player."""
-    payout = 0
-    
-
+    return table_round(deck, [(betting_manager, algorithm)], algorithm, rules)[0]
 
-    #initalizes hands for dealer and player
-    player_hand = Hand(deck, "PLAYER", algorithm)
-    dealer_hand = Hand(deck, "DEALER", algorithm, hidden=True)
-
-    
+def table_round(deck, seats, counter, rules=DEFAULT_RULES):
+    """Runs a round of blackjack for several seats sharing the same deck and dealer, returns a list containing the payout for each seat.
+    Seats are (betting_manager, algorithm) tuples, played in order. Every hand is given the counter to count its cards with, 
+    which is either the algorithm itself (single seat) or a SharedCounter, so that every algorithm sees every card at the table."""
     
 
 
-    completed_hands = play_hand(player_hand, dealer_hand, deck, betting_manager, algorithm) 
-    #returns a list of hands,w/ multiple hands/sublists if the player has split
+    #initalizes hands for the players and dealer
+    player_hands = [Hand(deck, "PLAYER", counter) for seat in seats]
+    dealer_hand = Hand(deck, "DEALER", counter, hidden=True)
 
     
+    if rules.dealer_peek and dealer_hand.peek_blackjack(): #dealer checks for blackjack before the players act, ending the round early
+        dealer_hand.unhide()
+        payouts = []
+        for player_hand, (betting_manager, algorithm) in zip(player_hands, seats):
+            algorithm.log_hands([player_hand], dealer_hand)
+            if player_hand.blackjack_check():
+                payouts.append(betting_manager.get_bet() * TIE_PAYOUT_RATIO)
+            else:
+                payouts.append(0)
+        return payouts
+
+
+    classified_hands = []
+    seat_hands = []
+    for player_hand, (betting_manager, algorithm) in zip(player_hands, seats):
+        completed_hands = play_hand(player_hand, dealer_hand, deck, betting_manager, algorithm, rules) 
+        #returns a list of hands,w/ multiple hands/sublists if the player has split
+
+        all_hands = unpack_hands(completed_hands) #unpacks all hands into a single list of hands
+        seat_hands.append(all_hands)
+        classified_hands.append(classify_hands(all_hands, betting_manager, rules))
 
-    all_hands = unpack_hands(completed_hands) #unpacks all hands into a single list of hands
-
-   
-
-
-
- 
-    busted_hands = [] #list of hands that are busts
-    non_busted_hands = [] #list of hands that are not busts, as well as not blackjacks
-    blackjack_hands = [] #list of hands that are blackjacks
-
-    for hand in all_hands: #for each hand, check if it is a bust     
-        if hand.check_bust():
-            busted_hands.append(hand)
-        elif hand.blackjack_check():
-            blackjack_hands.append(hand)
-        else:
-            non_busted_hands.append(hand)
-
-            
     
     dealer_hand.unhide()
-    
-
-
-    payout += calculate_blackjack_payout(blackjack_hands, dealer_hand, betting_manager) #calculates payout for blackjacks, if any exist
-
-    if not blackjack_hands and dealer_hand.blackjack_check(): #if dealer is the only one with a blackjack, print message and return 0 payout
-            
-            return 0
 
+    #dealer only draws if there is a hand left to beat
+    dealer_played = any(non_busted_hands for surrender_payout, blackjack_hands, non_busted_hands in classified_hands)
+    if dealer_played:
+        dealer_plays(dealer_hand, rules)
 
 
+    payouts = []
+    for (surrender_payout, blackjack_hands, non_busted_hands), all_hands, (betting_manager, algorithm) in zip(classified_hands, seat_hands, seats):
+        algorithm.log_hands(all_hands, dealer_hand, dealer_played)
+        payouts.append(settle_hands(surrender_payout, blackjack_hands, non_busted_hands, dealer_hand, betting_manager, rules))
 
-    
-        
-
-    if not non_busted_hands: 
-        pass
-        
-        return payout #if there are no non-busted hands, payout is returned early instead of going through the rest of the payout checks
-    
-
-    #dealer hits, if they bust, payout is returned early
-    dealer_bust_payout = dealer_hits(dealer_hand, non_busted_hands, betting_manager) 
-    if dealer_bust_payout != 0: 
-        payout += dealer_bust_payout 
-     
-        return payout 
-    
-            
-
-
-
-    sorted_hands = sort_hands(non_busted_hands, dealer_hand) #sorts hands into losing, tieing and winning hands
+    return payouts
 
-    for i in range(len(sorted_hands)):
-        payout += handle_misc_hands(sorted_hands[i], i, betting_manager)
-                
-
-    return payout
-
-def game(betting_manager, deck, algorithm):
+def game(betting_manager, deck, algorithm, rules=DEFAULT_RULES):
     """Runs blackjack with the same deck and bet amount until the player either requests to stop or runs out of money.
     Returns True if the player wants to continue playing, False if they want to stop."""
     
@@ -108,6 +84,8 @@ def game(betting_manager, deck, algorithm):
     
     while deck.is_fresh() and (betting_manager.get_balance() > 0):
         algorithm.log_score(betting_manager.get_balance()) #logs the players balance at the start of the round
+        true_count = algorithm.get_true_count() #count the round is played at, for the algorithm's histogram and event log
+        starting_balance = betting_manager.get_balance()
 
      
 
@@ -123,8 +101,9 @@ def game(betting_manager, deck, algorithm):
             
         
         
-        round_payout = blackjack_round(deck, betting_manager, algorithm)
+        round_payout = blackjack_round(deck, betting_manager, algorithm, rules)
         betting_manager.payout(round_payout) 
+        algorithm.log_outcome(true_count, (betting_manager.get_balance() - starting_balance) / betting_manager.get_bet(), betting_manager.get_bet())
 
        
 
@@ -135,6 +114,71 @@ def game(betting_manager, deck, algorithm):
 
 
     algorithm.log_round()  #logs the entire round
+
+
+def table_game(seats, deck, rules=DEFAULT_RULES):
+    """Runs blackjack for several seats sharing the same deck, until the deck is replenished or every seat runs out of money.
+    Seats are (betting_manager, algorithm) tuples. Seats that run out of money sit out the rest of the game, same as a player would in game()."""
+    counter = SharedCounter([algorithm for betting_manager, algorithm in seats]) #every algorithm sees every card dealt at the table
+
+    active_seats = [seat for seat in seats if seat[0].get_balance() > 0]
+    while deck.is_fresh() and active_seats:
+        true_counts = [] #counts each seat plays the round at, for the algorithms' histograms and event logs
+        starting_balances = []
+        for betting_manager, algorithm in active_seats:
+            algorithm.log_score(betting_manager.get_balance()) #logs the players balance at the start of the round
+            true_counts.append(algorithm.get_true_count())
+            starting_balances.append(betting_manager.get_balance())
+
+            betting_manager.set_bet(algorithm.determine_bet()) #gets the bet amount from the algorithm, sets it in the betting manager 
+            if betting_manager.get_bet() >= betting_manager.get_balance(): 
+                betting_manager.set_bet(betting_manager.get_balance()) #if the bet is greater than the balance, set it to the balance
+            betting_manager.make_bet()
+
+        round_payouts = table_round(deck, active_seats, counter, rules)
+
+        for (betting_manager, algorithm), round_payout, true_count, starting_balance in zip(active_seats, round_payouts, true_counts, starting_balances):
+            betting_manager.payout(round_payout)
+            algorithm.log_outcome(true_count, (betting_manager.get_balance() - starting_balance) / betting_manager.get_bet(), betting_manager.get_bet())
+            if betting_manager.get_balance() <= 0 and deck.is_fresh():
+                algorithm.log_score(betting_manager.get_balance()) #same as game(), the final balance is only logged if the deck has not been replenished
+
+        active_seats = [seat for seat in active_seats if seat[0].get_balance() > 0]
+
+    for betting_manager, algorithm in seats:
+        algorithm.log_round()  #logs the entire round
+
+
+def create_deck(decks, rules, seed, game_number, shoes=None):
+    """Returns the deck a game is played with: the game's shoe if a ShoeLibrary is given, otherwise a new Deck seeded from (seed, game number).
+    Infinite decks are dealt the same way as in the lockstep engine."""
+    if shoes is not None:
+        return shoes.create_deck(game_number, rules.penetration)
+    if rules.infinite_deck:
+        return create_shoe_deck(decks, rules, seed, game_number)
+    if seed is not None:
+        random.seed(f"{seed}:{game_number}")
+    return Deck(decks, rules.penetration)
+
+def run_games(algorithm, games, decks, starting_balance, rules=DEFAULT_RULES, seed=None, first_game=0, shoes=None):
+    """Plays the specified amount of games, each with a new deck and balance, logging every score to the algorithm.
+    If a seed is given, every game is seeded from (seed, game number), so a game plays out the same way no matter which games are run before it.
+    If a ShoeLibrary is given, game i is dealt its shoe i instead."""
+    for game_number in range(first_game, first_game + games):
+        deck = create_deck(decks, rules, seed, game_number, shoes)
+        betting_manager = BettingManager(starting_balance)
+        algorithm.game_number = game_number #labels the game's records in the event log
+        game(betting_manager, deck, algorithm, rules)
+
+
+def run_table_games(algorithms, games, decks, starting_balance, rules=DEFAULT_RULES, seed=None, first_game=0, shoes=None):
+    """Same as run_games, but with every algorithm sitting at the same table, in order, sharing each game's deck."""
+    for game_number in range(first_game, first_game + games):
+        deck = create_deck(decks, rules, seed, game_number, shoes)
+        seats = [(BettingManager(starting_balance), algorithm) for algorithm in algorithms]
+        for algorithm in algorithms:
+            algorithm.game_number = game_number
+        table_game(seats, deck, rules)
     
 
 
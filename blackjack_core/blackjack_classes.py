@@ -1,12 +1,16 @@
 import random
+import numpy as np
 """Contains classes pertaining to the cards in a game of blackjack."""
 
 
 class Deck:
-    def __init__(self, amount=1):
-        """Creates a deck, then appends it to self until quantity of decks is reached."""
+    def __init__(self, amount=1, penetration=1):
+        """Creates a deck, then appends it to self until quantity of decks is reached.
+        Penetration is the fraction of the deck dealt before it stops being fresh (see Rules)."""
         self.amount = amount
         self.cards = []
+        self.cut_card = round(amount * 52 * (1 - penetration)) #deck is no longer fresh once fewer cards than this remain
+        self.composition = [] #amount of cards left of each value, index 0 is 2s and index 9 is Aces (see get_composition)
 
         self.standard_deck = []
 
@@ -36,7 +40,13 @@ class Deck:
             #but due to the amount of unique contexts that prompt would have to appear in, making them all fit the UI is beyond my current scope
             card_index = random.randrange(len(self.cards))
 
-        return self.cards.pop(card_index)
+        card = self.cards.pop(card_index)
+        self.composition[card.get_value() - 2] -= 1 #keeps the composition up to date without rescanning the deck
+
+        if len(self.cards) < self.cut_card: #cut card has been reached, the current round is the last one
+            self.fresh_deck = False
+
+        return card
     
     def construct_deck(self):
         """Creates the deck by appending the standard deck to self.amount times."""
@@ -45,6 +55,8 @@ class Deck:
         for i in range(self.amount):
             self.cards += self.standard_deck
 
+        self.composition = [4 * self.amount] * 8 + [16 * self.amount, 4 * self.amount] #2-9 have 4 cards per deck, 10-K have 16, Aces have 4
+
     def is_fresh(self):
         """Returns True if the deck is fresh, i.e. has not been reconstructed since the last draw.
         Returns False if the deck has been reconstructed."""
@@ -57,7 +69,7 @@ class Deck:
         #however the primary pupose of this program is a skeleton for an automated program without print statements so it's not worth overhauling the code
 
         round_start_message = "ROUND START!"
-        deck_message = f"DECK: {len(self.cards):>3}"
+        deck_message = f"DECK: {self.get_card_amount():>3}"
         if round_start:
             print(f"{round_start_message:<20}{deck_message} cards")
         else:
@@ -66,6 +78,11 @@ class Deck:
     def get_card_amount(self):
         """Returns the number of cards left in the deck."""
         return len(self.cards)
+
+    def get_composition(self):
+        """Returns a tuple containing the amount of cards left of each value, from 2s (index 0) to Aces (index 9).
+        Face cards are counted as 10s, since only the value of a card matters for scoring."""
+        return tuple(self.composition)
     
     
         
@@ -81,6 +98,9 @@ class Hand:
         self.standing = False
         self.doubled_down = 1 #doubled_down is 1 if player did not double down, 2 if they did
         self.hidden = hidden #hidden is true if the dealer's second card is hidden, false if it is not
+        self.from_split = starting_card != None #split hands may not be allowed to double down, depending on the rules
+        self.surrendered = False
+        self.actions = [] #selections made with the hand, in order (including ones that failed), recorded by the event log
         
 
         if starting_card != None: #allows for a starting card to be passed in, used for split hands
@@ -183,6 +203,20 @@ class Hand:
         """Sets standing to True, ending the round for the hand."""
         self.standing = True
 
+    def surrender(self):
+        """Surrenders the hand, ending the round for it. Half the bet is returned when the round is scored."""
+        self.surrendered = True
+        self.standing = True
+
+    def check_surrendered(self):
+        """Returns True if the hand has been surrendered, otherwise returns False."""
+        return self.surrendered
+
+    def peek_blackjack(self):
+        """Returns True if the hand is a blackjack, regardless of whether the second card is hidden.
+        Used by the dealer to peek at their hole card."""
+        return len(self.cards) == 2 and self.cards[0].get_value() + self.cards[1].get_value() == 21
+
     def get_doubled_down(self):
         """Returns the doubled down value of the hand, which is 1 if the player did not double down, and 2 if they did."""  
         return self.doubled_down
@@ -232,6 +266,12 @@ class Hand:
 
         #reuses code from get_total() to calculate the total and ace count
         #if the amount of aces not reduced to 1 is non-zero, the hand is soft
+        hand_total = 0
+        ace_count = 0
+
+        if self.hidden == True: #only the unhidden card is considered, same as get_total()
+            return self.cards[0].get_value() == 11
+
         for card in self.cards:
             hand_total += card.get_value()
             if card.get_value() == 11:
@@ -285,4 +325,153 @@ class Card:
     def get_value(self):
         """Returns rank of the card, unless the rank corresponds to a card with a special value (Aces and Face Cards). 
         In that case, the value is taken from the special values dictionary"""
-        return Card.special_values.get(self.rank, self.rank) #if special value is not found, returns second value
\ No newline at end of file
+        return Card.special_values.get(self.rank, self.rank) #if special value is not found, returns second value
+
+
+
+def generate_shoe(decks, rng):
+    """Returns a shuffled shoe as an array of ranks (1-13), using a NumPy random generator."""
+    ranks = np.repeat(np.arange(1, 14, dtype=np.uint8), 4 * decks) #4 suits per rank per deck
+    rng.shuffle(ranks)
+    return ranks
+
+
+#one card object per rank and suit, shared by every ShoeDeck since cards are never modified
+CARD_TABLE = [None] + [[Card(rank, suit) for suit in range(4)] for rank in range(1, 14)]
+
+
+INFINITE_BUFFER_SIZE = 1024 #ranks generated at once by an InfiniteDeck
+
+
+class ShoeDeck(Deck):
+    """Deck whose cards are dealt in a fixed order, taken from an array of ranks (e.g. a pre-shuffled shoe).
+    Dealing the same ranks always plays out the same way, which lets different engines be compared on identical shoes.
+    If the shoe runs out, a new one is shuffled with the deck's random generator, same as Deck reconstructing itself."""
+
+    def __init__(self, ranks, penetration=1, rng=None):
+        self.amount = len(ranks) // 52
+        self.cut_card = round(len(ranks) * (1 - penetration)) #deck is no longer fresh once fewer cards than this remain
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        self.ranks = ranks
+        self.rank_view = memoryview(np.ascontiguousarray(ranks, dtype=np.uint8)) #indexes the shared array without copying it (e.g. a memory-mapped shoe), returning plain ints
+        self.cursor = 0 #index of the next card to be dealt
+        self.composition = [4 * self.amount] * 8 + [16 * self.amount, 4 * self.amount]
+        self.cards = []
+        self.fresh_deck = True
+
+    def draw_card(self):
+        """Returns the next card in the shoe. In the case that the shoe is empty, shuffles a new one beforehand."""
+        if self.cursor == len(self.rank_view):
+            self.construct_deck()
+
+        rank = self.rank_view[self.cursor]
+        card = CARD_TABLE[rank][self.cursor % 4] #suits don't affect the game, they are only varied so printed hands are readable
+        self.cursor += 1
+        self.composition[card.get_value() - 2] -= 1
+
+        if len(self.rank_view) - self.cursor < self.cut_card: #cut card has been reached, the current round is the last one
+            self.fresh_deck = False
+
+        return card
+
+    def construct_deck(self):
+        """Replaces the shoe with a newly shuffled one."""
+        self.fresh_deck = False
+
+        self.ranks = generate_shoe(self.amount, self.rng)
+        self.rank_view = memoryview(self.ranks)
+        self.cursor = 0
+        self.composition = [4 * self.amount] * 8 + [16 * self.amount, 4 * self.amount]
+
+    def deal_cards(self, amount, removed):
+        """Deals the next amount cards at once, same as calling draw_card() amount times, given the amount of each value they remove from the composition.
+        The shoe must have at least amount cards left."""
+        start = self.cursor
+        self.cursor += amount
+        self.composition = [count - removed_amount for count, removed_amount in zip(self.composition, removed)]
+        if len(self.rank_view) - self.cursor < self.cut_card:
+            self.fresh_deck = False
+        return [CARD_TABLE[self.rank_view[index]][index % 4] for index in range(start, self.cursor)]
+
+    def get_card_amount(self):
+        """Returns the number of cards left in the shoe."""
+        return len(self.rank_view) - self.cursor
+
+    def peek_ranks(self, amount):
+        """Returns an array containing the ranks of the next cards in the shoe, without dealing them. May be shorter than amount near the end of the shoe."""
+        return self.ranks[self.cursor:self.cursor + amount]
+
+
+class InfiniteDeck(Deck):
+    """Deck made of infinitely many decks, so cards are drawn with replacement and every rank always has a 1/13 chance of being dealt.
+    Ranks are generated in bulk with a NumPy random generator, into a buffer that is dealt by cursor and refilled once used up.
+    The deck never runs out, so it is dealt as a pseudo-shoe of shoe_length cards: the cut card and reshuffle work the same way as in a finite shoe,
+    which keeps game() ending at the same point."""
+
+    def __init__(self, shoe_length=52, penetration=1, rng=None, buffer_size=INFINITE_BUFFER_SIZE):
+        self.amount = max(1, shoe_length // 52) #decks the (unchanging) composition is reported for
+        self.shoe_length = shoe_length
+        self.cut_card = round(shoe_length * (1 - penetration)) #deck is no longer fresh once fewer cards than this remain in the pseudo-shoe
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.buffer_size = buffer_size
+
+        self.ranks = np.zeros(0, dtype=np.uint8) #buffer of upcoming ranks
+        self.rank_list = [] #plain list of the buffer, since indexing numpy arrays one card at a time is slow
+        self.cursor = 0 #index of the next card in the buffer
+        self.dealt = 0 #cards dealt from the current pseudo-shoe
+        self.composition = [4 * self.amount] * 8 + [16 * self.amount, 4 * self.amount] #drawing with replacement never changes the composition
+        self.cards = []
+        self.fresh_deck = True
+
+    def fill_buffer(self, amount=1):
+        """Adds ranks to the buffer until at least amount of them haven't been dealt, dropping the ones that have.
+        Ranks are always generated buffer_size at a time, so the cards dealt don't depend on when the buffer is refilled."""
+        new_ranks = [self.ranks[self.cursor:]]
+        while sum(len(ranks) for ranks in new_ranks) < amount:
+            new_ranks.append(self.rng.integers(1, 14, size=self.buffer_size, dtype=np.uint8))
+        self.ranks = np.concatenate(new_ranks)
+        self.rank_list = self.ranks.tolist()
+        self.cursor = 0
+
+    def draw_card(self):
+        """Returns a random card. In the case that the pseudo-shoe has been dealt, starts a new one beforehand."""
+        if self.dealt == self.shoe_length:
+            self.construct_deck()
+        if self.cursor == len(self.rank_list):
+            self.fill_buffer()
+
+        rank = self.rank_list[self.cursor]
+        card = CARD_TABLE[rank][self.cursor % 4] #suits don't affect the game, they are only varied so printed hands are readable
+        self.cursor += 1
+        self.dealt += 1
+
+        if self.shoe_length - self.dealt < self.cut_card: #cut card has been reached, the current round is the last one
+            self.fresh_deck = False
+
+        return card
+
+    def construct_deck(self):
+        """Starts a new pseudo-shoe. Nothing has to be shuffled, since cards are drawn with replacement."""
+        self.fresh_deck = False
+        self.dealt = 0
+
+    def deal_cards(self, amount, removed):
+        """Deals the next amount cards at once, same as calling draw_card() amount times. Drawing with replacement never changes the composition,
+        so removed is only accepted to match ShoeDeck. The pseudo-shoe and the buffer must have at least amount cards left (see peek_ranks)."""
+        start = self.cursor
+        self.cursor += amount
+        self.dealt += amount
+        if self.shoe_length - self.dealt < self.cut_card:
+            self.fresh_deck = False
+        return [CARD_TABLE[self.rank_list[index]][index % 4] for index in range(start, self.cursor)]
+
+    def get_card_amount(self):
+        """Returns the number of cards left in the pseudo-shoe."""
+        return self.shoe_length - self.dealt
+
+    def peek_ranks(self, amount):
+        """Returns an array containing the ranks of the next cards, without dealing them."""
+        if len(self.rank_list) - self.cursor < amount:
+            self.fill_buffer(amount)
+        return self.ranks[self.cursor:self.cursor + amount]
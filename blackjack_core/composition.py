@@ -0,0 +1,108 @@
+"""
+Contains the CompositionTracker class, which keeps track of the cards left in the shoe from the player's point of view.
+Compositions are stored as the amount of cards left of each value, from 2s (index 0) to Aces (index 9), the same layout used by Deck.get_composition().
+"""
+
+
+CARDS_PER_DECK = 52
+
+
+def full_composition(decks=1):
+    """Returns the composition of a full shoe containing the specified amount of decks."""
+    return tuple([4 * decks] * 8 + [16 * decks, 4 * decks]) #2-9 have 4 cards per deck, 10-K have 16, Aces have 4
+
+
+class CompositionTracker:
+    """Tracks the remaining composition of the shoe and the running count, updating both in constant time for every card seen.
+    Shared with the selection, counting and betting algorithms through BlackjackAlgorithm, so any of them can read the state of the shoe."""
+
+    def __init__(self, decks, infinite_deck=False, shoe_length=None):
+        """For an infinite deck, the composition never changes and only the cards left in the pseudo-shoe of shoe_length cards are tracked."""
+        self.decks = decks
+        self.infinite_deck = infinite_deck
+        self.shoe_length = shoe_length if shoe_length is not None else decks * CARDS_PER_DECK
+        self.reset()
+
+    def reset(self):
+        """Resets the tracker to a full shoe, used when the shoe is replaced or reshuffled."""
+        self.counts = list(full_composition(self.decks))
+        self.remaining = self.shoe_length
+        self.running_count = 0
+
+    def record(self, card, count_change=0):
+        """Removes a seen card from the composition and adds its count value to the running count."""
+        if self.infinite_deck:
+            if self.remaining == 0: #pseudo-shoe has been dealt, so the card is the first of a new one
+                self.reset()
+            self.remaining -= 1
+            self.running_count += count_change
+            return
+
+        index = card.get_value() - 2
+
+        if self.counts[index] == 0: #card can't be in the current shoe, so the deck must have been reshuffled
+            self.reset()
+
+        self.counts[index] -= 1
+        self.remaining -= 1
+        self.running_count += count_change
+
+    def record_cards(self, removed, count_change=0):
+        """Same as record() for several cards at once, given the amount of each value removed and their total count value.
+        Returns False without changing anything if a card can't be in the current shoe (so the tracker would be reset part way), in which case
+        the cards have to be recorded one at a time."""
+        amount = sum(removed)
+        if self.infinite_deck:
+            if self.remaining < amount:
+                return False
+        else:
+            if any(count < removed_amount for count, removed_amount in zip(self.counts, removed)):
+                return False
+            self.counts = [count - removed_amount for count, removed_amount in zip(self.counts, removed)]
+
+        self.remaining -= amount
+        self.running_count += count_change
+        return True
+
+    def get_composition(self):
+        """Returns a tuple containing the amount of cards left of each value."""
+        return tuple(self.counts)
+
+    def get_cards_remaining(self):
+        """Returns the amount of unseen cards left in the shoe."""
+        return self.remaining
+
+    def get_cards_played(self):
+        """Returns the amount of cards seen since the shoe was last reset."""
+        return self.shoe_length - self.remaining
+
+    def get_decks_remaining(self):
+        """Returns the amount of unseen decks left in the shoe."""
+        return self.remaining / CARDS_PER_DECK
+
+    def get_running_count(self):
+        """Returns the running count."""
+        return self.running_count
+
+    def get_true_count(self):
+        """Returns the true count, i.e. the running count divided by the amount of decks remaining.
+        Returns 0 if the shoe has run out of unseen cards."""
+        if self.remaining == 0:
+            return 0
+        return self.running_count * CARDS_PER_DECK / self.remaining
+
+    def get_density(self, value):
+        """Returns the fraction of the remaining cards that have the given value (Aces are 11)."""
+        if self.infinite_deck:
+            return self.counts[value - 2] / (self.decks * CARDS_PER_DECK)
+        if self.remaining == 0:
+            return 0
+        return self.counts[value - 2] / self.remaining
+
+    def get_densities(self):
+        """Returns a list containing the fraction of the remaining cards that have each value."""
+        if self.infinite_deck:
+            return [count / (self.decks * CARDS_PER_DECK) for count in self.counts]
+        if self.remaining == 0:
+            return [0] * len(self.counts)
+        return [count / self.remaining for count in self.counts]
@@ -6,4 +6,6 @@ WIN_PAYOUT_RATIO = 2
 TIE_PAYOUT_RATIO = 1
 LOSS_PAYOUT_RATIO = 0
 MAX_DECKS = 100 
-STARTING_BALANCE = 5000 #starting balance for the player
\ No newline at end of file
+STARTING_BALANCE = 5000 #starting balance for the player
+MAX_SPLITS = 3 #amount of times the player can split in a single round
+DEALER_STAND_TOTAL = 17 #dealer stops hitting once their total reaches this value (soft totals depend on the rules used)
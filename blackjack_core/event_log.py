@@ -0,0 +1,180 @@
+import os
+import numpy as np
+from blackjack_core.constants import TIE_PAYOUT_RATIO, WIN_PAYOUT_RATIO, LOSS_PAYOUT_RATIO
+
+"""
+Hand-level event log, written as packed fixed-width binary records so that long simulations can be analysed afterwards without re-simulating them.
+Every completed hand becomes one record, containing its cards, the selections made with it, the dealer's cards, its bet and its payout.
+
+Files start with a short header, followed by the records. read_events() maps a file into a NumPy structured array (see EVENT_DTYPE),
+so questions such as the dealer's bust rate by upcard are a couple of array operations. Records are written in the order rounds finish,
+which is not game order for engines that play several games at once, so sort by ("game", "round", "hand") if order matters.
+"""
+
+
+MAGIC = b"BJEVENTS"
+VERSION = 2
+HEADER_SIZE = 16 #magic, version and record size
+EVENT_BUFFER_SIZE = 4096 #records held in memory before they are written to the file
+MAX_CARDS = 16 #cards (and selections) stored per hand, hands with more than this are truncated, which is practically impossible
+
+#bits of the flags field
+FROM_SPLIT = 1
+DOUBLED = 2
+SURRENDERED = 4
+DEALER_PLAYED = 8 #the dealer drew to a final total, since the round had a hand left to beat
+
+#values of the outcome field
+OUTCOMES = ("loss", "push", "win", "blackjack", "surrender", "bust")
+LOSS, PUSH, WIN, BLACKJACK, SURRENDER, BUST = range(len(OUTCOMES))
+
+#cards are stored as ranks (1-13, 0 is an empty slot) and selections as their number (1-5, see play_hand)
+EVENT_DTYPE = np.dtype([
+    ("game", "<u4"),
+    ("round", "<u2"),
+    ("hand", "<u1"), #position of the hand within the round, more than one only if the player split
+    ("flags", "<u1"),
+    ("true_count", "<f4"), #true count at the start of the round
+    ("bet", "<i8"), #amount bet on the hand, including the extra bet if it doubled down
+    ("payout", "<i8"), #amount paid out for the hand, including the returned bet
+    ("outcome", "<u1"),
+    ("total", "<u1"),
+    ("dealer_total", "<u1"),
+    ("card_amount", "<u1"),
+    ("action_amount", "<u1"),
+    ("dealer_card_amount", "<u1"),
+    ("cards", "<u1", (MAX_CARDS,)),
+    ("actions", "<u1", (MAX_CARDS,)),
+    ("dealer_cards", "<u1", (MAX_CARDS,)),
+])
+
+
+def round_totals(hands, dealer_hand):
+    """Returns (hand totals, dealer total, dealer blackjack, dealer blackjack wins) of a completed round, as needed by hand_outcome()."""
+    totals = [hand.get_total() for hand in hands]
+    dealer_total = dealer_hand.get_total()
+    dealer_blackjack = dealer_total == 21 and len(dealer_hand.cards) == 2
+    any_blackjack = any(total == 21 and len(hand.cards) == 2 and not hand.check_surrendered() for hand, total in zip(hands, totals))
+    return totals, dealer_total, dealer_blackjack, dealer_blackjack and not any_blackjack
+
+def hand_outcome(hand, total, dealer_total, dealer_blackjack, dealer_blackjack_wins, bet, rules):
+    """Returns (outcome, payout) of a single completed hand, following the same order as classify_hands() and settle_hands().
+    Totals are passed in, since they are slow to recalculate. Blackjack payouts are rounded per hand,
+    so for a round with several split blackjacks the payouts may differ from settle_hands() by a rounding unit."""
+    if dealer_blackjack_wins: #dealer blackjack takes every bet, unless the player has a blackjack
+        return (SURRENDER if hand.check_surrendered() else BUST if total > 21 else LOSS), 0
+    if hand.check_surrendered():
+        return SURRENDER, round(bet * rules.surrender_ratio)
+    if total > 21:
+        return BUST, 0
+    if total == 21 and len(hand.cards) == 2:
+        return BLACKJACK, round(bet * (TIE_PAYOUT_RATIO if dealer_blackjack else rules.blackjack_ratio))
+
+    stake = bet * hand.get_doubled_down()
+    if dealer_total > 21 or total > dealer_total:
+        return WIN, stake * WIN_PAYOUT_RATIO
+    if total == dealer_total:
+        return PUSH, stake * TIE_PAYOUT_RATIO
+    return LOSS, stake * LOSS_PAYOUT_RATIO
+
+
+class EventWriter:
+    """Buffered writer of hand records. Records are collected as tuples and converted to binary in one NumPy call once the buffer fills up, and when the writer is closed.
+    Copies of an algorithm share its writer (see __deepcopy__), so engines that copy the algorithm for every game still write to the same file."""
+
+    def __init__(self, file_name, buffer_size=EVENT_BUFFER_SIZE):
+        self.file_name = file_name
+        self.buffer_size = buffer_size
+        self.file = open(file_name, "wb")
+        self.file.write(MAGIC + np.array([VERSION, EVENT_DTYPE.itemsize], dtype="<u4").tobytes())
+        self.records = [] #records waiting to be written, in the same order as the fields of EVENT_DTYPE
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def write_round(self, game, round_number, true_count, bet, hands, dealer_hand, rules, dealer_played=False):
+        """Adds a record for every completed hand of a round. dealer_played is whether the dealer played out their hand (see dealer_plays)."""
+        totals, dealer_total, dealer_blackjack, dealer_blackjack_wins = round_totals(hands, dealer_hand)
+        dealer_ranks = [card.rank for card in dealer_hand.cards[:MAX_CARDS]]
+
+        for index, (hand, total) in enumerate(zip(hands, totals)):
+            outcome, payout = hand_outcome(hand, total, dealer_total, dealer_blackjack, dealer_blackjack_wins, bet, rules)
+            ranks = [card.rank for card in hand.cards[:MAX_CARDS]]
+            actions = [int(action) for action in hand.actions[:MAX_CARDS]]
+            flags = FROM_SPLIT * hand.from_split | DOUBLED * (hand.get_doubled_down() == 2) | SURRENDERED * hand.check_surrendered() | DEALER_PLAYED * dealer_played
+
+            self.records.append((game, round_number, index, flags, true_count, bet * hand.get_doubled_down(), payout, outcome,
+                                 min(total, 255), min(dealer_total, 255), len(ranks), len(actions), len(dealer_ranks),
+                                 ranks + [0] * (MAX_CARDS - len(ranks)), actions + [0] * (MAX_CARDS - len(actions)), dealer_ranks + [0] * (MAX_CARDS - len(dealer_ranks))))
+
+        if len(self.records) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered records to the file."""
+        if self.records:
+            self.file.write(np.array(self.records, dtype=EVENT_DTYPE).tobytes())
+            self.records = []
+        self.file.flush()
+
+    def close(self):
+        """Writes any buffered records and closes the file."""
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def read_events(file_name):
+    """Returns the records of an event log as a read-only, memory-mapped NumPy structured array."""
+    with open(file_name, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if header[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{file_name} is not an event log.")
+    version, record_size = np.frombuffer(header[len(MAGIC):], dtype="<u4")
+    if version != VERSION or record_size != EVENT_DTYPE.itemsize:
+        raise ValueError(f"{file_name} was written by an incompatible version of the event log.")
+
+    if os.path.getsize(file_name) == HEADER_SIZE:
+        return np.zeros(0, dtype=EVENT_DTYPE)
+    return np.memmap(file_name, dtype=EVENT_DTYPE, mode="r", offset=HEADER_SIZE)
+
+def merge_event_logs(file_name, part_names):
+    """Concatenates several event logs (e.g. one per worker process) into one file, deleting the parts."""
+    with EventWriter(file_name) as writer:
+        writer.flush()
+        for part_name in part_names:
+            with open(part_name, "rb") as part:
+                part.seek(HEADER_SIZE)
+                while True:
+                    chunk = part.read(1 << 20)
+                    if not chunk:
+                        break
+                    writer.file.write(chunk)
+            os.remove(part_name)
+
+def dealer_bust_rates(events):
+    """Returns a dictionary of upcard value: fraction of rounds the dealer busted with it, counting every round once.
+    Rounds where the dealer didn't need to play (every hand busted, surrendered or was a blackjack) are left out."""
+    rounds = events[events["hand"] == 0]
+    rounds = rounds[(rounds["flags"] & DEALER_PLAYED) != 0]
+    upcards = np.minimum(rounds["dealer_cards"][:, 0], 10)
+    upcards = np.where(upcards == 1, 11, upcards)
+    busted = rounds["dealer_total"] > 21
+
+    rates = {}
+    for upcard in range(2, 12):
+        played = upcards == upcard
+        if played.any():
+            rates[upcard] = float(busted[played].mean())
+    return rates
+
+def action_frequencies(events):
+    """Returns a dictionary of selection number: fraction of hands where it was selected at least once."""
+    actions = events["actions"]
+    return {selection: float((actions == selection).any(axis=1).mean()) for selection in range(1, 6)} if len(events) else {}
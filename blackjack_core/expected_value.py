@@ -0,0 +1,308 @@
+from functools import lru_cache
+from itertools import islice
+import numpy as np
+from blackjack_core.blackjack_classes import Hand, Card
+from blackjack_core.rules import DEFAULT_RULES
+
+"""
+Calculates the exact expected value of a round of blackjack, given the composition of the remaining shoe and a selection algorithm.
+Compositions are tuples containing the amount of cards left of each value, from 2s (index 0) to Aces (index 9), as returned by Deck.get_composition() and CompositionTracker.get_composition().
+
+The calculation walks every possible deal, asking the selection algorithm what it would do with each hand, and weights the outcomes by the probability of drawing them.
+Dealer outcomes are computed from the composition left after the player's cards are removed, so the result is exact for hands that are not split.
+Split hands are approximated by playing each hand separately against the composition left after the pair is removed, which is how most combinatorial analyzers handle them.
+The selection algorithm is assumed to only depend on the hands passed to it, since results are cached per composition.
+
+The dealer's outcomes only depend on which cards the dealer has drawn, not their order, so the hands the dealer hits on are built once per upcard as a small graph
+(see DealerGraph) and every composition is evaluated on it with NumPy. A full round still takes a few seconds, mostly asking the selection algorithm about
+every hand, which is why results are cached. Memos are limited to memo_size entries each, evicting the oldest half once full, so a calculator kept for many
+compositions doesn't grow without bound.
+"""
+
+
+EV_CACHE_SIZE = 256 #amount of compositions whose expected value is kept in memory
+MEMO_SIZE = 200000 #entries kept in each of a calculator's memos
+
+#outcomes of the dealer's hand, used to index the tuples returned by dealer_probabilities()
+DEALER_OUTCOMES = ("17", "18", "19", "20", "21", "Bust", "Blackjack")
+BUST = 5
+BLACKJACK = 6
+
+ACE = 11
+TEN = 10
+
+#card objects used to build hypothetical hands, one per value since suits and face cards don't affect scoring
+CARDS_BY_VALUE = {value: Card(value, 0) for value in range(2, 11)}
+CARDS_BY_VALUE[ACE] = Card(1, 0)
+
+
+def remove_card(composition, value):
+    """Returns the composition with a single card of the given value removed."""
+    composition = list(composition)
+    composition[value - 2] -= 1
+    return tuple(composition)
+
+
+class HypotheticalHand(Hand):
+    """Hand built from a list of card values instead of being drawn from a deck.
+    Inherits the scoring methods of Hand, so selection algorithms see it exactly the same way they see a real hand."""
+    def __init__(self, values, hidden=False, from_split=False):
+        self.cards = [CARDS_BY_VALUE[value] for value in values]
+        self.deck = None
+        self.name = "DEALER" if hidden else "PLAYER"
+        self.algorithm = None
+        self.standing = False
+        self.doubled_down = 1
+        self.hidden = hidden
+        self.from_split = from_split
+        self.surrendered = False
+
+
+class DealerGraph:
+    """Every hand the dealer hits on for an upcard, found once for a set of rules, which gives the dealer's outcome probabilities for any composition.
+    A hand is the multiset of cards the dealer has drawn after the upcard, so hands reached in a different order are the same node. Nodes are grouped by the
+    amount of cards drawn, and each level's draws are stored as arrays: the node drawing, the card drawn, how many of that card the node already holds and the
+    node (or outcome, numbered after the nodes) the draw leads to."""
+
+    def __init__(self, upcard, rules=DEFAULT_RULES):
+        self.upcard = upcard
+        #if the dealer has peeked, the hole card can't complete a blackjack, so it is drawn from the composition without those cards
+        self.excluded = None
+        if rules.dealer_peek and upcard in (ACE, TEN):
+            self.excluded = (TEN if upcard == ACE else ACE) - 2
+
+        start = (1, True) if upcard == ACE else (upcard, False) #hard total (aces counted as 1) and whether the hand holds an ace
+        nodes = {(0,) * 10: 0}
+        level_hands = {(0,) * 10: start}
+        level_draws = []
+        self.level_starts = [0, 1] #index of the first node in each level, the root being the only one drawing the hole card
+        while level_hands:
+            first = not level_draws #drawing the hole card
+            next_hands = {}
+            draws = []
+            for drawn, (hard_total, has_ace) in level_hands.items():
+                for index in range(10):
+                    if first and index == self.excluded:
+                        continue
+                    value = index + 2
+                    new_hard_total = hard_total + (1 if value == ACE else value)
+                    new_has_ace = has_ace or value == ACE
+                    soft = new_has_ace and new_hard_total <= 11
+                    total = new_hard_total + 10 if soft else new_hard_total
+
+                    if total > 21:
+                        destination = ("outcome", BUST)
+                    elif first and total == 21:
+                        destination = ("outcome", BLACKJACK)
+                    elif not rules.dealer_hit_table[soft][total]:
+                        destination = ("outcome", total - 17)
+                    else:
+                        new_drawn = drawn[:index] + (drawn[index] + 1,) + drawn[index + 1:]
+                        if new_drawn not in nodes:
+                            nodes[new_drawn] = len(nodes)
+                            next_hands[new_drawn] = (new_hard_total, new_has_ace)
+                        destination = ("node", nodes[new_drawn])
+                    draws.append((nodes[drawn], index, drawn[index], destination))
+            level_draws.append(draws)
+            self.level_starts.append(len(nodes))
+            level_hands = next_hands
+
+        self.node_amount = len(nodes)
+        self.levels = []
+        for draws in level_draws:
+            sources, cards, held, destinations = zip(*draws)
+            destinations = [self.node_amount + target if kind == "outcome" else target for kind, target in destinations]
+            self.levels.append((np.array(sources), np.array(cards), np.array(held, dtype=np.float64), np.array(destinations)))
+
+    def probabilities(self, composition):
+        """Returns a tuple containing the probability of each of the dealer's final outcomes (see DEALER_OUTCOMES) when dealt from the composition,
+        which must not contain the upcard."""
+        counts = np.array(composition, dtype=np.float64)
+        cards = counts.sum()
+        reached = np.zeros(self.node_amount + len(DEALER_OUTCOMES))
+        reached[0] = 1.0
+        for level, (sources, drawn_cards, held, destinations) in enumerate(self.levels):
+            if cards - level <= 0:
+                #an empty composition would be reshuffled in a real game, it is treated as the dealer standing since it's vanishingly rare
+                reached[self.node_amount] += reached[self.level_starts[level]:self.level_starts[level + 1]].sum()
+                break
+            remaining = cards - level
+            if level == 0 and self.excluded is not None:
+                remaining = max(remaining - counts[self.excluded], 1) #without any other cards left, no draws have a non-zero probability
+            weights = reached[sources] * np.maximum(counts[drawn_cards] - held, 0) / remaining
+            reached += np.bincount(destinations, weights, len(reached))
+        return tuple(reached[self.node_amount:].tolist())
+
+
+class ExpectedValueCalculator:
+    """Calculates expected values for a single selection algorithm and set of rules.
+    Intermediate results are memoized (up to memo_size of each kind), so reusing one calculator for similar compositions is faster than creating a new one."""
+
+    def __init__(self, selection_alg, rules=DEFAULT_RULES, memo_size=MEMO_SIZE):
+        self.selection_alg = selection_alg
+        self.rules = rules
+        self.memo_size = memo_size
+        self.dealer_memo = {}
+        self.player_memo = {}
+        self.dealer_graphs = {upcard: DealerGraph(upcard, rules) for upcard in CARDS_BY_VALUE}
+
+    def clear(self):
+        """Clears the memoized intermediate results, freeing their memory."""
+        self.dealer_memo = {}
+        self.player_memo = {}
+
+    def remember(self, memo, key, value):
+        """Stores a memoized result, evicting the oldest half of the memo (dictionaries keep insertion order) once it holds memo_size entries."""
+        if len(memo) >= self.memo_size:
+            for old_key in list(islice(memo, max(1, self.memo_size // 2))):
+                del memo[old_key]
+        memo[key] = value
+
+    def dealer_probabilities(self, composition, upcard):
+        """Returns a tuple containing the probability of each of the dealer's final outcomes (see DEALER_OUTCOMES).
+        The composition must not contain the upcard. If the dealer peeks, the probabilities are conditioned on the dealer not having a blackjack."""
+        key = (composition, upcard)
+        probabilities = self.dealer_memo.get(key)
+        if probabilities is None:
+            probabilities = self.dealer_graphs[upcard].probabilities(composition)
+            self.remember(self.dealer_memo, key, probabilities)
+        return probabilities
+
+    def stand_value(self, composition, total, upcard):
+        """Returns the expected value of standing on a total against the upcard, in units of the bet."""
+        probabilities = self.dealer_probabilities(composition, upcard)
+        value = probabilities[BUST] - probabilities[BLACKJACK]
+        for dealer_total in range(17, 22):
+            if total > dealer_total:
+                value += probabilities[dealer_total - 17]
+            elif total < dealer_total:
+                value -= probabilities[dealer_total - 17]
+        return value
+
+    def hand_value(self, composition, values, upcard, from_split=False, failed=False, splits_left=None):
+        """Returns the expected value of playing a hand according to the selection algorithm, in units of the initial bet.
+        Values are the card values of the hand (Aces are 11). The composition must not contain the player's cards or the upcard."""
+        if splits_left is None:
+            splits_left = self.rules.max_splits
+        values = tuple(sorted(values))
+        key = (composition, values, upcard, from_split, failed, splits_left)
+        if key in self.player_memo:
+            return self.player_memo[key]
+
+        hand = HypotheticalHand(values, from_split=from_split)
+        total = hand.get_total()
+
+        if total > 21:
+            value = -1.0
+        elif len(values) == 2 and total == 21: #blackjacks (including split hands, same as blackjack_round) stand automatically
+            value = self.rules.blackjack_payout * (1 - self.dealer_probabilities(composition, upcard)[BLACKJACK])
+        elif total == 21: #hands stand automatically on 21
+            value = self.stand_value(composition, total, upcard)
+        else:
+            dealer_hand = HypotheticalHand([upcard], hidden=True)
+            if failed: #same as play_hand, once an action fails the algorithm's second choice is used for the rest of the hand
+                selection = self.selection_alg.second_choice(hand, dealer_hand)
+            else:
+                selection = self.selection_alg.select(hand, dealer_hand)
+            value = self.action_value(selection, composition, values, upcard, from_split, failed, splits_left)
+
+        self.remember(self.player_memo, key, value)
+        return value
+
+    def action_value(self, selection, composition, values, upcard, from_split=False, failed=False, splits_left=None):
+        """Returns the expected value of taking an action with a hand, then following the selection algorithm for the rest of it.
+        Actions that the rules don't allow fall back to the algorithm's second choice, same as play_hand."""
+        if splits_left is None:
+            splits_left = self.rules.max_splits
+        remaining = sum(composition)
+
+        if selection == "1": #HIT
+            value = 0.0
+            for index, amount in enumerate(composition):
+                if amount != 0:
+                    drawn_value = index + 2
+                    value += amount / remaining * self.hand_value(remove_card(composition, drawn_value), values + (drawn_value,), upcard, from_split, failed, splits_left)
+            return value
+
+        elif selection == "2" and self.rules.double_table[from_split]: #DOUBLE DOWN
+            value = 0.0
+            for index, amount in enumerate(composition):
+                if amount != 0:
+                    drawn_value = index + 2
+                    new_total = HypotheticalHand(values + (drawn_value,)).get_total()
+                    if new_total > 21:
+                        value -= amount / remaining
+                    else:
+                        value += amount / remaining * self.stand_value(remove_card(composition, drawn_value), new_total, upcard)
+            return 2 * value
+
+        elif selection == "3" and len(values) == 2 and values[0] == values[1] and splits_left > 0: #SPLIT
+            #both hands are played against the same composition, ignoring the cards the other hand removes
+            value = 0.0
+            for index, amount in enumerate(composition):
+                if amount != 0:
+                    drawn_value = index + 2
+                    value += amount / remaining * self.hand_value(remove_card(composition, drawn_value), (values[0], drawn_value), upcard, True, False, splits_left - 1)
+            return 2 * value
+
+        elif selection == "4": #STAND
+            return self.stand_value(composition, HypotheticalHand(values).get_total(), upcard)
+
+        elif selection == "5" and self.rules.surrender_table[len(values)] and not from_split: #SURRENDER
+            #without a peek, surrendering doesn't protect against a dealer blackjack (see blackjack_round)
+            dealer_blackjack = self.dealer_probabilities(composition, upcard)[BLACKJACK]
+            return -0.5 * (1 - dealer_blackjack) - dealer_blackjack
+
+        elif selection in ("2", "3", "5"): #action failed
+            return self.hand_value(composition, values, upcard, from_split, True, splits_left)
+
+        raise ValueError(f"Selection algorithm returned an unknown action: {selection}")
+
+    def round_value(self, composition):
+        """Returns the expected value of a round dealt from the composition, in units of the initial bet."""
+        value = 0.0
+        total_cards = sum(composition)
+
+        #cards are dealt in the same order as blackjack_round, two for the player then the upcard
+        for first_index, first_amount in enumerate(composition):
+            if first_amount == 0:
+                continue
+            first_value = first_index + 2
+            after_first = remove_card(composition, first_value)
+
+            for second_index, second_amount in enumerate(after_first):
+                if second_amount == 0:
+                    continue
+                second_value = second_index + 2
+                after_second = remove_card(after_first, second_value)
+                player_probability = first_amount / total_cards * second_amount / (total_cards - 1)
+
+                for up_index, up_amount in enumerate(after_second):
+                    if up_amount == 0:
+                        continue
+                    upcard = up_index + 2
+                    after_up = remove_card(after_second, upcard)
+                    probability = player_probability * up_amount / (total_cards - 2)
+                    value += probability * self.deal_value(after_up, (first_value, second_value), upcard)
+
+        return value
+
+    def deal_value(self, composition, values, upcard):
+        """Returns the expected value of a dealt hand, accounting for the dealer peeking for blackjack if the rules require it."""
+        hand_value = self.hand_value(composition, values, upcard)
+        if not self.rules.dealer_peek or upcard not in (ACE, TEN):
+            return hand_value
+
+        remaining = sum(composition)
+        completing_value = TEN if upcard == ACE else ACE
+        dealer_blackjack = composition[completing_value - 2] / remaining if remaining else 0
+        player_blackjack = sum(values) == 21
+
+        return dealer_blackjack * (0 if player_blackjack else -1) + (1 - dealer_blackjack) * hand_value
+
+
+@lru_cache(maxsize=EV_CACHE_SIZE)
+def expected_value(composition, selection_alg, rules=DEFAULT_RULES):
+    """Returns the player's expected value for the next round, in units of the initial bet, given the remaining composition of the shoe.
+    Results are cached per (composition, selection algorithm, rules), keeping the EV_CACHE_SIZE most recently used."""
+    return ExpectedValueCalculator(selection_alg, rules).round_value(tuple(composition))
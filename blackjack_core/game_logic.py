@@ -1,6 +1,7 @@
 from blackjack_core.blackjack_classes import Hand
-from blackjack_core.constants import BLACKJACK_PAYOUT_RATIO, TIE_PAYOUT_RATIO, WIN_PAYOUT_RATIO, LOSS_PAYOUT_RATIO
-from blackjack_core.utility import continue_prompt, clear_screen
+from blackjack_core.constants import TIE_PAYOUT_RATIO, WIN_PAYOUT_RATIO, LOSS_PAYOUT_RATIO
+from blackjack_core.utility import continue_prompt, clear_screen, sort_hands
+from blackjack_core.rules import DEFAULT_RULES
 
 
 
@@ -17,17 +18,20 @@ def split(deck, hand):
         return None
 
     #creates two new hands with the first card of the original hand
-    first_hand = Hand(deck, "PLAYER", starting_card=hand.cards[0])
-    second_hand = Hand(deck, "PLAYER", starting_card=hand.cards[1])
+    #new hands count cards through the same algorithm as the original hand
+    first_hand = Hand(deck, "PLAYER", hand.algorithm, starting_card=hand.cards[0])
+    second_hand = Hand(deck, "PLAYER", hand.algorithm, starting_card=hand.cards[1])
+    first_hand.actions = hand.actions.copy() #split hands keep the selections that led to the split
+    second_hand.actions = hand.actions.copy()
 
     return [first_hand, second_hand]
 
 
-def split_hand(hand, dealer_hand, deck, betting_manager,algorithm):
+def split_hand(hand, dealer_hand, deck, betting_manager, algorithm, rules=DEFAULT_RULES):
     """Calls split function, if successful, allows each split hand to be played and returns them in a list.""" 
 
 
-    if betting_manager.can_increment_split() == False: #if player has already split 3 times
+    if betting_manager.can_increment_split(rules.max_splits) == False: #if player has already split the maximum amount of times
         pass
     elif betting_manager.can_make_bet() == False: 
         pass
@@ -37,16 +41,17 @@ def split_hand(hand, dealer_hand, deck, betting_manager,algorithm):
             pass
         else:
             betting_manager.make_bet() 
+            betting_manager.increment_split()
             #Recursively calls play_hand on the two new hands
-            first_hand = play_hand(new_hands[0], dealer_hand, deck, betting_manager, algorithm) 
-            second_hand = play_hand(new_hands[1], dealer_hand, deck, betting_manager, algorithm)
+            first_hand = play_hand(new_hands[0], dealer_hand, deck, betting_manager, algorithm, rules) 
+            second_hand = play_hand(new_hands[1], dealer_hand, deck, betting_manager, algorithm, rules)
             return [first_hand, second_hand] #list will be unpacked into individual hands in blackjack_round
         
     return None #if the split was not successful, return None
         
         
 
-def calculate_blackjack_payout(blackjack_hands, dealer_hand, betting_manager):
+def calculate_blackjack_payout(blackjack_hands, dealer_blackjack, betting_manager, rules=DEFAULT_RULES):
     """Manages payout in the case of a blackjack beng possessed by the user. 
     Returns payout for all user hands that are blackjacks."""
     blackjack_payout = 0 
@@ -56,7 +61,7 @@ def calculate_blackjack_payout(blackjack_hands, dealer_hand, betting_manager):
       
         
 
-        if dealer_hand.blackjack_check():
+        if dealer_blackjack:
             #if the dealer also has a blackjack, all blackjacks award the inital betting amount back
        
             
@@ -72,7 +77,7 @@ def calculate_blackjack_payout(blackjack_hands, dealer_hand, betting_manager):
             
             for hand in blackjack_hands:
                 
-                blackjack_payout += betting_manager.get_bet() * BLACKJACK_PAYOUT_RATIO
+                blackjack_payout += betting_manager.get_bet() * rules.blackjack_ratio
                 blackjack_payout = round(blackjack_payout) #rounds payout to nearest dollar
 
 
@@ -80,37 +85,6 @@ def calculate_blackjack_payout(blackjack_hands, dealer_hand, betting_manager):
     
     return blackjack_payout 
 
-def dealer_hits(dealer_hand, non_busted_hands, betting_manager):
-    """Allows the dealer to hit until they have at least 17.
-    Returns payout of all non-busted hands if dealer busts, otherwise 0."""
-
-    payout = 0 
-
-    dealer_has_hit= False #used to check if dealer has hit at least once, used to avoid re-printing dealer hand if it isnt modified 
-    if dealer_hand.get_total() < 17: #if dealer has less than 17 dealer must hit
-        pass
-    while dealer_hand.get_total() < 17: #dealer must hit until they have at least 17
-        dealer_hand.draw()
-        dealer_has_hit = True 
-
-      
-
-    
-
-        if dealer_hand.check_bust(): #if dealer busts, all user hands are winners
-            
-
-            for hand in non_busted_hands:
-         
-                payout += betting_manager.get_bet() * hand.get_doubled_down() * WIN_PAYOUT_RATIO 
-            return payout #ends round, all non-busted hands win
-        
-
-
-
-    return 0
-
-
 def handle_misc_hands(hands, multiplier, betting_manager):
     """Handles hands that are scored after the dealer has hit, opposed to ones such as blackjacks and busts. 
     Returns the payout."""
@@ -129,37 +103,92 @@ def handle_misc_hands(hands, multiplier, betting_manager):
     return payout
 
         
-def dealer_hits(dealer_hand, non_busted_hands, betting_manager):
-    """Allows the dealer to hit until they have at least 17.
+def dealer_plays(dealer_hand, rules=DEFAULT_RULES):
+    """Draws cards for the dealer until they have at least 17 (or a soft 18, if the dealer hits soft 17s) or bust."""
+    hit_table = rules.dealer_hit_table
+    while hit_table[dealer_hand.get_softness()][dealer_hand.get_total()]: #dealer must hit until the rules allow them to stand
+        dealer_hand.draw()
+
+
+def dealer_hits(dealer_hand, non_busted_hands, betting_manager, rules=DEFAULT_RULES):
+    """Allows the dealer to hit until they have at least 17 (or a soft 18, if the dealer hits soft 17s).
     Returns payout of all non-busted hands if dealer busts, otherwise 0."""
 
+    dealer_plays(dealer_hand, rules)
+
+    return dealer_bust_payout(dealer_hand, non_busted_hands, betting_manager)
+
+
+def dealer_bust_payout(dealer_hand, non_busted_hands, betting_manager):
+    """Returns payout of all non-busted hands if the dealer's hand is a bust, otherwise 0."""
     payout = 0 
 
-    
-    while dealer_hand.get_total() < 17: #dealer must hit until they have at least 17
-        dealer_hand.draw()
-        
-    
+    if dealer_hand.check_bust(): #if dealer busts, all user hands are winners
+        for hand in non_busted_hands:
+            payout += betting_manager.get_bet() * hand.get_doubled_down() * WIN_PAYOUT_RATIO 
 
-        if dealer_hand.check_bust(): #if dealer busts, all user hands are winners
-            for hand in non_busted_hands:
-                payout += betting_manager.get_bet() * hand.get_doubled_down() * WIN_PAYOUT_RATIO 
-            return payout #ends round, all non-busted hands win
-        
+    return payout
 
 
-    return 0
+def classify_hands(all_hands, betting_manager, rules=DEFAULT_RULES):
+    """Sorts a player's completed hands into blackjacks and hands that still need to be compared against the dealer, discarding busts.
+    Returns the payout of surrendered hands, the list of blackjack hands and the list of non-busted hands."""
+    surrender_payout = 0
+    non_busted_hands = [] #list of hands that are not busts, as well as not blackjacks
+    blackjack_hands = [] #list of hands that are blackjacks
+
+    for hand in all_hands: #for each hand, check if it is a bust     
+        if hand.check_surrendered(): #surrendered hands get half their bet back, regardless of the dealer's hand
+            surrender_payout += round(betting_manager.get_bet() * rules.surrender_ratio)
+        elif hand.check_bust():
+            pass
+        elif hand.blackjack_check():
+            blackjack_hands.append(hand)
+        else:
+            non_busted_hands.append(hand)
+
+    return surrender_payout, blackjack_hands, non_busted_hands
 
 
+def settle_hands(surrender_payout, blackjack_hands, non_busted_hands, dealer_hand, betting_manager, rules=DEFAULT_RULES):
+    """Returns the payout of a player's classified hands (see classify_hands), once the dealer has finished playing."""
+    return settle_totals(surrender_payout, blackjack_hands, non_busted_hands, dealer_hand.get_total(), dealer_hand.blackjack_check(), betting_manager, rules)
 
+def settle_totals(surrender_payout, blackjack_hands, non_busted_hands, dealer_total, dealer_blackjack, betting_manager, rules=DEFAULT_RULES):
+    """Same as settle_hands, given the dealer's final total and whether it is a blackjack instead of the dealer's hand.
+    Used by the lockstep engine, which works out every dealer's total at once (see batch.resolve_dealers)."""
+    payout = surrender_payout
+
+    payout += calculate_blackjack_payout(blackjack_hands, dealer_blackjack, betting_manager, rules) #calculates payout for blackjacks, if any exist
+
+    if not blackjack_hands and dealer_blackjack: #if dealer is the only one with a blackjack, return 0 payout
+        #surrendering does not protect against a dealer blackjack, since the dealer did not peek before the player acted
+        return 0
 
-def play_hand(hand, dealer_hand, deck, betting_manager, algorithm):
-    """Allows player to hit, double down, split, or stand.
-    Returns the payout for the player."""
+    if not non_busted_hands: 
+        return payout #if there are no non-busted hands, payout is returned early instead of going through the rest of the payout checks
+
+    #if the dealer busted, all non-busted hands win
+    if dealer_total > 21:
+        return payout + handle_misc_hands(non_busted_hands, WIN_PAYOUT_RATIO, betting_manager)
+
+    sorted_hands = sort_hands(non_busted_hands, dealer_total) #sorts hands into losing, tieing and winning hands
+
+    for i in range(len(sorted_hands)):
+        payout += handle_misc_hands(sorted_hands[i], i, betting_manager)
+
+    return payout
+
+
+
+
+def play_hand(hand, dealer_hand, deck, betting_manager, algorithm, rules=DEFAULT_RULES):
+    """Allows player to hit, double down, split, stand or surrender.
+    Returns the completed hand, or a list of hands if the player split."""
 
     failed_action = False #used to check if an action has failed, such as not having enough money to double down or split
     
-    OPTION_CHOICER = """What would you like to do?\n\t1. Hit\n\t2. Double Down\n\t3. Split\n\t4. Stand"""
+    OPTION_CHOICER = """What would you like to do?\n\t1. Hit\n\t2. Double Down\n\t3. Split\n\t4. Stand\n\t5. Surrender"""
     
 
     
@@ -174,6 +203,7 @@ def play_hand(hand, dealer_hand, deck, betting_manager, algorithm):
             #besides, in most cases the algorithms are simple enough that such simple handling is fitting
             player_selection = algorithm.second_choice(hand, dealer_hand)
 
+        hand.actions.append(player_selection)
 
 
         if player_selection == "1": #HIT
@@ -181,7 +211,8 @@ def play_hand(hand, dealer_hand, deck, betting_manager, algorithm):
             hand.draw()
 
         elif player_selection == "2": #DOUBLE DOWN
-            if betting_manager.make_bet(): #ensures that the player has enough money to double down
+            #ensures that the rules allow the hand to double down and that the player has enough money to do so
+            if rules.double_table[hand.from_split] and betting_manager.make_bet():
                 hand.draw()
                 hand.double_down()
                 hand.stand() #automatically stands after doubling down
@@ -195,9 +226,9 @@ def play_hand(hand, dealer_hand, deck, betting_manager, algorithm):
         elif player_selection == "3": #SPLIT
             #split hand function plays the two new hands to completion
             #so function output can be returned directly in the case where the split is successful
-            split_result = split_hand(hand, dealer_hand, deck, betting_manager)
+            split_result = split_hand(hand, dealer_hand, deck, betting_manager, algorithm, rules)
             if split_result is not None:
-                return split_hand(hand, dealer_hand, deck, betting_manager)
+                return split_result
             else:
                 failed_action = True
             
@@ -207,7 +238,11 @@ def play_hand(hand, dealer_hand, deck, betting_manager, algorithm):
             #Set standing to True, ends loop and lets dealer start hitting
             hand.stand()
 
-        
+        elif player_selection == "5": #SURRENDER
+            if rules.surrender_table[len(hand.cards)] and not hand.from_split: #only allowed on the first two cards of an unsplit hand
+                hand.surrender()
+            else:
+                failed_action = True
 
         
 
@@ -0,0 +1,108 @@
+import math
+import numpy as np
+
+"""
+Contains the CountHistogram class, which aggregates the outcome of every round played by an algorithm by the true count it was played at.
+Histograms have a fixed amount of bins, so recording a round is only a few additions, and histograms from separate runs (e.g. worker processes) can be merged.
+"""
+
+
+MIN_COUNT_BIN = -10 #true counts are binned by rounding down, counts outside of this range are added to the first/last bin
+MAX_COUNT_BIN = 10
+
+
+def count_bin(true_count):
+    """Returns the bin that a true count is added to."""
+    return min(max(math.floor(true_count), MIN_COUNT_BIN), MAX_COUNT_BIN)
+
+def bin_counts():
+    """Returns an array containing the true count of each bin, i.e. the lowest count it contains."""
+    return np.arange(MIN_COUNT_BIN, MAX_COUNT_BIN + 1)
+
+
+class CountHistogram:
+    """Per-true-count-bin accumulators of the amount of rounds, the sum and sum of squares of each round's net result (in units of the round's bet),
+    and the amount of player hands that busted or were blackjacks."""
+
+    FIELDS = ("rounds", "totals", "squares", "busts", "blackjacks")
+
+    def __init__(self, rounds=None, totals=None, squares=None, busts=None, blackjacks=None):
+        bins = MAX_COUNT_BIN - MIN_COUNT_BIN + 1
+        self.rounds = np.zeros(bins, dtype=np.int64) if rounds is None else np.array(rounds, dtype=np.int64)
+        self.totals = np.zeros(bins, dtype=np.float64) if totals is None else np.array(totals, dtype=np.float64)
+        self.squares = np.zeros(bins, dtype=np.float64) if squares is None else np.array(squares, dtype=np.float64)
+        self.busts = np.zeros(bins, dtype=np.int64) if busts is None else np.array(busts, dtype=np.int64)
+        self.blackjacks = np.zeros(bins, dtype=np.int64) if blackjacks is None else np.array(blackjacks, dtype=np.int64)
+
+    def record(self, true_count, result, busts=0, blackjacks=0):
+        """Adds the outcome of a round played at a true count."""
+        index = count_bin(true_count) - MIN_COUNT_BIN
+        self.rounds[index] += 1
+        self.totals[index] += result
+        self.squares[index] += result * result
+        self.busts[index] += busts
+        self.blackjacks[index] += blackjacks
+
+    def record_many(self, true_counts, results, busts, blackjacks):
+        """Adds the outcomes of many rounds at once, given as arrays. Used by engines that play many games at once."""
+        indices = np.clip(np.floor(true_counts), MIN_COUNT_BIN, MAX_COUNT_BIN).astype(np.int64) - MIN_COUNT_BIN
+        bins = len(self.rounds)
+        self.rounds += np.bincount(indices, minlength=bins)
+        self.totals += np.bincount(indices, weights=results, minlength=bins)
+        self.squares += np.bincount(indices, weights=np.square(results), minlength=bins)
+        self.busts += np.bincount(indices, weights=busts, minlength=bins).astype(np.int64)
+        self.blackjacks += np.bincount(indices, weights=blackjacks, minlength=bins).astype(np.int64)
+
+    def merge(self, other):
+        """Adds the outcomes recorded by another histogram to this one."""
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def frequencies(self):
+        """Returns an array containing the fraction of rounds played at each bin."""
+        return self.rounds / max(self.rounds.sum(), 1)
+
+    def advantages(self):
+        """Returns an array containing the mean result of a round at each bin, i.e. the player's edge."""
+        return self.totals / np.maximum(self.rounds, 1)
+
+    def second_moments(self):
+        """Returns an array containing the mean squared result of a round at each bin."""
+        return self.squares / np.maximum(self.rounds, 1)
+
+    def variances(self):
+        """Returns an array containing the variance of a round's result at each bin."""
+        return self.second_moments() - self.advantages() ** 2
+
+    def fitted_advantages(self):
+        """Returns the advantage at each bin read from a straight line fitted through the per-bin advantages, weighted by the amount of rounds in each bin.
+        A player's edge rises almost linearly with the true count, so the line smooths out the noise of rarely seen counts."""
+        seen = self.rounds > 0
+        if seen.sum() < 2:
+            return self.advantages()
+        slope, intercept = np.polyfit(bin_counts()[seen], self.advantages()[seen], 1, w=np.sqrt(self.rounds[seen]))
+        return slope * bin_counts() + intercept
+
+    def pooled_variance(self):
+        """Returns the variance of a round's result around its bin's advantage, pooled over every bin."""
+        return float(np.sum(self.rounds * self.variances()) / max(self.rounds.sum(), 1))
+
+    def bust_rates(self):
+        """Returns an array containing the average amount of busted hands per round at each bin."""
+        return self.busts / np.maximum(self.rounds, 1)
+
+    def blackjack_rates(self):
+        """Returns an array containing the average amount of blackjacks per round at each bin."""
+        return self.blackjacks / np.maximum(self.rounds, 1)
+
+    def to_dict(self):
+        """Returns the histogram as a dictionary of lists, used to save it alongside simulation results."""
+        histogram = {"bins": bin_counts().tolist()}
+        for field in self.FIELDS:
+            histogram[field] = getattr(self, field).tolist()
+        return histogram
+
+    @classmethod
+    def from_dict(cls, data):
+        """Creates a histogram from a dictionary returned by to_dict(). Missing fields are left empty."""
+        return cls(*[data.get(field) for field in cls.FIELDS])
@@ -0,0 +1,105 @@
+from blackjack_core.constants import BLACKJACK_PAYOUT_RATIO, TIE_PAYOUT_RATIO, MAX_SPLITS, DEALER_STAND_TOTAL
+from blackjack_core.composition import CARDS_PER_DECK
+
+"""
+Contains the Rules class, which holds every table rule that varies between casinos.
+Rules are compiled into lookup tables once when the object is created, so the game loop reads them without having to branch on each setting.
+Simulating a different rule variant only requires passing a different Rules object to game().
+"""
+
+
+MAX_TABLE_TOTAL = 32 #largest total a hand can reach is 30 (hard 20 + 10), so tables are sized one past it
+
+
+class Rules:
+    """Collection of table rules, precompiled into lookup tables used by the game logic."""
+
+    def __init__(self, dealer_hits_soft_17=False, blackjack_payout=BLACKJACK_PAYOUT_RATIO - TIE_PAYOUT_RATIO, double_after_split=True,
+                 max_splits=MAX_SPLITS, surrender=False, penetration=1, dealer_peek=False, infinite_deck=False,
+                 shoe_length=None):
+        """Stores the rules and compiles them into lookup tables.
+        Default values replicate the rules the simulator has always used (S17, 3:2 blackjacks, DAS, 3 splits, no surrender, whole shoe dealt, no peek, finite shoe).
+        shoe_length is the amount of cards in each pseudo-shoe of an infinite deck, by default the amount of cards in the simulation's decks."""
+        if not 0 < penetration <= 1:
+            raise ValueError("Penetration must be greater than 0 and at most 1.")
+        if max_splits < 0:
+            raise ValueError("Split limit cannot be negative.")
+        if shoe_length is not None and (not infinite_deck or shoe_length < 1):
+            raise ValueError("Shoe length must be at least 1, and can only be set for an infinite deck.")
+
+        self.dealer_hits_soft_17 = dealer_hits_soft_17 #True for H17, False for S17
+        self.blackjack_payout = blackjack_payout #profit paid on a blackjack, as a multiple of the bet (1.5 for 3:2, 1.2 for 6:5)
+        self.double_after_split = double_after_split
+        self.max_splits = max_splits #amount of times the player can split in a single round
+        self.surrender = surrender #late surrender, half the bet is returned
+        self.penetration = penetration #fraction of the shoe dealt before the game ends
+        self.dealer_peek = dealer_peek #if True, dealer checks for blackjack before the player acts
+        self.infinite_deck = infinite_deck #if True, cards are drawn with replacement from an InfiniteDeck, with the shoe size only setting when the game ends
+        self.shoe_length = shoe_length #cards dealt per pseudo-shoe of an infinite deck, None to use the amount of decks
+
+        self.compile()
+
+    def compile(self):
+        """Builds the lookup tables read by the game logic. Called automatically on creation."""
+
+        #dealer_hit_table[soft][total] is True if the dealer has to hit
+        hard_row = [total < DEALER_STAND_TOTAL for total in range(MAX_TABLE_TOTAL)]
+        soft_row = hard_row.copy()
+        soft_row[DEALER_STAND_TOTAL] = self.dealer_hits_soft_17
+        self.dealer_hit_table = [hard_row, soft_row]
+
+        #payout ratios include the returned bet, same as the ratios in constants.py
+        self.blackjack_ratio = TIE_PAYOUT_RATIO + self.blackjack_payout
+        self.surrender_ratio = TIE_PAYOUT_RATIO / 2
+
+        #double_table[split_hand] is True if the hand is allowed to double down
+        self.double_table = [True, self.double_after_split]
+
+        #surrender_table[card_amount] is True if the hand is allowed to surrender, only possible on the first two cards
+        self.surrender_table = [False] * MAX_TABLE_TOTAL
+        self.surrender_table[2] = self.surrender
+
+    def get_shoe_length(self, decks):
+        """Returns the amount of cards in a shoe (or pseudo-shoe, for an infinite deck) made of the specified amount of decks."""
+        return self.shoe_length if self.shoe_length is not None else decks * CARDS_PER_DECK
+
+    def key(self):
+        """Returns a hashable tuple identifying the rules, used for caching results computed under them."""
+        return (self.dealer_hits_soft_17, self.blackjack_payout, self.double_after_split, self.max_splits,
+                self.surrender, self.penetration, self.dealer_peek, self.infinite_deck, self.shoe_length)
+
+    def to_dict(self):
+        """Returns the rules as a dictionary, used to save them alongside simulation results."""
+        return {
+            "dealer_hits_soft_17": self.dealer_hits_soft_17,
+            "blackjack_payout": self.blackjack_payout,
+            "double_after_split": self.double_after_split,
+            "max_splits": self.max_splits,
+            "surrender": self.surrender,
+            "penetration": self.penetration,
+            "dealer_peek": self.dealer_peek,
+            "infinite_deck": self.infinite_deck,
+            "shoe_length": self.shoe_length,
+        }
+
+    def __deepcopy__(self, memo):
+        return self #rules are never modified once compiled, so copies of an algorithm (one per game in the lockstep engine) share them
+
+    def __eq__(self, other):
+        return isinstance(other, Rules) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __str__(self):
+        soft_17 = "H17" if self.dealer_hits_soft_17 else "S17"
+        das = "DAS" if self.double_after_split else "NDAS"
+        surrender = "LS" if self.surrender else "NS"
+        peek = "Peek" if self.dealer_peek else "No Peek"
+        deck = ", Infinite Deck" if self.infinite_deck else ""
+        if self.shoe_length is not None:
+            deck += f" ({self.shoe_length} Card Shoes)"
+        return f"{soft_17}, {self.blackjack_payout:g}x Blackjack, {das}, {self.max_splits} Splits, {surrender}, {self.penetration:.0%} Penetration, {peek}{deck}"
+
+
+DEFAULT_RULES = Rules()
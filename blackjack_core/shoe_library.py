@@ -0,0 +1,106 @@
+import json
+import os
+import numpy as np
+from blackjack_core.blackjack_classes import ShoeDeck
+from blackjack_core.constants import MAX_DECKS
+from blackjack_core.composition import CARDS_PER_DECK
+
+"""
+Library of pre-shuffled shoes, so that simulations don't have to shuffle a new shoe for every game, and separate experiments can be played on the same shoes.
+
+A library is a json index (deck amount, amount of shoes, seed) plus a flat file of uint8 ranks next to it, one shoe after another.
+The file is memory-mapped, so each game's shoe is a view into it and only the shoes that are played are ever read from disk.
+Game i is dealt shoe i. If a shoe runs out mid-round, the new shoe is shuffled with a generator seeded from (library seed, game number),
+so games played from a library are reproducible with any engine.
+"""
+
+
+LIBRARY_VERSION = 1
+GENERATION_CHUNK = 8192 #shoes shuffled at once while generating a library
+GENERATION_STREAM = 0 #random streams are (seed, stream, number), so the generated shoes and mid-round reshuffles never share a stream
+RESHUFFLE_STREAM = 1
+
+
+def library_file_names(file_name):
+    """Returns the names of the index and the rank file of a shoe library."""
+    base_name = file_name[:-len(".json")] if file_name.endswith(".json") else file_name
+    return base_name + ".json", base_name + ".shoes"
+
+def create_shoe_library(file_name, shoes, decks, seed=None, chunk_size=GENERATION_CHUNK):
+    """Shuffles the given amount of shoes and saves them as a shoe library. Without a seed, one is generated and saved in the index.
+    Shoes are shuffled chunk_size at a time, each chunk seeded from (seed, chunk number)."""
+    if not 1 <= decks <= MAX_DECKS:
+        raise ValueError(f"A shoe must have between 1 and {MAX_DECKS} decks.")
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy)
+
+    index_name, ranks_name = library_file_names(file_name)
+    shoe_length = decks * CARDS_PER_DECK
+    unshuffled = np.repeat(np.arange(1, 14, dtype=np.uint8), 4 * decks) #same cards as generate_shoe()
+    with open(ranks_name, "wb") as f:
+        for chunk, start in enumerate(range(0, shoes, chunk_size)):
+            rng = np.random.default_rng([seed, GENERATION_STREAM, chunk])
+            block = np.tile(unshuffled, (min(chunk_size, shoes - start), 1))
+            rng.permuted(block, axis=1, out=block) #every row is shuffled independently
+            f.write(block.tobytes())
+
+    index = {"version": LIBRARY_VERSION, "decks": decks, "shoes": shoes, "shoe_length": shoe_length, "seed": seed,
+             "ranks_file": os.path.basename(ranks_name)}
+    with open(index_name, "w") as f:
+        json.dump(index, f, indent=2)
+    return ShoeLibrary(index_name)
+
+
+class ShoeLibrary:
+    """Read-only view of a shoe library saved by create_shoe_library()."""
+
+    def __init__(self, file_name):
+        index_name, ranks_name = library_file_names(file_name)
+        with open(index_name) as f:
+            index = json.load(f)
+        if index.get("version") != LIBRARY_VERSION:
+            raise ValueError(f"{index_name} was written by an incompatible version of the shoe library.")
+
+        self.file_name = index_name
+        self.decks = index["decks"]
+        self.seed = index["seed"]
+        self.shoe_length = index["shoe_length"]
+        ranks_name = os.path.join(os.path.dirname(index_name), index["ranks_file"])
+        self.ranks = np.memmap(ranks_name, dtype=np.uint8, mode="r", shape=(index["shoes"], self.shoe_length))
+
+    def __len__(self):
+        return len(self.ranks)
+
+    def get_shoe(self, game_number):
+        """Returns the ranks of a game's shoe, as a view into the memory-mapped file."""
+        if not 0 <= game_number < len(self.ranks):
+            raise IndexError(f"Game {game_number} is outside of the shoe library, which only has {len(self.ranks)} shoes.")
+        return self.ranks[game_number]
+
+    def get_rng(self, game_number):
+        """Returns the random generator that a game's shoe is reshuffled with if it runs out mid-round."""
+        return np.random.default_rng([self.seed, RESHUFFLE_STREAM, game_number])
+
+    def create_deck(self, game_number, penetration=1):
+        """Returns a ShoeDeck dealing a game's shoe."""
+        return ShoeDeck(self.get_shoe(game_number), penetration, self.get_rng(game_number))
+
+    def check_games(self, decks, games, first_game=0):
+        """Raises a ValueError if the library can't deal games first_game to first_game + games - 1 with the given amount of decks."""
+        if decks != self.decks:
+            raise ValueError(f"The shoe library {self.file_name} has {self.decks} deck shoes, but {decks} decks were requested.")
+        if first_game + games > len(self.ranks):
+            raise ValueError(f"The shoe library {self.file_name} only has {len(self.ranks)} shoes, but {first_game + games} games were requested.")
+
+
+def main():
+    file_name = input("Enter library file name: ")
+    decks = int(input("Enter amount of decks per shoe: "))
+    shoes = int(input("Enter amount of shoes: "))
+    seed = input("Enter seed (leave blank for a random one): ")
+    library = create_shoe_library(file_name, shoes, decks, int(seed) if seed else None)
+    print(f"Saved {len(library)} shoes to {library.file_name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import os
 from blackjack_core.blackjack_classes import Deck, Hand
-from blackjack_core.constants import STARTING_BALANCE, WIN_PAYOUT_RATIO, TIE_PAYOUT_RATIO, LOSS_PAYOUT_RATIO
+from blackjack_core.constants import STARTING_BALANCE, WIN_PAYOUT_RATIO, TIE_PAYOUT_RATIO, LOSS_PAYOUT_RATIO, MAX_SPLITS
 
 def clear_screen():
     """Clears the console screen."""
@@ -35,6 +35,16 @@ def unpack_hands(packed_hands):
 
     return unpacked
 
+class SharedCounter:
+    """Passed to hands in place of a single algorithm when several seats share a table, so that every algorithm counts every card."""
+    def __init__(self, algorithms):
+        self.algorithms = algorithms
+
+    def count_card(self, card):
+        """Passes the card to the count_card method of every algorithm at the table."""
+        for algorithm in self.algorithms:
+            algorithm.count_card(card)
+
 class BettingManager:
     """Manages the player's money, allowing payouts and bets to be made."""
     def __init__(self, starting_balance):
@@ -89,10 +99,10 @@ class BettingManager:
         """Increments the split amount by 1. Keeps track of how many times the player has split their hand."""
         self.split_amount += 1
         
-    def can_increment_split(self):
-        """Checks if the player can increment the split amount, i.e. if they have enough money to cover the bet.
+    def can_increment_split(self, max_splits=MAX_SPLITS):
+        """Checks if the player can increment the split amount, i.e. if they have not reached the split limit set by the rules.
         Returns True if they can, False if they cannot."""
-        return self.split_amount < 3
+        return self.split_amount < max_splits
 
 
     
@@ -105,16 +115,16 @@ class BettingManager:
 
         
 
-def sort_hands(unsorted_hands, dealer_hand):
-    """Sorts hands into a dictionary, with the keys being whether they beat the dealer, lose to the dealer, or tie with the dealer.
+def sort_hands(unsorted_hands, dealer_total):
+    """Sorts hands into a dictionary, with the keys being whether they beat the dealer's total, lose to it, or tie with it.
     Returns a dictionary with each key corresponding to a list of hands."""
     sorted_hands =  {LOSS_PAYOUT_RATIO: [], TIE_PAYOUT_RATIO: [], WIN_PAYOUT_RATIO: []} #returns a dictionary with empty lists for each key, to be filled in later
 
 
     for hand in unsorted_hands: 
-        if hand.get_total() > dealer_hand.get_total():
+        if hand.get_total() > dealer_total:
             sorted_hands[WIN_PAYOUT_RATIO].append(hand)
-        elif hand.get_total() < dealer_hand.get_total():
+        elif hand.get_total() < dealer_total:
             sorted_hands[LOSS_PAYOUT_RATIO].append(hand)
         else:
             sorted_hands[TIE_PAYOUT_RATIO].append(hand)
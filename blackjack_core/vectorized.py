@@ -0,0 +1,373 @@
+import copy
+from itertools import combinations_with_replacement
+import numpy as np
+from blackjack_core.blackjack_classes import Card, ShoeDeck, generate_shoe
+from blackjack_core.blackjack import blackjack_round
+from blackjack_core.batch import RANK_VALUES, DEALER_LOOKAHEAD, count_tags, game_rng, resolve_dealers
+from blackjack_core.composition import CARDS_PER_DECK
+from blackjack_core.constants import TIE_PAYOUT_RATIO, WIN_PAYOUT_RATIO
+from blackjack_core.expected_value import HypotheticalHand
+from blackjack_core.utility import BettingManager
+from blackjack_core.rules import DEFAULT_RULES
+
+"""
+Structure-of-arrays version of the game engine, which keeps the state of thousands of games in NumPy arrays and plays them all a round at a time.
+Balances, bets, shoe positions, running counts and hand totals are arrays with one entry per game, so every step of a round is a handful of array operations.
+
+The selection algorithm is precompiled into lookup tables, which only works for algorithms whose decisions depend on the hand and the upcard.
+Rounds that the arrays don't cover (splits, or a shoe running out mid-round) are rolled back and replayed with the regular game logic,
+so every game plays out exactly as it would in game() on the same ShoeDeck.
+"""
+
+
+VECTOR_GAMES = 2048 #default amount of games played at once
+MAX_ACTIONS = 64 #hands still acting after this many decisions are replayed with the regular game logic, which only happens with broken algorithms
+
+#codes of the selections in compiled policy tables, 0 means the selection can't be played by the arrays
+FALLBACK = 0
+HIT = 1
+DOUBLE = 2
+SPLIT = 3
+STAND = 4
+SURRENDER = 5
+ACTION_CODES = {"1": HIT, "2": DOUBLE, "3": SPLIT, "4": STAND, "5": SURRENDER}
+
+TABLE_TOTALS = 22 #hands only make decisions below 21
+TABLE_VALUES = 12 #tables are indexed by card value (2-11) directly, so indices 0 and 1 are unused
+
+
+def representative_hand(soft, total, card_amount):
+    """Returns a hand with the given softness, total and amount of cards that isn't a pair, or None if no such hand exists.
+    Ten-value cards are given different ranks, so two of them aren't a pair (e.g. a King and a Queen)."""
+    for values in combinations_with_replacement(range(2, 12), card_amount):
+        hand = HypotheticalHand(values)
+        if hand.get_total() != total or hand.get_softness() != soft:
+            continue
+        if card_amount == 2 and values[0] == values[1]:
+            if values[0] != 10:
+                continue
+            hand.cards = [Card(10, 0), Card(13, 0)]
+        return hand
+    return None
+
+def compile_policy(selection_alg):
+    """Returns the decisions of a selection algorithm as a dictionary of lookup tables, one for each kind of decision.
+    first and later tables are indexed by [soft, total, upcard], for a hand's first two cards and for any later decision respectively.
+    pair tables are indexed by [pair value, upcard], and the second_ tables hold the algorithm's second choice for each kind of decision."""
+    if selection_alg.composition_dependent:
+        raise ValueError(f"{selection_alg} depends on the composition of the shoe, so it can't be compiled into tables.")
+
+    policy = {}
+    for name in ("first", "later", "second_first", "second_later"):
+        policy[name] = np.zeros((2, TABLE_TOTALS, TABLE_VALUES), dtype=np.int8)
+    for name in ("pair", "second_pair"):
+        policy[name] = np.zeros((TABLE_VALUES, TABLE_VALUES), dtype=np.int8)
+
+    for upcard in range(2, 12):
+        dealer_hand = HypotheticalHand([upcard], hidden=True)
+
+        for soft in (0, 1):
+            for total in range(4, 21):
+                for card_amount, name in ((2, "first"), (3, "later")):
+                    hand = representative_hand(bool(soft), total, card_amount)
+                    if hand is not None:
+                        policy[name][soft, total, upcard] = ACTION_CODES.get(selection_alg.select(hand, dealer_hand), FALLBACK)
+                        policy["second_" + name][soft, total, upcard] = ACTION_CODES.get(selection_alg.second_choice(hand, dealer_hand), FALLBACK)
+
+        for value in range(2, 12):
+            hand = HypotheticalHand([value, value])
+            policy["pair"][value, upcard] = ACTION_CODES.get(selection_alg.select(hand, dealer_hand), FALLBACK)
+            policy["second_pair"][value, upcard] = ACTION_CODES.get(selection_alg.second_choice(hand, dealer_hand), FALLBACK)
+
+    return policy
+
+class VectorEngine:
+    """Plays many games at once, keeping every game's state in arrays indexed by slot.
+    Finished games (bankrupt, or past the cut card) are retired from the active set and their slot is given to the next game.
+    Uses the same shoes as LockstepEngine, so both engines give identical scores for the same seed."""
+
+    def __init__(self, algorithm, games, decks, starting_balance, rules=DEFAULT_RULES, seed=None, concurrent_games=VECTOR_GAMES, first_game=0, shoes=None):
+        self.algorithm = algorithm
+        self.games = games
+        self.decks = decks
+        self.starting_balance = starting_balance
+        self.rules = rules
+        self.seed = seed
+        self.first_game = first_game
+        self.shoes = shoes #ShoeLibrary that games are dealt from, instead of shuffling their shoes
+        self.next_game = 0
+        if algorithm.event_log is not None:
+            raise ValueError("The vector engine doesn't play hands one at a time, so it can't write an event log. Use the standard or lockstep engine instead.")
+        if rules.infinite_deck:
+            raise ValueError("The vector engine only deals finite shoes, use the standard or lockstep engine for infinite decks.")
+        self.scores = [None] * games #scores of every game, in game order
+
+        self.policy = compile_policy(algorithm.selection_alg)
+        self.tags = count_tags(algorithm.count_alg)
+        self.fallback_algorithm = copy.deepcopy(algorithm) #plays rounds that are replayed with the regular game logic
+        self.fallback_algorithm.all_scores = []
+        if algorithm.histogram is not None:
+            self.fallback_algorithm.enable_histogram() #only used to log the replayed round's hands, the outcome is recorded by play_round()
+
+        self.shoe_length = decks * CARDS_PER_DECK
+        self.cut_card = round(self.shoe_length * (1 - rules.penetration)) #same as ShoeDeck
+        slots = max(1, min(concurrent_games, games))
+
+        #shoes are padded, so looking ahead past the end of a shoe never indexes out of bounds
+        self.ranks = np.zeros((slots, self.shoe_length + DEALER_LOOKAHEAD), dtype=np.uint8)
+        self.rngs = [None] * slots #random generators of each slot's shoe, used if the shoe has to be reshuffled mid-round
+
+        #state of every slot's game
+        self.active = np.zeros(slots, dtype=bool)
+        self.game_index = np.zeros(slots, dtype=np.int64) #position of the game in self.scores
+        self.cursor = np.zeros(slots, dtype=np.int64) #index of the next card to be dealt
+        self.balance = np.zeros(slots, dtype=np.int64)
+        self.running_count = np.zeros(slots, dtype=np.float64)
+        self.fresh = np.zeros(slots, dtype=bool)
+        self.rounds = np.zeros(slots, dtype=np.int64) #amount of scores logged
+        self.score_log = np.zeros((slots, self.shoe_length // 4 + 3), dtype=np.int64) #every round uses at least 4 cards
+
+    def start_game(self, slot):
+        """Loads the next game into a slot. Returns False if every game has been started."""
+        if self.next_game == self.games:
+            self.active[slot] = False
+            return False
+
+        game_number = self.first_game + self.next_game
+        if self.shoes is not None:
+            rng = self.shoes.get_rng(game_number)
+            self.ranks[slot, :self.shoe_length] = self.shoes.get_shoe(game_number)
+        else:
+            rng = game_rng(self.seed, game_number) #same shoe as LockstepEngine.create_deck
+            self.ranks[slot, :self.shoe_length] = generate_shoe(self.decks, rng)
+        self.rngs[slot] = rng
+
+        self.active[slot] = True
+        self.game_index[slot] = self.next_game
+        self.cursor[slot] = 0
+        self.balance[slot] = self.starting_balance
+        self.running_count[slot] = 0
+        self.fresh[slot] = True
+        self.rounds[slot] = 0
+        self.next_game += 1
+        return True
+
+    def finish_game(self, slot):
+        """Stores a finished game's scores, logging the final balance if the shoe wasn't finished (same as game())."""
+        if self.fresh[slot]:
+            self.score_log[slot, self.rounds[slot]] = self.balance[slot]
+            self.rounds[slot] += 1
+        self.scores[self.game_index[slot]] = self.score_log[slot, :self.rounds[slot]].tolist()
+
+    def run(self):
+        """Plays every game, then appends their scores to the algorithm's all_scores in game order, same as run_games()."""
+        for slot in range(len(self.active)):
+            self.start_game(slot)
+
+        while self.active.any():
+            slots = np.flatnonzero(self.active)
+            self.play_round(slots)
+
+            finished = slots[~self.fresh[slots] | (self.balance[slots] <= 0)]
+            for slot in finished.tolist():
+                self.finish_game(slot)
+                self.start_game(slot)
+
+        self.algorithm.all_scores += self.scores
+        return self.scores
+
+    def play_round(self, slots):
+        """Plays one round of every game in slots. Games whose round can't be played with arrays are rolled back and replayed by replay_round()."""
+        policy = self.policy
+        tags = self.tags
+        last_column = self.ranks.shape[1] - 1
+
+        #logs every balance at the start of the round, then bets
+        balance = self.balance[slots]
+        round_balance = balance.copy()
+        self.score_log[slots, self.rounds[slots]] = balance
+        self.rounds[slots] += 1
+
+        start_cursor = self.cursor[slots]
+        start_count = self.running_count[slots]
+        remaining = self.shoe_length - start_cursor
+        true_counts = np.where(remaining > 0, start_count * CARDS_PER_DECK / np.maximum(remaining, 1), 0.0) #same as CompositionTracker.get_true_count()
+
+        bets = np.minimum(self.algorithm.determine_bets(true_counts), balance) #bets larger than the balance are capped at the balance
+        balance = balance - bets
+        start_balance = balance.copy() #balance once the bet is made, restored if the round is replayed
+
+        #deals the player's two cards, then the dealer's upcard and hole card
+        rows = self.ranks[slots]
+        columns = start_cursor[:, None] + np.arange(4)
+        dealt = np.take_along_axis(rows, np.minimum(columns, last_column), axis=1)
+        dealt_values = RANK_VALUES[dealt]
+        count = start_count + tags[dealt].sum(axis=1) #hole card is included, since it is always revealed by the end of the round
+        cursor = start_cursor + 4
+
+        #player's hand is tracked as its total with Aces counted as 1, plus whether it has an Ace (same approach as resolve_dealers)
+        hard_totals = np.where(dealt_values[:, 0] == 11, 1, dealt_values[:, 0]) + np.where(dealt_values[:, 1] == 11, 1, dealt_values[:, 1])
+        has_ace = (dealt_values[:, 0] == 11) | (dealt_values[:, 1] == 11)
+        card_amounts = np.full(len(slots), 2, dtype=np.int64)
+        pairs = dealt[:, 0] == dealt[:, 1] #same as Hand.can_split(), pairs need matching ranks
+        upcards = dealt_values[:, 2]
+        hole_cards = dealt_values[:, 3]
+
+        doubled = np.ones(len(slots), dtype=np.int64)
+        surrendered = np.zeros(len(slots), dtype=bool)
+        failed = np.zeros(len(slots), dtype=bool) #same as play_hand, once an action fails the second choice is used for the rest of the hand
+        replay = np.zeros(len(slots), dtype=bool)
+
+        totals = hard_totals + 10 * (has_ace & (hard_totals <= 11))
+        standing = totals >= 21
+
+        #if the dealer peeks and has a blackjack, the round ends before the player acts
+        peeked = np.zeros(len(slots), dtype=bool)
+        if self.rules.dealer_peek:
+            peeked = upcards + hole_cards == 21
+            standing |= peeked
+
+        for i in range(MAX_ACTIONS):
+            acting = np.flatnonzero(~standing & ~replay)
+            if len(acting) == 0:
+                break
+
+            soft = (has_ace[acting] & (hard_totals[acting] <= 11)).astype(np.int64)
+            total = hard_totals[acting] + 10 * soft
+            upcard = upcards[acting]
+            pair_value = dealt_values[acting, 0]
+            first_decision = card_amounts[acting] == 2
+            is_pair = first_decision & pairs[acting]
+
+            selection = np.where(is_pair, policy["pair"][pair_value, upcard],
+                        np.where(first_decision, policy["first"][soft, total, upcard], policy["later"][soft, total, upcard]))
+            second_selection = np.where(is_pair, policy["second_pair"][pair_value, upcard],
+                               np.where(first_decision, policy["second_first"][soft, total, upcard], policy["second_later"][soft, total, upcard]))
+            selection = np.where(failed[acting], second_selection, selection)
+
+            #splits (and selections that aren't in the tables) are replayed with the regular game logic
+            replay[acting[(selection == SPLIT) | (selection == FALLBACK)]] = True
+
+            standing[acting[selection == STAND]] = True
+
+            surrendering = acting[selection == SURRENDER]
+            if len(surrendering):
+                allowed = np.array(self.rules.surrender_table)[card_amounts[surrendering]]
+                surrendered[surrendering[allowed]] = True
+                standing[surrendering[allowed]] = True
+                failed[surrendering[~allowed]] = True
+
+            doubling = acting[selection == DOUBLE]
+            if len(doubling):
+                allowed = self.rules.double_table[False] & (bets[doubling] <= balance[doubling]) #same as BettingManager.make_bet()
+                failed[doubling[~allowed]] = True
+                doubling = doubling[allowed]
+                balance[doubling] -= bets[doubling]
+                doubled[doubling] = 2
+                standing[doubling] = True
+
+            #hitting and doubling hands draw a card
+            drawing = np.concatenate((acting[selection == HIT], doubling))
+            if len(drawing):
+                card = rows[drawing, np.minimum(cursor[drawing], last_column)]
+                value = RANK_VALUES[card]
+                hard_totals[drawing] += np.where(value == 11, 1, value)
+                has_ace[drawing] |= value == 11
+                card_amounts[drawing] += 1
+                count[drawing] += tags[card]
+                cursor[drawing] += 1
+
+                drawn_totals = hard_totals[drawing] + 10 * (has_ace[drawing] & (hard_totals[drawing] <= 11))
+                standing[drawing[drawn_totals >= 21]] = True
+        else:
+            replay[~standing] = True
+
+        #classifies the player's hand, same as classify_hands()
+        totals = hard_totals + 10 * (has_ace & (hard_totals <= 11))
+        busted = ~surrendered & (totals > 21)
+        blackjacks = ~surrendered & (card_amounts == 2) & (totals == 21)
+        non_busted = ~surrendered & ~busted & ~blackjacks
+
+        #dealer only draws if there is a hand left to beat
+        dealer_totals = upcards + hole_cards
+        dealer_totals = np.where(dealer_totals == 22, 12, dealer_totals) #two Aces
+        dealer_blackjacks = dealer_totals == 21
+        dealer_busted = np.zeros(len(slots), dtype=bool)
+
+        drawing = np.flatnonzero(non_busted & ~peeked & ~replay)
+        if len(drawing):
+            columns = cursor[drawing, None] + np.arange(DEALER_LOOKAHEAD)
+            upcoming = np.take_along_axis(rows[drawing], np.minimum(columns, last_column), axis=1)
+            totals_drawn, busts, cards_drawn, unresolved = resolve_dealers(upcards[drawing], hole_cards[drawing], RANK_VALUES[upcoming], self.rules)
+
+            dealer_totals[drawing] = totals_drawn
+            dealer_busted[drawing] = busts
+            dealer_blackjacks[drawing] &= cards_drawn == 0
+            count[drawing] += (tags[upcoming] * (np.arange(DEALER_LOOKAHEAD) < cards_drawn[:, None])).sum(axis=1)
+            cursor[drawing] += cards_drawn
+            replay[drawing[unresolved]] = True
+
+        #settles the hand, same as settle_hands()
+        payouts = np.where(surrendered, np.round(bets * self.rules.surrender_ratio), 0).astype(np.int64)
+        blackjack_ratio = np.where(dealer_blackjacks, TIE_PAYOUT_RATIO, self.rules.blackjack_ratio)
+        payouts += np.where(blackjacks, np.round(bets * blackjack_ratio).astype(np.int64), 0)
+
+        winning = non_busted & (dealer_busted | (totals > dealer_totals))
+        tying = non_busted & ~dealer_busted & (totals == dealer_totals)
+        payouts += np.where(winning, bets * doubled * WIN_PAYOUT_RATIO, 0)
+        payouts += np.where(tying, bets * doubled * TIE_PAYOUT_RATIO, 0)
+        payouts = np.where(dealer_blackjacks & ~blackjacks, 0, payouts) #dealer blackjack takes every bet, unless the player also has one
+
+        if self.rules.dealer_peek:
+            payouts = np.where(peeked, np.where(blackjacks, bets * TIE_PAYOUT_RATIO, 0), payouts)
+
+        #rounds that ran past the end of the shoe would have reshuffled it, so they are replayed as well
+        replay |= cursor > self.shoe_length
+
+        self.balance[slots] = balance + payouts
+        self.cursor[slots] = cursor
+        self.running_count[slots] = count
+        self.fresh[slots] = self.shoe_length - cursor >= self.cut_card #same as ShoeDeck, past the cut card the round is the last one
+
+        busted_hands = busted.astype(np.int64)
+        blackjack_hands = blackjacks.astype(np.int64)
+        for i in np.flatnonzero(replay).tolist():
+            busted_hands[i], blackjack_hands[i] = self.replay_round(slots[i], start_cursor[i], start_count[i], start_balance[i], bets[i])
+
+        if self.algorithm.histogram is not None:
+            self.algorithm.histogram.record_many(true_counts, (self.balance[slots] - round_balance) / bets, busted_hands, blackjack_hands)
+
+    def replay_round(self, slot, cursor, running_count, balance, bet):
+        """Plays a slot's round with the regular game logic, starting from the state after the bet was made, then copies the results back into the arrays.
+        Returns the amount of busted hands and blackjacks in the round, if the histogram is enabled."""
+        deck = ShoeDeck(self.ranks[slot, :self.shoe_length], self.rules.penetration, self.rngs[slot])
+        deck.cursor = int(cursor)
+        dealt_values = RANK_VALUES[self.ranks[slot, :cursor]]
+        deck.composition = [deck.composition[i] - int(amount) for i, amount in enumerate(np.bincount(dealt_values, minlength=TABLE_VALUES)[2:])]
+        ranks = deck.ranks
+
+        #every card dealt before the round has been seen, so the tracker matches the deck
+        algorithm = self.fallback_algorithm
+        algorithm.tracker.counts = list(deck.composition)
+        algorithm.tracker.remaining = deck.get_card_amount()
+        algorithm.tracker.running_count = float(running_count)
+
+        betting_manager = BettingManager(int(balance))
+        betting_manager.bet = int(bet)
+        betting_manager.payout(blackjack_round(deck, betting_manager, algorithm, self.rules))
+
+        self.balance[slot] = betting_manager.get_balance()
+        self.cursor[slot] = deck.cursor if deck.ranks is ranks else self.shoe_length
+        self.running_count[slot] = algorithm.tracker.get_running_count()
+        self.fresh[slot] = deck.is_fresh()
+
+        if algorithm.round_hands is None:
+            return 0, 0
+        hands, dealer_hand, dealer_played = algorithm.round_hands
+        algorithm.round_hands = None
+        return sum(hand.check_bust() for hand in hands), sum(hand.blackjack_check() for hand in hands)
+
+
+def run_vector_games(algorithm, games, decks, starting_balance, rules=DEFAULT_RULES, seed=None, first_game=0, concurrent_games=VECTOR_GAMES, shoes=None):
+    """Same as run_lockstep_games, but plays the games with a VectorEngine. Only works for selection algorithms that can be compiled into tables."""
+    return VectorEngine(algorithm, games, decks, starting_balance, rules, seed, concurrent_games, first_game, shoes).run()
@@ -1,7 +1,9 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import json
 from blackjack_core.utility import clear_screen, continue_prompt
+from results_io import read_metadata, read_scores, source_files
+from results_store import ResultsStore, RESULTS_DATABASE, RUN_COLUMNS, SUMMARY_COLUMNS
+from score_statistics import round_statistics, cached_round_statistics, CONFIDENCE
 
 
 """This module serves as a tool analyzing and visualizing simulation results of a blackjack algorithm.
@@ -19,35 +21,48 @@ Future commits may increase amount of things this module does, but for the time
 # Default alpha value defined here, so it can be easily changed in one place
 # In the event that multiple simulations contain roughly the same amount of scores, changing the value while running the program would grow tedious.
 DEFAULT_ALPHA = 0.04
+AVERAGE_CHUNK_GAMES = 100000 #games read at a time while averaging, which bounds the memory used for files too large to load at once
+STORED_RUNS_SHOWN = 20 #runs listed when searching the results database
+GRAPH_FILE_NAME = "simulation_graph.png" #where the graph is saved if matplotlib can't show windows
 
 
 
 
-def fill_missing_scores(scores):    
-    """
-    Equalizes lengths of sublists contained in scores by repeating the last entry.
-    Returns the modified scores and the length of the longest run.
-    """
-
-    longest_run = 0
-
-
-    
-    for run in scores:
-        if len(run) > longest_run:
-            longest_run = len(run)
-
-    for run in scores:
-        while len(run) < longest_run:
-            run.append(run[-1])
-
-    return scores, longest_run
+def round_scores(scores, offsets, round_number=-1):
+    """Returns a numpy array containing the score of every game at the specified round (the last round of every game by default).
+    Games that ended earlier use their last score. Only the scores needed are read from disk."""
+    if round_number == -1:
+        return np.asarray(scores[offsets[1:] - 1])
+    return np.asarray(scores[offsets[:-1] + np.minimum(round_number, np.diff(offsets) - 1)])
 
-def average_scores(scores):
+def average_scores(scores, offsets):
     """
-    Returns a numpy array containing the average score of each round.
+    Returns a numpy array containing the average score of each round, with shorter games padded by their last score.
+    Games are read in chunks, so the scores never have to be in memory all at once.
     """
-    return np.mean(scores, axis=0)
+    lengths = np.diff(offsets)
+    longest_run = lengths.max()
+    totals = np.zeros(longest_run)
+    final_totals = np.zeros(longest_run + 1) #sum of the last scores of games that ended at each round
+
+    for start in range(0, len(lengths), AVERAGE_CHUNK_GAMES):
+        end = min(start + AVERAGE_CHUNK_GAMES, len(lengths))
+        chunk = np.asarray(scores[offsets[start]:offsets[end]], dtype=np.float64)
+        chunk_lengths = lengths[start:end]
+
+        round_numbers = np.arange(len(chunk)) - np.repeat(offsets[start:end] - offsets[start], chunk_lengths)
+        totals += np.bincount(round_numbers, weights=chunk, minlength=longest_run)
+        final_totals += np.bincount(chunk_lengths, weights=chunk[offsets[start + 1:end + 1] - offsets[start] - 1], minlength=longest_run + 1)
+
+    #a game's last score counts towards every round after it ended
+    totals += np.cumsum(final_totals)[:longest_run]
+    return totals / len(lengths)
+
+def padded_scores(scores, offsets):
+    """Returns a 2D numpy array of scores, with shorter games padded by repeating their last score. Reads every score, so it is only used for plotting."""
+    lengths = np.diff(offsets)
+    rounds = np.arange(lengths.max())
+    return np.asarray(scores)[offsets[:-1, None] + np.minimum(rounds[None, :], lengths[:, None] - 1)]
 
 def plot_all_scores(scores_array, alpha_value):
     """Plots every data point in given array."""
@@ -78,111 +93,119 @@ def plot_linear_fit(averages):
     
 
 
-def get_survival_metrics(scores, round_number=-1):
-    """Returns a np array containing the rounds lasted of each game played, 
-    as well as a np array consisting of boolean operators denoting whether the game resulted in a bust.
-    The round number can be specified, if not, the last round is used by default."""
-
-
-    rounds_lasted = []
-    bust_states = []
-
-    for i in scores:
-        rounds_lasted.append(len(i))
-        if i[round_number] == 0:
-            bust_states.append(True)
-        else:
-            bust_states.append(False)
-
-    rounds_lasted = np.array(rounds_lasted)
-    bust_states = np.array(bust_states)
-
-
+def format_interval(statistic, unit=""):
+    """Returns the analytic and bootstrap confidence intervals of a statistic (see score_statistics.py) as a string."""
+    analytic_low, analytic_high = statistic["analytic"]
+    bootstrap_low, bootstrap_high = statistic["bootstrap"]
+    return f"({CONFIDENCE:.0%} CI: {analytic_low:.2f}{unit} to {analytic_high:.2f}{unit} analytic, {bootstrap_low:.2f}{unit} to {bootstrap_high:.2f}{unit} bootstrap)"
 
-    return rounds_lasted, bust_states
+def print_statistics(scores, offsets, starting_balance, round_number=-1, file_name=None, files=None):
+    """Prints statistics about the simulation results, along with their confidence intervals.
+    If the name of the results file and the files it was read from are given, the intervals are cached in its stats index."""
 
-def analyse_survival_metrics(rounds_lasted, bust_states):
-    """Returns the average amount of rounds lasted by the algorithm, as well as the percentage of games that ended in a bust"""
-
-    average = np.average(rounds_lasted)
-
-    bust_percentage = (np.sum(bust_states == True) / len(bust_states)) / 100
-
-    return average, bust_percentage
-
-
-def get_standard_deviation(all_scores, round_number=-1):
-    """Returns the standard deviation of the scores of the specified round across all runs."""
-
-
-    round_scores = np.array([round[round_number] for round in all_scores])
-    return np.std(round_scores)
-
-def get_mean_score(scores_collection, round_number=-1):
-    """Returns the mean score of the specified round across all runs."""
-
-    return np.mean([run[round_number] for run in scores_collection])
-
-def print_statistics(scores_collection, starting_balance, round_number=-1):
-    """Prints statistics about the simulation results."""
-
-
-
-    rounds_lasted, bust_states = get_survival_metrics(scores_collection, round_number)
-    average_rounds_lasted, bust_percentage = analyse_survival_metrics(rounds_lasted, bust_states)
+    rounds_lasted = np.diff(offsets)
+    if file_name is None:
+        statistics = round_statistics(round_scores(scores, offsets, round_number), rounds_lasted, starting_balance)
+    else:
+        statistics = cached_round_statistics(file_name, files, round_scores(scores, offsets, round_number), rounds_lasted, starting_balance, round_number)
 
 
 
     #Handles differences  in analysis between user inputted round and automatically examined last round   
     if round_number == -1:
         round_description = "final round"
-        print(f"The longest run lasted {scores_collection.shape[1]} rounds.")
-        print(f"Average amount of rounds lasted by algorithm: {average_rounds_lasted:.2f}")
+        print(f"The longest run lasted {rounds_lasted.max()} rounds.")
+        print(f"Average amount of rounds lasted by algorithm: {statistics['average_rounds']['estimate']:.2f} {format_interval(statistics['average_rounds'])}")
     else:
         round_description = f"round #{round_number}"
 
     
    
-    print(f"Percentage of rounds that ended in a Bust by {round_description}: {bust_percentage:.2f}%")
-    print(f"Average profit/loss after {round_description}: {get_mean_score(scores_collection, round_number) - starting_balance:.2f} chips")
-    print(f"Standard deviation of scores after {round_description}: {get_standard_deviation(scores_collection, round_number):.2f}")
-
+    print(f"Percentage of rounds that ended in a Bust by {round_description}: {statistics['bust_percentage']['estimate']:.2f}% {format_interval(statistics['bust_percentage'], '%')}")
+    print(f"Average profit/loss after {round_description}: {statistics['mean_profit']['estimate']:.2f} chips {format_interval(statistics['mean_profit'])}")
+    print(f"Standard deviation of scores after {round_description}: {statistics['standard_deviation']['estimate']:.2f} {format_interval(statistics['standard_deviation'])}")
 
-def display_graph(averages, alpha_value, scores_collection, show_averages, show_all_scores, show_linear_fit):
-    """Displays the graphs of the averages and all scores. Sets visibility of the plots based on 3 boolean parameters."""
 
-    plt.xlabel("Round Number")
-    plt.ylabel("Chips")
-    
+class ScoreFigure:
+    """Graph of a results file's scores. The plots are built once, and showing/hiding a plot or changing the alpha value of all scores only updates them in place.
+    If the window is closed, the graph is rebuilt from the padded scores kept here, so they are never read from disk again."""
 
-    averages_plot = plot_averages(averages)
-    all_scores_plot = plot_all_scores(scores_collection, alpha_value)
-    lin_fit_plot = plot_linear_fit(averages)
+    def __init__(self, averages, scores, offsets, alpha_value=DEFAULT_ALPHA):
+        self.averages = averages
+        self.scores_array = padded_scores(scores, offsets)
+        self.build(alpha_value)
 
-    averages_plot.set_visible(show_averages)
-    all_scores_plot.set_visible(show_all_scores)    
-    lin_fit_plot.set_visible(show_linear_fit)
+    def build(self, alpha_value):
+        """Creates the figure and every plot in it, including hidden ones."""
+        self.figure = plt.figure()
+        plt.xlabel("Round Number")
+        plt.ylabel("Chips")
 
-    handles = []
-    labels = []
+        self.averages_plot = plot_averages(self.averages)
+        self.all_scores_plot = plot_all_scores(self.scores_array, alpha_value)
+        self.all_scores_plot.set_rasterized(True) #saved as one image rather than millions of points, which keeps .svg files small
+        self.lin_fit_plot = plot_linear_fit(self.averages)
 
-    if show_all_scores:
         # Mimics scatter format, to get around issues with legend displaying plots with high alpha transparantly
-        mimic_scatter = plt.scatter([], [], color="#4747ff", label="Chips per Round", alpha=1, s=30)
-        handles.append(mimic_scatter)
-        labels.append("Chips per Round")
-
-    if show_averages:
-        handles.append(averages_plot)
-        labels.append("Average Score")
-
-    if show_linear_fit:
-        handles.append(lin_fit_plot)
-        labels.append("Linear Fit")
-
-
-    plt.legend(handles, labels, loc="upper left")
-    plt.show()
+        self.mimic_scatter = plt.scatter([], [], color="#4747ff", label="Chips per Round", alpha=1, s=30)
+
+    def update(self, alpha_value, show_averages, show_all_scores, show_linear_fit):
+        """Sets the visibility of the plots based on 3 boolean parameters, and the alpha value of all scores."""
+        if not self.is_open():
+            self.build(alpha_value)
+
+        self.averages_plot.set_visible(show_averages)
+        self.all_scores_plot.set_visible(show_all_scores)
+        self.all_scores_plot.set_alpha(alpha_value)
+        self.lin_fit_plot.set_visible(show_linear_fit)
+
+        handles = []
+        labels = []
+        for plot, shown, label in ((self.mimic_scatter, show_all_scores, "Chips per Round"), (self.averages_plot, show_averages, "Average Score"),
+                                   (self.lin_fit_plot, show_linear_fit, "Linear Fit")):
+            if shown:
+                handles.append(plot)
+                labels.append(label)
+        self.figure.axes[0].legend(handles, labels, loc="upper left")
+        if not self.is_headless():
+            self.figure.canvas.draw_idle() #redrawn once the event loop runs, rather than straight away
+
+    def is_open(self):
+        """Returns True if the figure hasn't been closed."""
+        return plt.fignum_exists(self.figure.number)
+
+    def is_headless(self):
+        """Returns True if matplotlib can't show windows (e.g. the Agg backend, used when there is no display)."""
+        return self.figure.canvas.required_interactive_framework is None
+
+    def show(self):
+        """Shows the graph without blocking, so the menu can still be used while it is open.
+        In headless mode there's no window to show it in, so it's saved to GRAPH_FILE_NAME instead."""
+        if self.is_headless():
+            self.save(GRAPH_FILE_NAME)
+            return
+        plt.ion() #lets the window redraw while waiting for input
+        plt.show(block=False)
+        plt.pause(0.001) #draws the figure straight away
+
+    def refresh(self):
+        """Redraws the graph if it is being shown, so changes appear without showing it again."""
+        if not self.is_headless() and self.is_open():
+            plt.pause(0.001)
+
+    def save(self, file_name):
+        """Saves the graph to a file, in the format given by its extension (e.g. .png or .svg)."""
+        self.figure.savefig(file_name)
+        print(f"Graph saved to {file_name}")
+
+    def close(self):
+        plt.close(self.figure)
+
+
+def display_graph(score_figure, alpha_value, show_averages, show_all_scores, show_linear_fit):
+    """Displays the graphs of the averages and all scores. Sets visibility of the plots based on 3 boolean parameters."""
+    score_figure.update(alpha_value, show_averages, show_all_scores, show_linear_fit)
+    score_figure.show()
 
 
 def print_algorithm_details(data, file_name):
@@ -198,39 +221,88 @@ def print_algorithm_details(data, file_name):
     
 
 
+def parse_filters(text):
+    """Returns a dictionary of column: value from filters written as column=value and separated by commas. Whole numbers are converted to ints, others to floats."""
+    filters = {}
+    for condition in text.split(","):
+        if condition.strip() == "":
+            continue
+        column, value = (part.strip() for part in condition.split("=", 1))
+        for convert in (int, float):
+            try:
+                value = convert(value)
+                break
+            except ValueError:
+                pass
+        filters[column] = value
+    return filters
+
+def select_stored_run(database=RESULTS_DATABASE, shown_runs=STORED_RUNS_SHOWN):
+    """Prompts the user to search the results database and pick one of the runs found. Returns (metadata, scores, offsets), or None if no run was picked."""
+    store = ResultsStore(database)
+    try:
+        print("Enter filters as column=value separated by commas, using % as a wildcard (e.g. decks=6, counting=Hi-Lo%), or leave empty for every run.")
+        print(f"Columns: {', '.join(RUN_COLUMNS + SUMMARY_COLUMNS)}")
+        filters = parse_filters(input(" >").strip())
+        order_by = input("Enter the column to sort by, best first (leave empty for: mean_profit): ").strip() or "mean_profit"
+        runs = store.find_runs(order_by, order_by != "bust_percentage", shown_runs, **filters) #a lower bust percentage is better
+        if not runs:
+            print("No runs match those filters.")
+            return None
+
+        for run in runs:
+            print(f"{run['id']:>6}. {run['name']} - {run['decks']} decks, {run['games']} games, base bet {run['base_bet']}, starting balance {run['starting_balance']}"
+                  f" - profit/loss {run['mean_profit']:.2f}, bust {run['bust_percentage']:.2f}%")
+        run_id = input("Enter the number of the run to open (leave empty to exit): ").strip()
+        if run_id == "":
+            return None
+        return store.read_run(int(run_id))
+    finally:
+        store.close()
+
+
 def main():
     clear_screen()
 
-    file_name = input("Enter the name of the file containing the simulation results (leave empty for: simulation_results.json): ").strip()
-    if file_name == "":
-        file_name = "simulation_results.json"
-    elif not file_name.endswith(".json"):
-        file_name += ".json"
-
-    try:
-        with open(file_name) as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        print(f"File '{file_name}' not found. Please check the file name and try again.")
-        return
-    
+    file_name = input("Enter the name of the file containing the simulation results (leave empty for: simulation_results.json, or enter ? to search the results database): ").strip()
+    if file_name == "?":
+        try:
+            run = select_stored_run()
+        except (ValueError, KeyError) as error:
+            print(error)
+            return
+        if run is None:
+            return
+        data, scores, offsets = run
+        file_name = None #intervals are only cached in the stats index of results files
+        files = None
 
-    alpha_value = DEFAULT_ALPHA  
-    scores_collection = data["scores"]
-    starting_balance = data["starting_balance"]
+        clear_screen()
+        print_algorithm_details(data, f"Run {data['run_id']} of {RESULTS_DATABASE}")
+    else:
+        if file_name == "":
+            file_name = "simulation_results.json"
+        elif not file_name.endswith(".json"):
+            file_name += ".json"
 
-    scores_collection, most_rounds = fill_missing_scores(scores_collection)
-    scores_collection = np.array(scores_collection)
+        try:
+            data = read_metadata(file_name) #metadata is shown before the scores are read, which can take a while for large files
+        except FileNotFoundError:
+            print(f"File '{file_name}' not found. Please check the file name and try again.")
+            return
 
+        clear_screen()
 
-    
+        print_algorithm_details(data, file_name)
 
-    averages = average_scores(scores_collection)
+        scores, offsets = read_scores(file_name, data)
+        files = source_files(file_name, data)
 
-    clear_screen()
+    alpha_value = DEFAULT_ALPHA  
+    starting_balance = data["starting_balance"]
 
-    print_algorithm_details(data, file_name)
-    print_statistics(scores_collection, starting_balance, -1)
+    print_statistics(scores, offsets, starting_balance, -1, file_name, files)
+    averages = average_scores(scores, offsets)
 
     show_averages = True
     show_all_scores = True
@@ -241,7 +313,8 @@ def main():
 
     continue_prompt("\nPress Enter to display the graph.")
 
-    display_graph(averages, alpha_value, scores_collection, show_averages, show_all_scores, show_linear_fit)
+    score_figure = ScoreFigure(averages, scores, offsets, alpha_value)
+    display_graph(score_figure, alpha_value, show_averages, show_all_scores, show_linear_fit)
 
     
     continue_prompt()
@@ -265,18 +338,18 @@ def main():
             except ValueError:
                 print("Invalid input. Please enter a valid round number.")
                 continue
-            if round_number < 0 or round_number >= scores_collection.shape[1]:
+            if round_number < 0 or round_number >= len(averages):
                 print("Round number out of range. Please enter a valid round number.")
                 continue
 
-            print_statistics(scores_collection, starting_balance, round_number)
+            print_statistics(scores, offsets, starting_balance, round_number, file_name, files)
 
         elif choice == "2":
             graphing_choice = None
-            while graphing_choice != "6":
+            while graphing_choice != "7":
                 clear_screen()
                 print("Graphing options:")
-                print(f"\t1. {show_hide[show_linear_fit]} linear fit\n\t2. {show_hide[show_all_scores]} all scores\n\t3. {show_hide[show_averages]} averages\n\t4. Change alpha value of all scores ({alpha_value})\n\t5. Show Graph \n\t6. Exit")
+                print(f"\t1. {show_hide[show_linear_fit]} linear fit\n\t2. {show_hide[show_all_scores]} all scores\n\t3. {show_hide[show_averages]} averages\n\t4. Change alpha value of all scores ({alpha_value})\n\t5. Show Graph \n\t6. Save graph to file\n\t7. Exit")
                 graphing_choice = input(" >").strip()
 
 
@@ -323,7 +396,15 @@ def main():
                     
 
                 elif graphing_choice == "5":
-                    display_graph(averages, alpha_value, scores_collection, show_averages, show_all_scores, show_linear_fit)
+                    display_graph(score_figure, alpha_value, show_averages, show_all_scores, show_linear_fit)
+
+                elif graphing_choice == "6":
+                    graph_file_name = input(f"Enter the file name, ending in .png or .svg (leave empty for: {GRAPH_FILE_NAME}): ").strip() or GRAPH_FILE_NAME
+                    if not graph_file_name.endswith((".png", ".svg")):
+                        graph_file_name += ".png"
+                    score_figure.update(alpha_value, show_averages, show_all_scores, show_linear_fit)
+                    score_figure.save(graph_file_name)
+                    continue_prompt()
 
                     
                             
@@ -331,16 +412,13 @@ def main():
 
                 else:
                     print("Invalid choice. Please try again.")
-           
-
-            
-            
- 
 
+                if graphing_choice in ("1", "2", "3", "4") and score_figure.is_open():
+                    #changes are made to the existing plots, so an open window shows them straight away
+                    score_figure.update(alpha_value, show_averages, show_all_scores, show_linear_fit)
+                    score_figure.refresh()
 
-    
-
-    
+    score_figure.close()
 
 
 if __name__ == "__main__":
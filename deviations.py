@@ -0,0 +1,172 @@
+import json
+import os
+from algorithms import BasicStrategy, DeviationStrategy
+from blackjack_core.blackjack_classes import Card
+from blackjack_core.composition import full_composition, CARDS_PER_DECK
+from blackjack_core.expected_value import ExpectedValueCalculator, HypotheticalHand, remove_card
+from blackjack_core.rules import DEFAULT_RULES
+
+"""
+Generates index tables for DeviationStrategy, i.e. the true counts at which a play should deviate from basic strategy.
+
+For every candidate play, the exact expected value of the deviation and of basic strategy are compared on shoes skewed to a range of true counts,
+and the index is the true count at which the deviation becomes the better play.
+Tables are cached per (rules, decks, counting algorithm), both in memory and in a json file, since generating one takes a while.
+"""
+
+
+INDEX_CACHE_FILE = "deviation_indices.json"
+MIN_INDEX = -10 #true counts outside of this range are not searched
+MAX_INDEX = 10
+DECKS_REMAINING_FRACTION = 0.5 #indices are derived halfway through the shoe
+
+#(kind, total or pair value, upcard, deviation) of every play in the Illustrious 18, used as the default set of candidates
+ILLUSTRIOUS_18_CANDIDATES = [(kind, total, upcard, selection) for (kind, total, upcard), (index, selection, above) in DeviationStrategy.ILLUSTRIOUS_18.items()]
+
+_index_cache = {} #tables that have already been generated or loaded this session
+
+
+def count_tags(count_alg):
+    """Returns a list containing the count value of each card value, from 2s (index 0) to Aces (index 9)."""
+    ranks = [2, 3, 4, 5, 6, 7, 8, 9, 10, 1]
+    return [count_alg.count(Card(rank, 0)) for rank in ranks]
+
+def composition_for_true_count(count_alg, decks, true_count, decks_remaining=None):
+    """Returns a composition whose true count is (approximately) the given true count under the counting algorithm.
+    Cards are removed from a full shoe in proportion to their count value, which is the expected composition of a shoe at that count."""
+    if decks_remaining is None:
+        decks_remaining = decks * DECKS_REMAINING_FRACTION
+
+    tags = count_tags(count_alg)
+    full = full_composition(decks)
+    densities = [amount / (decks * CARDS_PER_DECK) for amount in full]
+
+    #remaining amount of each value is scaled by (1 - strength * tag), which produces a running count of true_count * decks_remaining
+    spread = sum(density * tag * tag for density, tag in zip(densities, tags))
+    if spread == 0: #counting algorithm doesn't count anything, so every count looks like a neutral shoe
+        strength = 0
+    else:
+        strength = true_count / (CARDS_PER_DECK * spread)
+
+    remaining_cards = decks_remaining * CARDS_PER_DECK
+    composition = []
+    for amount, density, tag in zip(full, densities, tags):
+        composition.append(min(amount, max(0, round(remaining_cards * density * (1 - strength * tag)))))
+
+    return tuple(composition)
+
+def representative_values(kind, total):
+    """Returns the card values of a typical two card hand of the given kind and total."""
+    if kind == "pair":
+        return (total, total)
+    if kind == "soft":
+        return (11, total - 11)
+    if total >= 12:
+        return (10, total - 10)
+    return (total - total // 2, total // 2) if total % 2 else (total // 2 + 1, total // 2 - 1) #avoids pairs, e.g. 10 is 6 + 4
+
+
+class IndexFinder:
+    """Compares deviations against basic strategy on shoes skewed to different true counts.
+    Calculators are kept per true count, so candidates evaluated at the same count share their memoized results."""
+
+    def __init__(self, count_alg, decks, rules=DEFAULT_RULES, base_strategy=None):
+        self.count_alg = count_alg
+        self.decks = decks
+        self.rules = rules
+        self.base_strategy = base_strategy if base_strategy is not None else BasicStrategy()
+        self.calculators = {}
+
+    def advantage(self, candidate, true_count):
+        """Returns the expected value gained by making the deviation instead of the basic strategy play at the given true count."""
+        kind, total, upcard, selection = candidate
+
+        if true_count not in self.calculators:
+            self.calculators[true_count] = ExpectedValueCalculator(self.base_strategy, self.rules)
+        calculator = self.calculators[true_count]
+
+        values = representative_values(kind, total)
+        composition = composition_for_true_count(self.count_alg, self.decks, true_count)
+        for value in values + (upcard,):
+            composition = remove_card(composition, value)
+
+        base_selection = self.base_strategy.select(HypotheticalHand(values), HypotheticalHand([upcard], hidden=True))
+        if base_selection == selection:
+            return 0.0
+
+        deviation_value = calculator.action_value(selection, composition, values, upcard)
+        base_value = calculator.action_value(base_selection, composition, values, upcard)
+        return deviation_value - base_value
+
+    def find_index(self, candidate):
+        """Returns (index, deviate_above) for a candidate, or None if the deviation is never (or always) the better play within the searched range.
+        Uses a binary search, since the advantage of a deviation changes monotonically with the count."""
+        low, high = MIN_INDEX, MAX_INDEX
+        low_advantage = self.advantage(candidate, low)
+        high_advantage = self.advantage(candidate, high)
+
+        if (low_advantage >= 0) == (high_advantage >= 0):
+            return None
+
+        deviate_above = high_advantage >= 0
+
+        #finds the first count at which the better play changes
+        while high - low > 1:
+            middle = (low + high) // 2
+            if (self.advantage(candidate, middle) >= 0) == deviate_above:
+                high = middle
+            else:
+                low = middle
+
+        if deviate_above:
+            return high, True
+        return high, False #deviation is made below the first count at which basic strategy is better
+
+
+def cache_key(count_alg, decks, rules):
+    """Returns the key that index tables are cached under."""
+    return json.dumps([str(count_alg), decks, list(rules.key())])
+
+def generate_index_table(count_alg, decks, rules=DEFAULT_RULES, candidates=None, cache_file=INDEX_CACHE_FILE):
+    """Returns an index table for DeviationStrategy, generated for the counting algorithm, amount of decks and rules.
+    Candidates are (kind, total or pair value, upcard, selection) tuples, and default to the plays in the Illustrious 18.
+    Tables are cached in memory and, unless cache_file is None, in a json file shared between runs."""
+    if candidates is None:
+        candidates = ILLUSTRIOUS_18_CANDIDATES
+    key = cache_key(count_alg, decks, rules)
+
+    if key not in _index_cache and cache_file is not None and os.path.exists(cache_file):
+        with open(cache_file) as f:
+            for saved_key, rows in json.load(f).items():
+                _index_cache[saved_key] = {(kind, total, upcard): (index, selection, above) for kind, total, upcard, index, selection, above in rows}
+
+    table = _index_cache.get(key, {})
+    missing = [candidate for candidate in candidates if candidate[:3] not in table]
+
+    if missing:
+        finder = IndexFinder(count_alg, decks, rules)
+        for candidate in missing:
+            result = finder.find_index(candidate)
+            if result is not None:
+                index, deviate_above = result
+                table[candidate[:3]] = (index, candidate[3], deviate_above)
+
+        _index_cache[key] = table
+        if cache_file is not None:
+            save_index_cache(cache_file)
+
+    return {candidate[:3]: table[candidate[:3]] for candidate in candidates if candidate[:3] in table}
+
+def save_index_cache(cache_file=INDEX_CACHE_FILE):
+    """Saves every index table generated this session to a json file."""
+    saved = {}
+    for key, table in _index_cache.items():
+        saved[key] = [[kind, total, upcard, index, selection, above] for (kind, total, upcard), (index, selection, above) in table.items()]
+
+    with open(cache_file, "w") as f:
+        json.dump(saved, f, indent=2)
+
+def create_deviation_strategy(count_alg, decks, rules=DEFAULT_RULES, candidates=None, cache_file=INDEX_CACHE_FILE):
+    """Returns a DeviationStrategy using an index table generated for the counting algorithm, amount of decks and rules."""
+    table = generate_index_table(count_alg, decks, rules, candidates, cache_file)
+    return DeviationStrategy(table, name=f"{count_alg} Deviations")
@@ -0,0 +1,215 @@
+import copy
+import math
+import os
+import sys
+import tempfile
+import numpy as np
+from algorithms import (AlwaysHit, BasicStrategy, BlackjackAlgorithm, DealerStrategy, FlatBetting, HalvesCount, HiLoCount, LinearScale, MaxCaution, NoCardCount,
+                        SuddenShift, TimeBider, ZenCount)
+from bet_replay import record_outcomes, reprice
+from blackjack_core.batch import create_shoe_deck, run_lockstep_games
+from blackjack_core.blackjack import game
+from blackjack_core.rules import DEFAULT_RULES, Rules
+from blackjack_core.shoe_library import ShoeLibrary, create_shoe_library
+from blackjack_core.utility import BettingManager
+from blackjack_core.vectorized import run_vector_games
+from simulation import _create_algorithm, simulate
+
+"""
+Checks that the fast engines give the same results as the reference implementation, game() playing one game at a time.
+
+The lockstep, vector, parallel (several worker processes) and replay (bet_replay.reprice()) engines all deal game i the shoe created by
+batch.create_shoe_deck(decks, rules, seed, i), so the reference plays the same shoes and every logged balance of every game is compared exactly.
+The standard engine shuffles finite shoes with Python's random module, so its games are different ones: its final balances are compared with the lockstep
+engine's using two-sample tests (Kolmogorov-Smirnov on the distribution, Welch's test on the mean and a test on the bust proportion), which fail only
+if the engines differ by more than chance allows at the significance level. Infinite decks are dealt the same way by every engine, so the standard engine
+is compared exactly for them instead.
+Every engine except replay can also deal from a shoe library, in which case they all play exactly the same shoes, so the standard engine is compared exactly too.
+
+Run this file to check every configuration and rules variant below, it exits with a non-zero status if any check fails.
+"""
+
+
+#configurations covering table-driven, composition-free and aggressive algorithms, and several counts
+CONFIGURATIONS = [
+    (BasicStrategy, HiLoCount, SuddenShift),
+    (BasicStrategy, HalvesCount, LinearScale),
+    (MaxCaution, ZenCount, TimeBider),
+    (AlwaysHit, NoCardCount, FlatBetting),
+    (DealerStrategy, HiLoCount, FlatBetting),
+]
+RULES_VARIANTS = [
+    DEFAULT_RULES,
+    Rules(dealer_hits_soft_17=True, surrender=True, dealer_peek=True, penetration=0.75),
+    Rules(max_splits=0, double_after_split=False, blackjack_payout=1.2, penetration=0.5),
+    Rules(infinite_deck=True),
+    Rules(infinite_deck=True, shoe_length=80, penetration=0.75),
+]
+EXACT_ENGINES = ("lockstep", "vector", "parallel", "replay")
+LIBRARY_ENGINES = ("lockstep", "vector", "parallel", "standard") #every engine that can deal from a shoe library
+SIGNIFICANCE = 0.001 #chance of a distributional check failing when the engines are equivalent, for each test
+
+
+def reference_scores(selection, counting, betting, games, decks, base_bet, starting_balance, seed, rules=DEFAULT_RULES, first_game=0, shoes=None):
+    """Returns the scores of every game played one at a time by game(), each dealt the same shoe as in the lockstep engine,
+    or game i's shoe from the shoe library if the file name of one is given."""
+    library = ShoeLibrary(shoes) if shoes is not None else None
+    sub_algorithms = [_create_algorithm(sub_algorithm) for sub_algorithm in (selection, counting, betting)]
+    algorithm = BlackjackAlgorithm(*sub_algorithms, base_bet, decks, games, starting_balance, rules)
+    all_scores = []
+    for game_number in range(first_game, first_game + games):
+        game_algorithm = copy.deepcopy(algorithm)
+        game_algorithm.game_number = game_number
+        deck = library.create_deck(game_number, rules.penetration) if library is not None else create_shoe_deck(decks, rules, seed, game_number)
+        game(BettingManager(starting_balance), deck, game_algorithm, rules)
+        all_scores.append(game_algorithm.all_scores.pop())
+    return all_scores
+
+def candidate_scores(engine, selection, counting, betting, games, decks, base_bet, starting_balance, seed, rules=DEFAULT_RULES, first_game=0, shoes=None):
+    """Returns the scores of every game played by a fast engine, as lists, dealt from the shoe library if the file name of one is given.
+    Raises ValueError if the engine can't play the configuration."""
+    if engine == "standard":
+        if not rules.infinite_deck and shoes is None:
+            raise ValueError("the standard engine only deals the same shoes for infinite decks")
+        result = simulate(selection, counting, betting, games, decks, base_bet, starting_balance, seed, rules=rules, first_game=first_game, shoes=shoes)
+        return [run.tolist() for run in result.runs()]
+    if engine == "parallel":
+        result = simulate(selection, counting, betting, games, decks, base_bet, starting_balance, seed, 2, rules, "lockstep", first_game=first_game, shoes=shoes)
+        return [run.tolist() for run in result.runs()]
+    if engine == "replay":
+        if shoes is not None:
+            raise ValueError("the replay engine doesn't deal from shoe libraries")
+        outcomes = record_outcomes(selection, counting, games, decks, rules, seed, first_game)
+        return [run.tolist() for run in reprice(outcomes, betting, base_bet, starting_balance).runs()]
+
+    sub_algorithms = [copy.deepcopy(_create_algorithm(sub_algorithm)) for sub_algorithm in (selection, counting, betting)]
+    algorithm = BlackjackAlgorithm(*sub_algorithms, base_bet, decks, games, starting_balance, rules)
+    library = ShoeLibrary(shoes) if shoes is not None else None
+    if engine == "lockstep":
+        return run_lockstep_games(algorithm, games, decks, starting_balance, rules, seed, first_game, shoes=library)
+    if engine == "vector":
+        return run_vector_games(algorithm, games, decks, starting_balance, rules, seed, first_game, shoes=library)
+    raise ValueError(f"Unknown engine {engine!r}, must be one of {EXACT_ENGINES + ('standard',)}.")
+
+def first_difference(reference, candidate):
+    """Returns (game index, round index, reference score, candidate score) of the first logged score that differs, or None if every score is the same.
+    A missing score (a game that lasted fewer rounds) is None."""
+    if len(reference) != len(candidate):
+        return (min(len(reference), len(candidate)), 0, len(reference), len(candidate))
+    for game_index, (reference_game, candidate_game) in enumerate(zip(reference, candidate)):
+        if list(reference_game) != list(candidate_game):
+            for round_index in range(max(len(reference_game), len(candidate_game))):
+                reference_score = reference_game[round_index] if round_index < len(reference_game) else None
+                candidate_score = candidate_game[round_index] if round_index < len(candidate_game) else None
+                if reference_score != candidate_score:
+                    return (game_index, round_index, reference_score, candidate_score)
+    return None
+
+def kolmogorov_smirnov(first, second):
+    """Returns (statistic, p-value) of the two-sample Kolmogorov-Smirnov test, with the p-value from the asymptotic distribution.
+    Balances are discrete, which only makes the test more conservative."""
+    first, second = np.sort(first), np.sort(second)
+    values = np.concatenate((first, second))
+    statistic = float(np.max(np.abs(np.searchsorted(first, values, side="right") / len(first) - np.searchsorted(second, values, side="right") / len(second))))
+    effective_size = math.sqrt(len(first) * len(second) / (len(first) + len(second)))
+    scale = (effective_size + 0.12 + 0.11 / effective_size) * statistic
+    if scale < 0.2:
+        return statistic, 1.0 #series below converges slowly, and the p-value is 1 to many decimal places anyway
+    p_value = 2 * sum((-1) ** (k - 1) * math.exp(-2 * k * k * scale * scale) for k in range(1, 101))
+    return statistic, min(max(p_value, 0.0), 1.0)
+
+def welch_test(first, second):
+    """Returns (difference in means, p-value) of Welch's two-sample test, using the normal approximation since samples are large."""
+    first, second = np.asarray(first, dtype=np.float64), np.asarray(second, dtype=np.float64)
+    difference = first.mean() - second.mean()
+    error = math.sqrt(first.var(ddof=1) / len(first) + second.var(ddof=1) / len(second))
+    if error == 0:
+        return float(difference), 1.0 if difference == 0 else 0.0
+    return float(difference), math.erfc(abs(difference) / error / math.sqrt(2))
+
+def proportion_test(first, second):
+    """Returns (difference in proportions, p-value) of the two-sample test for the proportion of True values, with a pooled standard error."""
+    first, second = np.asarray(first, dtype=bool), np.asarray(second, dtype=bool)
+    pooled = (first.sum() + second.sum()) / (len(first) + len(second))
+    difference = first.mean() - second.mean()
+    error = math.sqrt(pooled * (1 - pooled) * (1 / len(first) + 1 / len(second)))
+    if error == 0:
+        return float(difference), 1.0
+    return float(difference), math.erfc(abs(difference) / error / math.sqrt(2))
+
+def compare_exact(selection, counting, betting, games, decks, base_bet, starting_balance, seed, rules=DEFAULT_RULES, engines=EXACT_ENGINES, shoes=None):
+    """Returns a dictionary of engine: first difference from the reference (None if identical, or "skipped" with the reason if the engine can't play the configuration).
+    If the file name of a shoe library is given, every engine and the reference are dealt from it."""
+    reference = reference_scores(selection, counting, betting, games, decks, base_bet, starting_balance, seed, rules, shoes=shoes)
+    differences = {}
+    for engine in engines:
+        try:
+            candidate = candidate_scores(engine, selection, counting, betting, games, decks, base_bet, starting_balance, seed, rules, shoes=shoes)
+        except ValueError as error:
+            differences[engine] = f"skipped ({error})"
+            continue
+        differences[engine] = first_difference(reference, candidate)
+    return differences
+
+def compare_distributions(selection, counting, betting, games, decks, base_bet, starting_balance, seed, rules=DEFAULT_RULES):
+    """Returns a dictionary of test name: (statistic, p-value), comparing the final balances of the standard and lockstep engines for the same seed."""
+    standard = simulate(selection, counting, betting, games, decks, base_bet, starting_balance, seed, rules=rules, engine="standard").final_scores()
+    lockstep = simulate(selection, counting, betting, games, decks, base_bet, starting_balance, seed, rules=rules, engine="lockstep").final_scores()
+    return {
+        "distribution": kolmogorov_smirnov(standard, lockstep),
+        "mean": welch_test(standard, lockstep),
+        "bust": proportion_test(standard == 0, lockstep == 0),
+    }
+
+def report_exact(name, differences):
+    """Prints one line per engine compared by compare_exact(), returning the amount that differed from the reference."""
+    failures = 0
+    for engine, difference in differences.items():
+        if isinstance(difference, str):
+            print(f"SKIP {engine}: {name} - {difference}")
+        elif difference is None:
+            print(f"PASS {engine}: {name}")
+        else:
+            failures += 1
+            game_index, round_index, reference_score, candidate_score = difference
+            print(f"FAIL {engine}: {name} - game {game_index}, score {round_index}: reference {reference_score}, {engine} {candidate_score}")
+    return failures
+
+def run_harness(configurations=CONFIGURATIONS, rules_variants=RULES_VARIANTS, decks=(1, 6), exact_games=300, distribution_games=3000, base_bet=10,
+                starting_balance=1000, seed=0, significance=SIGNIFICANCE):
+    """Runs every check for every configuration, rules variant and amount of decks, printing one line per check. Returns the amount of failed checks.
+    Finite shoes are also checked on a shoe library of exact_games shoes, created in a temporary directory."""
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        libraries = {deck_amount: os.path.join(directory, f"shoes_{deck_amount}.json") for deck_amount in decks}
+        for deck_amount, library in libraries.items():
+            create_shoe_library(library, exact_games, deck_amount, seed)
+
+        for rules in rules_variants:
+            for selection, counting, betting in configurations:
+                for deck_amount in decks:
+                    name = f"{_create_algorithm(betting)} - {_create_algorithm(selection)} - {_create_algorithm(counting)}, {deck_amount} decks, {rules}"
+                    engines = EXACT_ENGINES + ("standard",) if rules.infinite_deck else EXACT_ENGINES
+                    differences = compare_exact(selection, counting, betting, exact_games, deck_amount, base_bet, starting_balance, seed, rules, engines)
+                    failures += report_exact(name, differences)
+
+                    if rules.infinite_deck:
+                        continue #the standard engine was already compared exactly, and shoe libraries only hold finite shoes
+                    differences = compare_exact(selection, counting, betting, exact_games, deck_amount, base_bet, starting_balance, seed, rules,
+                                                LIBRARY_ENGINES, libraries[deck_amount])
+                    failures += report_exact(name + ", shoe library", differences)
+
+                    tests = compare_distributions(selection, counting, betting, distribution_games, deck_amount, base_bet, starting_balance, seed, rules)
+                    for test, (statistic, p_value) in tests.items():
+                        passed = p_value >= significance
+                        failures += not passed
+                        print(f"{'PASS' if passed else 'FAIL'} standard {test}: {name} - statistic {statistic:.4f}, p = {p_value:.4f}")
+    print(f"{failures} checks failed.")
+    return failures
+
+def main():
+    sys.exit(1 if run_harness() else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import numpy as np
+from algorithms import BlackjackAlgorithm
+from blackjack_core.batch import CONCURRENT_GAMES, LockstepEngine, game_rng
+from blackjack_core.blackjack_classes import ShoeDeck
+from blackjack_core.rules import DEFAULT_RULES
+from simulation import SimulationResult, _create_algorithm
+
+"""
+Importance sampling for rare events, such as the ruin of aggressive betting algorithms, which would take a huge amount of games to estimate by simulating normally.
+
+Shoes are shuffled with a tilt towards the counts of interest: every card is dealt with a probability proportional to exp(tilt * count value) among the cards left,
+so a positive tilt deals the cards that raise the count first, and high true counts come up far more often than in a fair shoe.
+Each game is weighted by its likelihood ratio, the probability of the cards it was dealt in a fair shoe divided by their probability in the tilted one.
+Only the cards dealt before the game ended are included, since the rest of the shoe never affects the game.
+The weighted average of any statistic is then an unbiased estimate of its value with fair shoes, reported along with its standard error.
+
+A tilt that is too large makes a few games carry most of the weight, which shows up as a small effective sample size and a large standard error.
+"""
+
+
+def tilted_shoe(decks, tags, tilt, rng):
+    """Returns a shoe as an array of ranks (1-13), where each card is dealt with a probability proportional to exp(tilt * tags[rank]) among the cards left.
+    Cards are ordered by exponential keys scaled by their weights, which deals them in the same order as drawing them one at a time."""
+    ranks = np.repeat(np.arange(1, 14, dtype=np.uint8), 4 * decks)
+    keys = rng.exponential(size=len(ranks)) / np.exp(tilt * tags[ranks])
+    return ranks[np.argsort(keys, kind="stable")]
+
+def log_likelihood_ratios(ranks, tags, tilt):
+    """Returns an array containing the log likelihood ratio (fair / tilted) of dealing the first i cards of a tilted shoe, for i from 0 to the shoe's length."""
+    weights = np.exp(tilt * tags[ranks])
+    remaining_weight = np.cumsum(weights[::-1])[::-1] #total weight of the cards left before each card is dealt
+    remaining_cards = np.arange(len(ranks), 0, -1)
+    #fair probability is 1 / remaining cards, tilted probability is the card's weight over the remaining weight
+    log_ratios = np.log(remaining_weight) - np.log(remaining_cards) - tilt * tags[ranks]
+    return np.concatenate(([0.0], np.cumsum(log_ratios)))
+
+
+class TiltedEngine(LockstepEngine):
+    """Lockstep engine that deals tilted shoes and keeps the likelihood ratio of every game."""
+
+    def __init__(self, algorithm, games, decks, starting_balance, tilt, rules=DEFAULT_RULES, seed=None, concurrent_games=CONCURRENT_GAMES, first_game=0):
+        super().__init__(algorithm, games, decks, starting_balance, rules, seed, concurrent_games, first_game)
+        self.tilt = tilt
+        self.tilted_shoes = {} #(ranks, log likelihood ratios) of every game being played, by game number
+        self.log_weights = np.zeros(games) #log likelihood ratio of every game, in game order
+
+    def create_deck(self, game_number):
+        """Returns a ShoeDeck dealing a tilted shoe. If the shoe runs out mid-round, the new shoe is shuffled fairly."""
+        rng = game_rng(self.seed, game_number)
+        ranks = tilted_shoe(self.decks, self.tags, self.tilt, rng)
+        self.tilted_shoes[game_number] = (ranks, log_likelihood_ratios(ranks, self.tags, self.tilt))
+        return ShoeDeck(ranks, self.rules.penetration, rng)
+
+    def finish_game(self, slot):
+        """Stores the likelihood ratio of the cards the game was dealt, then its scores."""
+        ranks, log_ratios = self.tilted_shoes.pop(slot.algorithm.game_number)
+        dealt = slot.deck.cursor if slot.deck.ranks is ranks else len(ranks) #a reshuffled shoe was fair, so it doesn't change the ratio
+        self.log_weights[slot.index] = log_ratios[dealt]
+        super().finish_game(slot)
+
+
+def importance_simulate(selection, counting, betting, games, decks, base_bet, starting_balance, tilt, seed=0, rules=DEFAULT_RULES, first_game=0):
+    """Runs a simulation with tilted shoes. Returns (SimulationResult, weights), where weights is the likelihood ratio of every game.
+    Statistics have to be weighted to be estimates for fair shoes, see weighted_estimate() and importance_statistics()."""
+    if rules.infinite_deck:
+        raise ValueError("Shoes can only be tilted for finite decks.")
+    sub_algorithms = [_create_algorithm(sub_algorithm) for sub_algorithm in (selection, counting, betting)]
+    algorithm = BlackjackAlgorithm(*sub_algorithms, base_bet, decks, games, starting_balance, rules)
+    engine = TiltedEngine(algorithm, games, decks, starting_balance, tilt, rules, seed, first_game=first_game)
+    all_scores = engine.run()
+
+    metadata = algorithm.get_metadata()
+    metadata["seed"] = seed
+    metadata["seats"] = 1
+    metadata["engine"] = "lockstep"
+    metadata["tilt"] = tilt
+    if first_game:
+        metadata["first_game"] = first_game
+    return SimulationResult.from_lists(all_scores, metadata), np.exp(engine.log_weights)
+
+def weighted_estimate(values, weights):
+    """Returns (estimate, standard error) of the mean of a value under fair shoes, given its value and likelihood ratio in every game."""
+    weighted_values = np.asarray(values, dtype=np.float64) * weights
+    return float(weighted_values.mean()), float(weighted_values.std(ddof=1) / np.sqrt(len(weighted_values)))
+
+def effective_sample_size(weights):
+    """Returns the amount of fair games that the weighted games are worth, which is much smaller than the amount of games if the tilt is too large."""
+    return float(weights.sum() ** 2 / np.sum(weights ** 2))
+
+def importance_statistics(result, weights, profit_thresholds=(), round_number=None):
+    """Returns a dictionary of statistic: (estimate, standard error) for fair shoes, at the specified round (the final round of every game by default).
+    Each profit threshold adds the probability of ending with at least that much profit (or at most that much, for negative thresholds)."""
+    scores = result.final_scores() if round_number is None else result.scores_at(round_number)
+    profits = scores - result.metadata["starting_balance"]
+
+    bust_probability, bust_error = weighted_estimate(scores == 0, weights)
+    mean_profit = weighted_estimate(profits, weights)
+    #variance is E[profit^2] - E[profit]^2, its standard error is left out since it would need the delta method
+    second_moment, _ = weighted_estimate(profits.astype(np.float64) ** 2, weights)
+
+    statistics = {
+        "bust_percentage": (bust_probability * 100, bust_error * 100),
+        "mean_profit": mean_profit,
+        "standard_deviation": (float(np.sqrt(max(second_moment - mean_profit[0] ** 2, 0))), None),
+        "effective_games": (effective_sample_size(weights), None),
+    }
+    for threshold in profit_thresholds:
+        tail = profits >= threshold if threshold >= 0 else profits <= threshold
+        statistics[f"profit_{'at_least' if threshold >= 0 else 'at_most'}_{threshold}"] = weighted_estimate(tail, weights)
+    return statistics
+
+def print_importance_statistics(statistics):
+    """Prints the statistics returned by importance_statistics(), with their standard errors."""
+    print(f"Worth {statistics['effective_games'][0]:.0f} games with fair shoes")
+    for name, (estimate, error) in statistics.items():
+        if name == "effective_games":
+            continue
+        error_text = f" ± {error:.4f}" if error is not None else ""
+        print(f"{name.replace('_', ' ').capitalize()}: {estimate:.4f}{error_text}")
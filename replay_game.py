@@ -0,0 +1,94 @@
+import copy
+import algorithms
+from algorithms import BlackjackAlgorithm
+from betting_simulation import BASE_BET, DECKS, STARTING_BALANCE, RULES, import_algoritms, construct_algorithm
+from blackjack_core.blackjack import game, create_deck
+from blackjack_core.batch import create_shoe_deck
+from blackjack_core.event_log import OUTCOMES, hand_outcome, round_totals
+from blackjack_core.rules import DEFAULT_RULES
+from blackjack_core.shoe_library import ShoeLibrary
+from blackjack_core.utility import BettingManager, clear_screen
+from simulation import ENGINES, _create_algorithm
+
+"""
+Plays a single game of a seeded simulation again and prints it round by round (balance, count, bet, every hand and its selections, the dealer's hand and the payout).
+Every game's shoe depends only on the seed and the game number, so any game can be replayed straight away, without playing the games before it.
+The replayed game gives the same scores as the same game in simulate() with the same seed, engine and shoe library.
+"""
+
+
+ACTION_NAMES = {"1": "hit", "2": "double", "3": "split", "4": "stand", "5": "surrender"}
+
+
+class RoundTrace:
+    """Collects a description of every round of a game. Attached to an algorithm in place of an EventWriter."""
+
+    def __init__(self):
+        self.rounds = []
+
+    def write_round(self, game, round_number, true_count, bet, hands, dealer_hand, rules, dealer_played=False):
+        """Keeps the round's hands, selections and outcomes, described as text."""
+        totals, dealer_total, dealer_blackjack, dealer_blackjack_wins = round_totals(hands, dealer_hand)
+        hand_lines = []
+        for index, (hand, total) in enumerate(zip(hands, totals)):
+            outcome, payout = hand_outcome(hand, total, dealer_total, dealer_blackjack, dealer_blackjack_wins, bet, rules)
+            actions = ", ".join(ACTION_NAMES.get(action, action) for action in hand.actions) or "none"
+            hand_lines.append(f"  Hand {index + 1}: {cards_text(hand.cards)} ({total}) - selections: {actions} - {OUTCOMES[outcome]}, pays {payout}")
+        self.rounds.append((round_number, true_count, bet, hand_lines, f"  Dealer: {cards_text(dealer_hand.cards)} ({dealer_total})"))
+
+    def close(self):
+        pass
+
+
+def cards_text(cards):
+    """Returns the cards of a hand as one string, in the same format as printed hands."""
+    return "".join(str(card) for card in cards)
+
+def replay_game(selection, counting, betting, game_number, decks, base_bet, starting_balance, seed, rules=DEFAULT_RULES, engine="standard", shoes=None,
+                trace=True):
+    """Plays one game of a seeded simulation and returns its scores, printing every round if trace is True.
+    The engine decides how the game's shoe is shuffled (the lockstep and vector engines share theirs), and shoes is the file name of a shoe library, if one was used.
+    Payouts are printed per hand, so a round with several split blackjacks may differ by a rounding unit from the change in balance."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, must be one of {ENGINES}.")
+    if shoes is not None:
+        deck = ShoeLibrary(shoes).create_deck(game_number, rules.penetration)
+    elif engine == "standard":
+        deck = create_deck(decks, rules, seed, game_number)
+    else:
+        deck = create_shoe_deck(decks, rules, seed, game_number)
+
+    sub_algorithms = [copy.deepcopy(_create_algorithm(sub_algorithm)) for sub_algorithm in (selection, counting, betting)]
+    algorithm = BlackjackAlgorithm(*sub_algorithms, base_bet, decks, 1, starting_balance, rules)
+    algorithm.game_number = game_number
+    algorithm.event_log = round_trace = RoundTrace()
+    game(BettingManager(starting_balance), deck, algorithm, rules)
+    scores = algorithm.all_scores.pop()
+
+    if trace:
+        print(f"Game {game_number} ({algorithm.get_metadata()['name']}, seed {seed}, {engine} engine)")
+        for round_number, true_count, bet, hand_lines, dealer_line in round_trace.rounds:
+            balance = scores[round_number + 1] if round_number + 1 < len(scores) else None
+            print(f"Round {round_number + 1}: balance {scores[round_number]}, true count {true_count:+.2f}, bet {bet}")
+            print("\n".join(hand_lines))
+            print(dealer_line)
+            if balance is not None:
+                print(f"  Balance after round: {balance} ({balance - scores[round_number]:+})")
+        print(f"Final balance: {scores[-1]} after {len(round_trace.rounds)} rounds")
+    return scores
+
+
+def main():
+    clear_screen()
+    algorithm = construct_algorithm(import_algoritms(algorithms.SelectionAlgorithm), import_algoritms(algorithms.BettingAlgorithm),
+                                    import_algoritms(algorithms.CountingAlgorithm))
+    clear_screen()
+    seed = int(input("Enter the simulation's seed: "))
+    engine = input(f"Enter the simulation's engine ({', '.join(ENGINES)}, leave blank for standard): ").strip() or "standard"
+    shoes = input("Enter the shoe library file name (leave blank if none was used): ").strip() or None
+    game_number = int(input("Enter the game number to replay: "))
+    replay_game(algorithm.selection_alg, algorithm.count_alg, algorithm.betting_alg, game_number, DECKS, BASE_BET, STARTING_BALANCE, seed, RULES, engine, shoes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from blackjack_core.histogram import CountHistogram
+from blackjack_core.rules import DEFAULT_RULES
+from simulation import ENGINE_VERSION, SimulationResult, simulate, _create_algorithm
+
+"""
+Content-addressed cache of simulation results, so rerunning a seeded configuration returns the stored result instead of simulating it again.
+
+Results are keyed by a sha256 hash of the full configuration (every sub-algorithm's class and settings, the table setup, rules, seed and engine) plus ENGINE_VERSION.
+The amount of games isn't part of the key: since every game is seeded from (seed, game number), the first n games of a run are the same no matter how many are played,
+so a request for fewer games is read from the stored run, and a request for more games only simulates the games that are missing.
+
+Every result is stored as an .npz file in the cache directory. Reading a result updates its modification time,
+and once the directory grows past its size limit the least recently used results are deleted.
+"""
+
+
+RESULT_CACHE_DIR = "result_cache"
+MAX_CACHE_BYTES = 1024 ** 3 #size limit of the cache directory, the most recently used result is always kept even if it alone is larger
+
+
+def _canonical(value):
+    """Returns a json-serializable version of a value, with dictionaries sorted so that equal values always serialize the same way."""
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, dict):
+        return sorted([repr(key), _canonical(item)] for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, "__dict__"):
+        return algorithm_fingerprint(value)
+    return repr(value)
+
+def algorithm_fingerprint(algorithm):
+    """Returns a description of a sub-algorithm's class and settings, which changes if anything that could affect its decisions changes.
+    The tracker is left out, since it only holds the state of the shoe being played."""
+    settings = {name: value for name, value in vars(algorithm).items() if name != "tracker"}
+    return [f"{type(algorithm).__module__}.{type(algorithm).__qualname__}", _canonical(settings)]
+
+def result_key(selection, counting, betting, decks, base_bet, starting_balance, seed, rules=DEFAULT_RULES, engine="standard"):
+    """Returns the hash that a configuration's results are cached under. Sub-algorithms can be passed as instances or classes."""
+    configuration = {
+        "engine_version": ENGINE_VERSION,
+        "engine": engine,
+        "selection": algorithm_fingerprint(_create_algorithm(selection)),
+        "counting": algorithm_fingerprint(_create_algorithm(counting)),
+        "betting": algorithm_fingerprint(_create_algorithm(betting)),
+        "decks": decks,
+        "base_bet": base_bet,
+        "starting_balance": starting_balance,
+        "seed": seed,
+        "rules": list(rules.key()),
+    }
+    return hashlib.sha256(json.dumps(configuration, sort_keys=True).encode()).hexdigest()
+
+
+def result_path(key, cache_dir=RESULT_CACHE_DIR):
+    """Returns the path of the file that a result is stored in."""
+    return os.path.join(cache_dir, key + ".npz")
+
+def load_result(key, cache_dir=RESULT_CACHE_DIR):
+    """Returns the cached result for a key, or None if there isn't one. Marks the result as recently used."""
+    path = result_path(key, cache_dir)
+    try:
+        with np.load(path) as data:
+            scores = data["scores"]
+            offsets = data["offsets"]
+            metadata = json.loads(str(data["metadata"]))
+    except (FileNotFoundError, OSError, KeyError, ValueError):
+        return None #missing or unreadable (e.g. partially written by a process that was killed), so the result is simulated again
+
+    os.utime(path)
+    histogram = CountHistogram.from_dict(metadata["count_histogram"]) if "count_histogram" in metadata else None
+    return SimulationResult(scores, offsets, metadata, histogram)
+
+def store_result(key, result, cache_dir=RESULT_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Stores a result under a key, then evicts the least recently used results until the cache fits in max_bytes."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = result_path(key, cache_dir)
+    #written in full to a uniquely named file before replacing the old one, so other processes never read half a result or write over each other's
+    with tempfile.NamedTemporaryFile(dir=cache_dir, prefix=key + ".", suffix=".tmp", delete=False) as f:
+        np.savez(f, scores=result.scores, offsets=result.offsets, metadata=np.array(json.dumps(result.metadata)))
+    os.replace(f.name, path)
+
+    evict_results(cache_dir, max_bytes)
+
+def evict_results(cache_dir=RESULT_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Deletes the least recently used results until the cache directory fits in max_bytes, always keeping the most recently used one."""
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith(".npz"):
+            stat = os.stat(os.path.join(cache_dir, file_name))
+            entries.append((stat.st_mtime, stat.st_size, file_name))
+    entries.sort(reverse=True)
+
+    total_size = 0
+    for i, (modified, size, file_name) in enumerate(entries):
+        total_size += size
+        if total_size > max_bytes and i > 0:
+            os.remove(os.path.join(cache_dir, file_name))
+
+def clear_cache(cache_dir=RESULT_CACHE_DIR):
+    """Deletes every cached result."""
+    if os.path.isdir(cache_dir):
+        for file_name in os.listdir(cache_dir):
+            if file_name.endswith(".npz"):
+                os.remove(os.path.join(cache_dir, file_name))
+
+
+def first_games(result, games):
+    """Returns a result containing only the first games of another result. The histogram covers every game, so it is left out."""
+    offsets = result.offsets[:games + 1].copy()
+    metadata = dict(result.metadata, games=games)
+    metadata.pop("count_histogram", None)
+    return SimulationResult(result.scores[:offsets[-1]].copy(), offsets, metadata)
+
+def join_results(result, extension):
+    """Returns a result containing the games of a result followed by the games of its extension."""
+    offsets = np.concatenate((result.offsets, extension.offsets[1:] + result.offsets[-1]))
+    metadata = dict(result.metadata, games=len(offsets) - 1)
+
+    histogram = None
+    if result.histogram is not None and extension.histogram is not None:
+        histogram = CountHistogram.from_dict(result.histogram.to_dict())
+        histogram.merge(extension.histogram)
+        metadata["count_histogram"] = histogram.to_dict()
+    else:
+        metadata.pop("count_histogram", None)
+
+    return SimulationResult(np.concatenate((result.scores, extension.scores)), offsets, metadata, histogram)
+
+def cached_simulate(selection, counting, betting, games, decks, base_bet, starting_balance, seed=0, workers=1, rules=DEFAULT_RULES, engine="standard",
+                    histogram=False, cache_dir=RESULT_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Same as simulation.simulate(), but returns cached results when the configuration has been simulated before, simulating only the games that are missing.
+    Unseeded simulations can't be reproduced, so they are never cached. A histogram can't be split by game, so asking for one with fewer games than are cached
+    simulates the games again (without replacing the longer cached run)."""
+    if seed is None:
+        return simulate(selection, counting, betting, games, decks, base_bet, starting_balance, seed, workers, rules, engine, histogram)
+
+    key = result_key(selection, counting, betting, decks, base_bet, starting_balance, seed, rules, engine)
+    cached = load_result(key, cache_dir)
+    if cached is not None and histogram and cached.histogram is None:
+        cached = None #histogram has to be collected from the start, so the whole run is simulated again
+
+    if cached is not None and len(cached) == games:
+        return cached
+    if cached is not None and len(cached) > games:
+        if histogram:
+            return simulate(selection, counting, betting, games, decks, base_bet, starting_balance, seed, workers, rules, engine, histogram)
+        return first_games(cached, games)
+
+    first_game = 0 if cached is None else len(cached)
+    result = simulate(selection, counting, betting, games - first_game, decks, base_bet, starting_balance, seed, workers, rules, engine, histogram,
+                      first_game=first_game)
+    if cached is not None:
+        result = join_results(cached, result)
+
+    store_result(key, result, cache_dir, max_bytes)
+    return result
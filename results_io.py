@@ -0,0 +1,78 @@
+import json
+import os
+import numpy as np
+
+"""
+Reads and writes simulation results.
+Results are saved as a json file containing the simulation's metadata, plus two .npy files next to it holding the scores:
+every score of every game as one flat array, and the index of the first score of each game (with the total amount of scores appended).
+The scores of game i are scores[offsets[i]:offsets[i + 1]], same as SimulationResult. Keeping the scores out of the json file means the metadata
+can be shown straight away, and the scores can be memory-mapped, so only the parts that are looked at are ever read from disk.
+
+Older files, which contain a "scores" list of lists inside the json file, can still be read.
+"""
+
+
+def score_file_names(file_name):
+    """Returns the names of the .npy files that the scores and offsets of a results file are saved in."""
+    base_name = file_name[:-len(".json")] if file_name.endswith(".json") else file_name
+    return base_name + ".scores.npy", base_name + ".offsets.npy"
+
+def flatten_scores(scores):
+    """Returns (flat scores, offsets) arrays for a list of lists of scores, one per game."""
+    lengths = np.array([len(run) for run in scores], dtype=np.int64)
+    offsets = np.zeros(len(scores) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    flat_scores = np.empty(offsets[-1], dtype=np.int64)
+    for i, run in enumerate(scores):
+        flat_scores[offsets[i]:offsets[i + 1]] = run
+    return flat_scores, offsets
+
+def write_results(file_name, metadata, scores, offsets=None):
+    """Writes the metadata to a json file and the scores to .npy files next to it.
+    Scores are either a list of lists (one per game), or a flat array of scores along with its offsets."""
+    if offsets is None:
+        scores, offsets = flatten_scores(scores)
+
+    scores_name, offsets_name = score_file_names(file_name)
+    np.save(scores_name, np.asarray(scores, dtype=np.int64))
+    np.save(offsets_name, np.asarray(offsets, dtype=np.int64))
+
+    metadata = dict(metadata)
+    #only the file names are saved, so results can be moved as long as the files stay together
+    metadata["score_files"] = {"scores": os.path.basename(scores_name), "offsets": os.path.basename(offsets_name)}
+    with open(file_name, "w") as f:
+        json.dump(metadata, f, indent=2)
+
+def read_metadata(file_name):
+    """Returns the metadata of a results file, without reading the scores.
+    For older files with the scores inside the json file, only the part before the scores is parsed, since write_results always put them last."""
+    metadata_lines = []
+    with open(file_name) as f:
+        for line in f:
+            if line.startswith('  "scores": '):
+                return json.loads("".join(metadata_lines).rstrip().rstrip(",") + "\n}")
+            metadata_lines.append(line)
+
+    metadata = json.loads("".join(metadata_lines))
+    metadata.pop("scores", None) #json files written some other way may have the scores on the same line as the metadata
+    return metadata
+
+def source_files(file_name, metadata):
+    """Returns the names of every file that a result's metadata and scores are read from."""
+    if "score_files" not in metadata:
+        return [file_name]
+    directory = os.path.dirname(file_name)
+    return [file_name] + [os.path.join(directory, metadata["score_files"][name]) for name in ("scores", "offsets")]
+
+def read_scores(file_name, metadata):
+    """Returns (flat scores, offsets) of a results file. Scores saved in .npy files are memory-mapped (read-only) rather than read into memory."""
+    if "score_files" in metadata:
+        directory = os.path.dirname(file_name)
+        scores = np.load(os.path.join(directory, metadata["score_files"]["scores"]), mmap_mode="r")
+        offsets = np.load(os.path.join(directory, metadata["score_files"]["offsets"]))
+        return scores, offsets
+
+    with open(file_name) as f:
+        return flatten_scores(json.load(f)["scores"])
@@ -0,0 +1,198 @@
+import json
+import re
+import sqlite3
+import time
+import zlib
+import numpy as np
+from results_io import flatten_scores, read_metadata, read_scores
+from score_statistics import sample_statistics, STATISTICS
+
+"""
+SQLite database of simulation results, so runs can be searched and compared without opening every results file.
+
+Every run has a row in the runs table (its name and sub-algorithms, notes, table setup, seed, engine, rules and full metadata) and in the summaries table
+(the final round statistics printed by data_analysis.py, worked out once when the run is added). Columns that runs are usually searched or sorted by are indexed,
+so queries across thousands of runs only read the rows they return.
+Scores are kept in the scores table as compressed binary blobs: the change between consecutive scores is small, so the flat scores are stored as
+differences in the smallest integer type that fits them, and zlib-compressed along with the length of every game. They are only read when a run is opened.
+"""
+
+
+RESULTS_DATABASE = "simulation_results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    betting TEXT,
+    selection TEXT,
+    counting TEXT,
+    notes TEXT,
+    base_bet INTEGER,
+    decks INTEGER,
+    games INTEGER,
+    starting_balance INTEGER,
+    seed INTEGER,
+    engine TEXT,
+    rules TEXT,
+    metadata TEXT NOT NULL,
+    file_name TEXT,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    run_id INTEGER PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+    mean_profit REAL,
+    standard_deviation REAL,
+    bust_percentage REAL,
+    average_rounds REAL,
+    longest_run INTEGER
+);
+CREATE TABLE IF NOT EXISTS scores (
+    run_id INTEGER PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+    dtype TEXT NOT NULL,
+    differences BLOB NOT NULL,
+    lengths BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_name ON runs(name);
+CREATE INDEX IF NOT EXISTS runs_betting ON runs(betting);
+CREATE INDEX IF NOT EXISTS runs_selection ON runs(selection);
+CREATE INDEX IF NOT EXISTS runs_counting ON runs(counting);
+CREATE INDEX IF NOT EXISTS runs_decks ON runs(decks);
+CREATE INDEX IF NOT EXISTS runs_base_bet ON runs(base_bet);
+CREATE INDEX IF NOT EXISTS runs_starting_balance ON runs(starting_balance);
+CREATE INDEX IF NOT EXISTS runs_file_name ON runs(file_name);
+CREATE INDEX IF NOT EXISTS summaries_mean_profit ON summaries(mean_profit);
+CREATE INDEX IF NOT EXISTS summaries_bust_percentage ON summaries(bust_percentage);
+"""
+
+RUN_COLUMNS = ("id", "name", "betting", "selection", "counting", "notes", "base_bet", "decks", "games", "starting_balance", "seed", "engine", "rules",
+               "file_name", "created")
+SUMMARY_COLUMNS = STATISTICS + ("longest_run",)
+
+
+def encode_scores(scores, offsets):
+    """Returns (dtype name, differences blob, lengths blob) for a flat scores array and its offsets."""
+    scores = np.asarray(scores, dtype=np.int64)
+    differences = np.diff(scores, prepend=0)
+    dtype = np.int64
+    for candidate in (np.int16, np.int32):
+        if len(differences) == 0 or (differences.min() >= np.iinfo(candidate).min and differences.max() <= np.iinfo(candidate).max):
+            dtype = candidate
+            break
+    lengths = np.diff(np.asarray(offsets, dtype=np.int64)).astype(np.uint32)
+    return np.dtype(dtype).name, zlib.compress(differences.astype(dtype).tobytes()), zlib.compress(lengths.tobytes())
+
+def decode_scores(dtype, differences, lengths):
+    """Returns (flat scores, offsets) from the values returned by encode_scores()."""
+    scores = np.cumsum(np.frombuffer(zlib.decompress(differences), dtype=dtype), dtype=np.int64)
+    lengths = np.frombuffer(zlib.decompress(lengths), dtype=np.uint32)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return scores, offsets
+
+def split_name(name):
+    """Returns (betting, selection, counting) from a simulation's name, or Nones if it isn't made of the three sub-algorithms' names."""
+    parts = name.split(" - ")
+    return tuple(parts) if len(parts) == 3 else (None, None, None)
+
+
+class ResultsStore:
+    """Connection to a results database, which is created if it doesn't exist."""
+
+    def __init__(self, file_name=RESULTS_DATABASE):
+        self.file_name = file_name
+        self.connection = sqlite3.connect(file_name)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def add_run(self, metadata, scores, offsets=None, file_name=None):
+        """Adds a run and its summary, returning its id. Scores are either a list of lists (one per game), or a flat array along with its offsets.
+        file_name is the results file the run was also saved to, if any."""
+        if offsets is None:
+            scores, offsets = flatten_scores(scores)
+        scores = np.asarray(scores, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        lengths = np.diff(offsets)
+        summary = sample_statistics(scores[offsets[1:] - 1], lengths, metadata["starting_balance"]) #final round, same as data_analysis.round_scores()
+
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (name, betting, selection, counting, notes, base_bet, decks, games, starting_balance, seed, engine, rules, metadata, file_name,"
+                " created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (metadata["name"], *split_name(metadata["name"]), metadata.get("notes", ""), metadata["base_bet"], metadata["decks"], len(lengths),
+                 metadata["starting_balance"], metadata.get("seed"), metadata.get("engine"), json.dumps(metadata.get("rules")), json.dumps(metadata), file_name,
+                 time.time()))
+            run_id = cursor.lastrowid
+            self.connection.execute("INSERT INTO summaries (run_id, mean_profit, standard_deviation, bust_percentage, average_rounds, longest_run)"
+                                    " VALUES (?, ?, ?, ?, ?, ?)", (run_id, *map(float, summary), int(lengths.max(initial=0))))
+            self.connection.execute("INSERT INTO scores (run_id, dtype, differences, lengths) VALUES (?, ?, ?, ?)", (run_id, *encode_scores(scores, offsets)))
+        return run_id
+
+    def add_result(self, result, notes=""):
+        """Adds a SimulationResult, returning its id."""
+        return self.add_run(dict(result.metadata, notes=notes), result.scores, result.offsets)
+
+    def add_file(self, file_name):
+        """Adds the run saved in a results file (see results_io.py), returning its id."""
+        metadata = read_metadata(file_name)
+        scores, offsets = read_scores(file_name, metadata)
+        return self.add_run(metadata, scores, offsets, file_name)
+
+    def next_file_number(self, base_name):
+        """Returns the number to add to base_name (as base_name_number.json) so the results file comes after every one recorded in the database,
+        or None if base_name.json itself hasn't been used."""
+        pattern = re.compile(re.escape(base_name) + r"_(\d+)\.json")
+        numbers = [-1]
+        for (file_name,) in self.connection.execute("SELECT file_name FROM runs WHERE file_name >= ? AND file_name < ?", (base_name + ".json", base_name + "`")):
+            if file_name == base_name + ".json":
+                numbers.append(0)
+            elif pattern.fullmatch(file_name):
+                numbers.append(int(pattern.fullmatch(file_name).group(1)))
+        return None if max(numbers) == -1 else max(numbers) + 1
+
+    def find_runs(self, order_by="mean_profit", descending=True, limit=None, where=None, parameters=(), **filters):
+        """Returns a list of dictionaries containing the columns of the runs and summaries tables for the matching runs (without metadata or scores).
+        Each filter is a column and the value it must have, where strings containing % are matched with LIKE, e.g. find_runs(decks=6, counting="Hi-Lo%").
+        where is an extra SQL condition with ? placeholders for its parameters, e.g. where="games >= ?", parameters=(1000,)."""
+        conditions = []
+        values = []
+        for column, value in filters.items():
+            self.check_column(column)
+            conditions.append(f"{column} LIKE ?" if isinstance(value, str) and "%" in value else f"{column} = ?")
+            values.append(value)
+        if where is not None:
+            conditions.append(f"({where})")
+            values += list(parameters)
+        self.check_column(order_by)
+
+        query = f"SELECT {', '.join(RUN_COLUMNS)}, {', '.join(SUMMARY_COLUMNS)} FROM runs JOIN summaries ON summaries.run_id = runs.id"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            query += " LIMIT ?"
+            values.append(limit)
+        return [dict(row) for row in self.connection.execute(query, values)]
+
+    def check_column(self, column):
+        """Raises ValueError if a name isn't a column that runs can be searched or sorted by."""
+        if column not in RUN_COLUMNS + SUMMARY_COLUMNS:
+            raise ValueError(f"Unknown column {column!r}, must be one of {RUN_COLUMNS + SUMMARY_COLUMNS}.")
+
+    def read_run(self, run_id):
+        """Returns (metadata, flat scores, offsets) of a run, with its id and notes in the metadata. Raises KeyError if there is no such run."""
+        row = self.connection.execute("SELECT metadata, notes, dtype, differences, lengths FROM runs JOIN scores ON scores.run_id = runs.id WHERE id = ?",
+                                      (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"There is no run with id {run_id}.")
+        metadata = dict(json.loads(row["metadata"]), notes=row["notes"], run_id=run_id)
+        return (metadata, *decode_scores(row["dtype"], row["differences"], row["lengths"]))
+
+    def delete_run(self, run_id):
+        """Deletes a run, along with its summary and scores."""
+        with self.connection:
+            self.connection.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+    def close(self):
+        self.connection.close()
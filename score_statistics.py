@@ -0,0 +1,141 @@
+import json
+import multiprocessing
+import os
+from statistics import NormalDist
+import numpy as np
+
+"""
+Confidence intervals for the statistics reported by data_analysis.py, so that the results of two algorithms can be told apart from noise.
+
+Every statistic gets two intervals: an analytic one (normal approximation for means and standard deviations, Wilson score interval for the bust percentage)
+and a percentile bootstrap one. Bootstrap resamples are drawn as batches of index arrays, each batch being a single NumPy operation,
+and large files spread the batches over a process pool. Every batch is seeded from (seed, batch number), so the intervals don't depend on the amount of workers.
+
+Intervals are cached in a stats index next to the results file (results.stats.json for results.json), keyed by round cutoff and settings,
+and invalidated whenever the results file or its scores change, so looking at the same round again costs nothing.
+"""
+
+
+BOOTSTRAP_RESAMPLES = 2000
+CONFIDENCE = 0.95
+BATCH_ELEMENTS = 2 ** 22 #indices drawn at once, which bounds the memory used by a batch of resamples
+PARALLEL_ELEMENTS = 2 ** 26 #resampling more indices than this in total is spread over a process pool
+STATISTICS = ("mean_profit", "standard_deviation", "bust_percentage", "average_rounds")
+
+
+def sample_statistics(scores, rounds_lasted, starting_balance):
+    """Returns an array containing every statistic for each row of scores and rounds lasted (one row per sample, one column per game)."""
+    return np.stack([
+        scores.mean(axis=-1) - starting_balance,
+        scores.std(axis=-1),
+        (scores == 0).mean(axis=-1) * 100,
+        rounds_lasted.mean(axis=-1),
+    ], axis=-1)
+
+def analytic_intervals(scores, rounds_lasted, starting_balance, confidence=CONFIDENCE):
+    """Returns a dictionary of statistic: (low, high) using large-sample approximations.
+    Means use the standard error, the standard deviation uses the delta method on the sample variance, and the bust percentage uses the Wilson score interval."""
+    n = len(scores)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    scores = np.asarray(scores, dtype=np.float64)
+
+    mean = scores.mean()
+    deviation = scores.std()
+    mean_error = deviation / np.sqrt(n)
+    #variance of the sample variance is (fourth central moment - variance^2) / n, halved and divided by the deviation to get that of the deviation
+    fourth_moment = np.mean((scores - mean) ** 4)
+    deviation_error = np.sqrt(max(fourth_moment - deviation ** 4, 0) / n) / (2 * deviation) if deviation > 0 else 0.0
+
+    busts = np.mean(scores == 0)
+    centre = (busts + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+    spread = z / (1 + z ** 2 / n) * np.sqrt(busts * (1 - busts) / n + z ** 2 / (4 * n ** 2))
+
+    average_rounds = np.mean(rounds_lasted)
+    rounds_error = np.std(rounds_lasted) / np.sqrt(n)
+
+    return {
+        "mean_profit": (mean - starting_balance - z * mean_error, mean - starting_balance + z * mean_error),
+        "standard_deviation": (deviation - z * deviation_error, deviation + z * deviation_error),
+        "bust_percentage": ((centre - spread) * 100, (centre + spread) * 100),
+        "average_rounds": (average_rounds - z * rounds_error, average_rounds + z * rounds_error),
+    }
+
+def _bootstrap_batches(arguments):
+    """Computes the statistics of a list of batches of resamples. Runs in a worker process for large files."""
+    scores, rounds_lasted, starting_balance, seeds, batch_sizes = arguments
+    n = len(scores)
+    results = []
+    for seed, batch_size in zip(seeds, batch_sizes):
+        indices = np.random.default_rng(seed).integers(0, n, size=(batch_size, n))
+        results.append(sample_statistics(scores[indices], rounds_lasted[indices], starting_balance))
+    return np.concatenate(results)
+
+def bootstrap_intervals(scores, rounds_lasted, starting_balance, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE, seed=0, workers=None):
+    """Returns a dictionary of statistic: (low, high) from percentile bootstrap intervals, resampling games with replacement.
+    Workers defaults to the amount of CPUs, and is only used if enough indices are drawn to be worth it."""
+    n = len(scores)
+    scores = np.asarray(scores, dtype=np.float64)
+    rounds_lasted = np.asarray(rounds_lasted, dtype=np.float64)
+
+    batch_size = max(1, BATCH_ELEMENTS // n)
+    batch_sizes = [min(batch_size, resamples - start) for start in range(0, resamples, batch_size)]
+    seeds = [[seed, batch] for batch in range(len(batch_sizes))]
+
+    workers = os.cpu_count() if workers is None else workers
+    if workers > 1 and len(batch_sizes) > 1 and n * resamples > PARALLEL_ELEMENTS:
+        workers = min(workers, len(batch_sizes))
+        chunks = [(scores, rounds_lasted, starting_balance, seeds[i::workers], batch_sizes[i::workers]) for i in range(workers)]
+        with multiprocessing.Pool(workers) as pool:
+            statistics = np.concatenate(pool.map(_bootstrap_batches, chunks))
+    else:
+        statistics = _bootstrap_batches((scores, rounds_lasted, starting_balance, seeds, batch_sizes))
+
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(statistics, [tail, 100 - tail], axis=0)
+    return {statistic: (float(low[i]), float(high[i])) for i, statistic in enumerate(STATISTICS)}
+
+def round_statistics(scores, rounds_lasted, starting_balance, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE, seed=0, workers=None):
+    """Returns a dictionary of statistic: {"estimate", "analytic", "bootstrap"} for the scores of every game at one round, and the amount of rounds each game lasted."""
+    estimates = sample_statistics(np.asarray(scores, dtype=np.float64), np.asarray(rounds_lasted, dtype=np.float64), starting_balance)
+    analytic = analytic_intervals(scores, rounds_lasted, starting_balance, confidence)
+    bootstrap = bootstrap_intervals(scores, rounds_lasted, starting_balance, resamples, confidence, seed, workers)
+
+    return {statistic: {"estimate": float(estimates[i]), "analytic": [float(bound) for bound in analytic[statistic]], "bootstrap": list(bootstrap[statistic])}
+            for i, statistic in enumerate(STATISTICS)}
+
+
+def stats_index_file_name(file_name):
+    """Returns the name of the stats index of a results file."""
+    base_name = file_name[:-len(".json")] if file_name.endswith(".json") else file_name
+    return base_name + ".stats.json"
+
+def file_signature(file_names):
+    """Returns the size and modification time of each file, which changes whenever one of them is rewritten."""
+    return [[os.path.getsize(name), os.stat(name).st_mtime_ns] for name in file_names]
+
+def cached_round_statistics(file_name, source_files, scores, rounds_lasted, starting_balance, round_number, resamples=BOOTSTRAP_RESAMPLES,
+                            confidence=CONFIDENCE, seed=0, workers=None):
+    """Same as round_statistics(), but reads and writes the results in the results file's stats index.
+    Source files are every file the scores were read from, the index is discarded once any of them changes."""
+    index_name = stats_index_file_name(file_name)
+    signature = file_signature(source_files)
+    key = json.dumps([round_number, resamples, confidence, seed])
+
+    index = {"signature": signature, "statistics": {}}
+    if os.path.exists(index_name):
+        try:
+            with open(index_name) as f:
+                saved_index = json.load(f)
+            if saved_index.get("signature") == signature:
+                index = saved_index
+        except (OSError, ValueError):
+            pass #unreadable index is rebuilt
+
+    if key not in index["statistics"]:
+        index["statistics"][key] = round_statistics(scores, rounds_lasted, starting_balance, resamples, confidence, seed, workers)
+        try:
+            with open(index_name, "w") as f:
+                json.dump(index, f, indent=2)
+        except OSError:
+            pass #results in a read-only folder can still be analysed, just without caching
+    return index["statistics"][key]
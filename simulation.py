@@ -0,0 +1,218 @@
+import copy
+import multiprocessing
+import numpy as np
+from algorithms import BlackjackAlgorithm
+from blackjack_core.blackjack import run_games, run_table_games
+from blackjack_core.batch import run_lockstep_games
+from blackjack_core.vectorized import run_vector_games
+from blackjack_core.rules import DEFAULT_RULES
+from blackjack_core.event_log import merge_event_logs
+from blackjack_core.shoe_library import ShoeLibrary
+from results_io import write_results, flatten_scores
+
+"""
+Library interface for running simulations, for use from notebooks and other scripts.
+Runs the same engine as betting_simulation.py, but without any prompts or console output, and returns the results as NumPy arrays.
+Nothing is written to disk unless SimulationResult.save() is called.
+"""
+
+
+MAX_SEATS = 7 #seats at a standard blackjack table
+#standard plays one game at a time, lockstep plays many games at once (see blackjack_core/batch.py),
+#vector keeps many games in arrays (see blackjack_core/vectorized.py), but only supports selection algorithms that don't read the count
+ENGINES = ("standard", "lockstep", "vector")
+ENGINE_VERSION = 2 #must be increased whenever a change to the game logic, engines or algorithms changes the results of a seeded simulation, since it invalidates cached results (see result_cache.py)
+
+
+class SimulationResult:
+    """Scores of every game in a simulation, stored as one flat array plus offsets, along with the simulation's metadata.
+    The scores of game i are scores[offsets[i]:offsets[i + 1]], which is also what runs() returns."""
+
+    def __init__(self, scores, offsets, metadata, histogram=None):
+        self.scores = scores #flat array of the balance at the start of every round of every game
+        self.offsets = offsets #index of the first score of each game, with the total amount of scores appended
+        self.metadata = metadata
+        self.histogram = histogram #CountHistogram of every round's outcome, if it was collected
+
+    @classmethod
+    def from_lists(cls, all_scores, metadata, histogram=None):
+        """Creates a result from a list of lists of scores, as logged by BlackjackAlgorithm."""
+        scores, offsets = flatten_scores(all_scores)
+        return cls(scores, offsets, metadata, histogram)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def runs(self):
+        """Returns a list containing an array of scores for every game. Arrays are views into the flat scores array."""
+        return np.split(self.scores, self.offsets[1:-1])
+
+    def lengths(self):
+        """Returns an array containing the amount of rounds logged for every game."""
+        return np.diff(self.offsets)
+
+    def final_scores(self):
+        """Returns an array containing the last score of every game."""
+        return self.scores[self.offsets[1:] - 1]
+
+    def scores_at(self, round_number):
+        """Returns an array containing the score of every game at the specified round.
+        Games that ended earlier use their last score, same as data_analysis.round_scores()."""
+        lengths = self.lengths()
+        return self.scores[self.offsets[:-1] + np.minimum(round_number, lengths - 1)]
+
+    def padded(self):
+        """Returns a 2D array of scores, with shorter games padded by repeating their last score."""
+        longest_run = self.lengths().max()
+        rounds = np.arange(longest_run)
+        indices = self.offsets[:-1, None] + np.minimum(rounds[None, :], self.lengths()[:, None] - 1)
+        return self.scores[indices]
+
+    def summary(self, round_number=None):
+        """Returns a dictionary of statistics about the scores at the specified round (the final round of every game by default)."""
+        if round_number is None:
+            scores = self.final_scores()
+        else:
+            scores = self.scores_at(round_number)
+        starting_balance = self.metadata["starting_balance"]
+
+        return {
+            "games": len(self),
+            "longest_run": int(self.lengths().max()),
+            "average_rounds": float(self.lengths().mean()),
+            "mean_score": float(scores.mean()),
+            "mean_profit": float(scores.mean() - starting_balance),
+            "standard_deviation": float(scores.std()),
+            "bust_percentage": float(np.mean(scores == 0) * 100),
+        }
+
+    def save(self, file_name, notes=""):
+        """Saves the results to a json file (plus .npy files holding the scores, see results_io.py) readable by data_analysis.py."""
+        metadata = dict(self.metadata)
+        metadata["notes"] = notes
+        write_results(file_name, metadata, self.scores, self.offsets)
+
+
+def _create_algorithm(algorithm):
+    """Returns an instance of a sub-algorithm, which may be passed either as an instance or as a class."""
+    if isinstance(algorithm, type):
+        return algorithm()
+    return algorithm
+
+def _run_chunk(arguments):
+    """Runs a range of games in a worker process. Returns (logged scores, histogram) of every seat.
+    If an event log file name is given, the seat's hands are written to it (event logs are only written for a single seat). Shoes are read from a shoe library if its file name is given."""
+    seats, first_game, games, decks, base_bet, starting_balance, seed, rules, engine, histogram, event_log, shoes = arguments
+    algorithms = [BlackjackAlgorithm(selection, counting, betting, base_bet, decks, games, starting_balance, rules) for selection, counting, betting in seats]
+    if histogram:
+        for algorithm in algorithms:
+            algorithm.enable_histogram()
+    if event_log is not None:
+        algorithms[0].enable_event_log(event_log)
+    if shoes is not None:
+        shoes = ShoeLibrary(shoes) #opened again by every worker, since the memory map is shared through the file rather than copied
+
+    if engine == "lockstep":
+        run_lockstep_games(algorithms[0], games, decks, starting_balance, rules, seed, first_game=first_game, shoes=shoes)
+    elif engine == "vector":
+        run_vector_games(algorithms[0], games, decks, starting_balance, rules, seed, first_game=first_game, shoes=shoes)
+    elif len(algorithms) == 1:
+        run_games(algorithms[0], games, decks, starting_balance, rules, seed, first_game, shoes)
+    else:
+        run_table_games(algorithms, games, decks, starting_balance, rules, seed, first_game, shoes)
+
+    algorithms[0].close_event_log()
+    return [(algorithm.all_scores, algorithm.histogram) for algorithm in algorithms]
+
+def _create_result(chunk_results, metadata):
+    """Combines the (scores, histogram) of a seat from every chunk into a SimulationResult. Histograms are merged and saved in the metadata."""
+    all_scores = []
+    histogram = None
+    for scores, chunk_histogram in chunk_results:
+        all_scores += scores
+        if chunk_histogram is not None:
+            if histogram is None:
+                histogram = chunk_histogram
+            else:
+                histogram.merge(chunk_histogram)
+
+    if histogram is not None:
+        metadata["count_histogram"] = histogram.to_dict()
+    return SimulationResult.from_lists(all_scores, metadata, histogram)
+
+def _run_seats(seats, games, decks, base_bet, starting_balance, seed, workers, rules, engine="standard", histogram=False, event_log=None, first_game=0, shoes=None):
+    """Runs games first_game to first_game + games - 1 for one or more seats, splitting them between worker processes. Returns a SimulationResult for each seat."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, must be one of {ENGINES}.")
+    if engine != "standard" and len(seats) > 1:
+        raise ValueError("Only the standard engine supports multiple seats.")
+    if event_log is not None and len(seats) > 1:
+        raise ValueError("An event log can only record a single seat, use simulate() for each algorithm instead.")
+    if engine == "vector" and event_log is not None:
+        raise ValueError("The vector engine can't write an event log, use the standard or lockstep engine instead.")
+    if shoes is not None and rules.infinite_deck:
+        raise ValueError("A shoe library can't be used with an infinite deck.")
+    if shoes is not None:
+        ShoeLibrary(shoes).check_games(decks, games, first_game)
+
+    #sub-algorithms are copied, so seats passed the same instance don't share a tracker
+    seats = [tuple(copy.deepcopy(_create_algorithm(sub_algorithm)) for sub_algorithm in seat) for seat in seats]
+
+    metadata = []
+    for selection, counting, betting in seats:
+        seat_metadata = BlackjackAlgorithm(selection, counting, betting, base_bet, decks, games, starting_balance, rules).get_metadata()
+        seat_metadata["seed"] = seed
+        seat_metadata["seats"] = len(seats)
+        seat_metadata["engine"] = engine
+        if first_game:
+            seat_metadata["first_game"] = first_game
+        if shoes is not None:
+            seat_metadata["shoe_library"] = shoes
+        metadata.append(seat_metadata)
+
+    if workers <= 1 or games <= 1:
+        seat_results = _run_chunk((seats, first_game, games, decks, base_bet, starting_balance, seed, rules, engine, histogram, event_log, shoes))
+        return [_create_result([seat_result], seat_metadata) for seat_result, seat_metadata in zip(seat_results, metadata)]
+
+    #without a seed, each worker would inherit the same random state, so one is generated to keep the workers' games independent
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    workers = min(workers, games)
+    chunk_starts = np.linspace(0, games, workers + 1).astype(int)
+    #each worker writes its own part of the event log, which are concatenated in chunk order once every worker is done
+    #chunks are consecutive ranges of games, but within a chunk records follow the order rounds were played in, which the lockstep engine interleaves between games
+    part_names = [None if event_log is None else f"{event_log}.part{i}" for i in range(workers)]
+    chunks = []
+    for start, end, part_name in zip(chunk_starts[:-1], chunk_starts[1:], part_names):
+        chunks.append((seats, first_game + int(start), int(end - start), decks, base_bet, starting_balance, seed, rules, engine, histogram, part_name, shoes))
+
+    with multiprocessing.Pool(workers) as pool:
+        chunk_results = pool.map(_run_chunk, chunks)
+    if event_log is not None:
+        merge_event_logs(event_log, part_names)
+
+    return [_create_result([seat_results[i] for seat_results in chunk_results], seat_metadata) for i, seat_metadata in enumerate(metadata)]
+
+def simulate(selection, counting, betting, games, decks, base_bet, starting_balance, seed=None, workers=1, rules=DEFAULT_RULES, engine="standard", histogram=False,
+             event_log=None, first_game=0, shoes=None):
+    """Runs a simulation and returns its results as a SimulationResult.
+    Sub-algorithms can be passed as instances or classes. If a seed is given, the results are the same regardless of the amount of workers,
+    since every game is seeded from (seed, game number). With more than one worker, games are split into contiguous chunks run in separate processes.
+    The lockstep and vector engines are faster, but shuffle their shoes differently, so the same seed gives different (equally valid) games than the standard engine.
+    Both of them deal the same shoes as each other, so they give identical results for the same seed.
+    If histogram is True, every round's outcome is also aggregated by true count into result.histogram (see blackjack_core/histogram.py).
+    If event_log is a file name, every hand played is written to it, to be read with blackjack_core.event_log.read_events() (not supported by the vector engine).
+    Games are numbered from first_game, so a seeded simulation can be extended by simulating only the games after the ones already played.
+    If shoes is the file name of a shoe library (see blackjack_core/shoe_library.py), game i is dealt its shoe i instead of a newly shuffled one,
+    so every engine plays the same games, and separate simulations can share the same shoes."""
+    return _run_seats([(selection, counting, betting)], games, decks, base_bet, starting_balance, seed, workers, rules, engine, histogram, event_log, first_game,
+                      shoes)[0]
+
+def simulate_table(seats, games, decks, base_bet, starting_balance, seed=None, workers=1, rules=DEFAULT_RULES, histogram=False, shoes=None):
+    """Runs a simulation with several algorithms sitting at the same table, sharing the deck and the dealer.
+    Seats are (selection, counting, betting) tuples, played in order, and every seat counts every card dealt at the table.
+    Returns a list containing a SimulationResult for each seat. Event logs only record a single seat, so they aren't supported here."""
+    if len(seats) > MAX_SEATS:
+        raise ValueError(f"A table can have at most {MAX_SEATS} seats.")
+    return _run_seats(seats, games, decks, base_bet, starting_balance, seed, workers, rules, histogram=histogram, shoes=shoes)
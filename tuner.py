@@ -0,0 +1,110 @@
+import itertools
+import math
+import numpy as np
+from algorithms import BasicStrategy, BettingAlgorithm, CountingAlgorithm, FlatBetting, HiLoCount, SelectionAlgorithm
+from blackjack_core.rules import DEFAULT_RULES
+from simulation import _create_algorithm, simulate
+
+"""
+Tunes the parameters of an algorithm (e.g. SuddenShift's thresholds and multipliers, or the total MaxCaution stands on) with successive halving.
+
+Every configuration is first simulated for a few games, then only the best 1/reduction of them are kept and given reduction times as many games,
+until a single configuration is left. Losing configurations are dropped after only a few games, so the whole search takes a small fraction
+of the games that simulating every configuration of a grid in full would.
+Every configuration is simulated with the same seed, so game i is dealt the same shoe for all of them (common random numbers),
+and differences in their scores come from the configurations rather than from the luck of the shoes. Games already played are kept when
+a configuration is given more, since simulations are extended from the next game number instead of being restarted.
+"""
+
+
+def _mean_profit(profits, starting_balance):
+    return profits.mean()
+
+def _survival_percentage(profits, starting_balance):
+    return np.mean(profits > -starting_balance) * 100
+
+def _profit_ratio(profits, starting_balance):
+    #mean profit per unit of risk, so aggressive configurations don't win only by betting more
+    deviation = profits.std()
+    return profits.mean() / deviation if deviation > 0 else 0.0
+
+#objectives score the final profits of a configuration's games, higher is better
+OBJECTIVES = {"mean_profit": _mean_profit, "survival_percentage": _survival_percentage, "profit_ratio": _profit_ratio}
+
+
+def parameter_grid(**values):
+    """Returns a list containing a dictionary of keyword arguments for every combination of the values given for each parameter.
+    e.g. parameter_grid(high_count=[3, 5], high_multiplier=[4, 8]) returns 4 combinations."""
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*(values[name] for name in names))]
+
+def grid_configurations(algorithm_class, grid, selection=BasicStrategy, counting=HiLoCount, betting=FlatBetting):
+    """Returns a list of (selection, counting, betting) configurations, one for every set of parameters in the grid.
+    The tuned algorithm takes the place of whichever sub-algorithm its class is, and the other two sub-algorithms are shared by every configuration."""
+    configurations = []
+    for parameters in grid:
+        algorithm = algorithm_class(**parameters)
+        if isinstance(algorithm, SelectionAlgorithm):
+            configurations.append((algorithm, counting, betting))
+        elif isinstance(algorithm, CountingAlgorithm):
+            configurations.append((selection, algorithm, betting))
+        elif isinstance(algorithm, BettingAlgorithm):
+            configurations.append((selection, counting, algorithm))
+        else:
+            raise ValueError(f"{algorithm_class.__name__} isn't a selection, counting or betting algorithm.")
+    return configurations
+
+def configuration_name(configuration):
+    """Returns the name of a (selection, counting, betting) configuration, in the same form as a simulation's name."""
+    selection, counting, betting = (_create_algorithm(sub_algorithm) for sub_algorithm in configuration)
+    return f"{betting} - {selection} - {counting}"
+
+def successive_halving(configurations, decks, base_bet, starting_balance, initial_games=200, reduction=2, seed=0, rules=DEFAULT_RULES, engine="lockstep",
+                       objective="mean_profit", workers=1, verbose=True):
+    """Returns a list containing a dictionary (configuration, name, games, score) for every configuration, best first.
+    Configurations that lasted more rounds of halving are ranked above those dropped earlier, and configurations dropped in the same round are ranked by score.
+    Each round simulates the remaining configurations up to their game budget, scores them on every game played so far, and keeps the best 1/reduction of them."""
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}, must be one of {tuple(OBJECTIVES)}.")
+    if reduction < 2:
+        raise ValueError("Reduction must be at least 2.")
+    score_profits = OBJECTIVES[objective]
+
+    entries = [{"configuration": configuration, "name": configuration_name(configuration), "games": 0, "score": None} for configuration in configurations]
+    profits = [np.zeros(0, dtype=np.int64) for _ in configurations]
+    remaining = list(range(len(configurations)))
+    dropped = [] #indices of dropped configurations, worst first
+    games = initial_games
+    total_games = 0
+
+    while remaining:
+        for index in remaining:
+            entry = entries[index]
+            result = simulate(*entry["configuration"], games - entry["games"], decks, base_bet, starting_balance, seed, workers, rules, engine,
+                              first_game=entry["games"])
+            profits[index] = np.concatenate((profits[index], result.final_scores() - starting_balance))
+            total_games += games - entry["games"]
+            entry["games"] = games
+            entry["score"] = float(score_profits(profits[index], starting_balance))
+
+        remaining.sort(key=lambda index: entries[index]["score"], reverse=True)
+        if verbose:
+            leader = entries[remaining[0]]
+            print(f"{len(remaining)} configurations after {games} games, best: {leader['name']} ({objective} {leader['score']:.4f})")
+        if len(remaining) == 1:
+            break
+        kept = math.ceil(len(remaining) / reduction)
+        dropped += remaining[kept:][::-1]
+        remaining = remaining[:kept]
+        games *= reduction
+
+    if verbose:
+        print(f"Simulated {total_games} games, {total_games / (games * len(configurations)):.1%} of simulating every configuration for {games} games.")
+    return [entries[index] for index in remaining + dropped[::-1]]
+
+def tune(algorithm_class, grid, decks, base_bet, starting_balance, selection=BasicStrategy, counting=HiLoCount, betting=FlatBetting, **options):
+    """Tunes the parameters of an algorithm over a grid (see parameter_grid()) with successive_halving(), which takes the remaining options.
+    Returns (best parameters, ranking), where ranking is the list returned by successive_halving()."""
+    configurations = grid_configurations(algorithm_class, grid, selection, counting, betting)
+    ranking = successive_halving(configurations, decks, base_bet, starting_balance, **options)
+    return grid[configurations.index(ranking[0]["configuration"])], ranking